@@ -0,0 +1,133 @@
+"""Stand-ins for the Telegram Bot API and OpenRouter, so benchmarks run offline."""
+import asyncio
+import datetime
+import hashlib
+import itertools
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage, TelegramMethod
+from aiogram.types import Chat, InlineKeyboardButton, InlineKeyboardMarkup, Message, ReplyKeyboardMarkup
+from aiohttp import web
+
+
+class FakeTelegramSession(BaseSession):
+    """Bot API session answering every method locally.
+
+    Sent and edited messages are returned as if Telegram had accepted them.
+    The session counts calls per method and remembers the last inline
+    keyboard shown in every chat, so simulated users can press its buttons.
+    expect_menu() lets a user wait for an answer produced in the background.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """Create a session.
+
+        Args:
+            latency: Seconds every API call takes, simulating the network round trip
+        """
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.keyboards: Dict[int, List[InlineKeyboardButton]] = {}
+        self._message_ids = itertools.count(1)
+        self._menu_waiters: Dict[int, List["asyncio.Future[None]"]] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not isinstance(method, (SendMessage, EditMessageText)):
+            return True
+
+        chat_id = int(method.chat_id or 0)
+        if isinstance(method.reply_markup, InlineKeyboardMarkup):
+            self.keyboards[chat_id] = [button for row in method.reply_markup.inline_keyboard for button in row]
+        elif isinstance(method.reply_markup, ReplyKeyboardMarkup):
+            for waiter in self._menu_waiters.pop(chat_id, []):
+                if not waiter.done():
+                    waiter.set_result(None)
+        return Message(
+            message_id=method.message_id if isinstance(method, EditMessageText) and method.message_id else next(self._message_ids),
+            date=datetime.datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=method.text
+        ).as_(bot)
+
+    def expect_menu(self, chat_id: int) -> "asyncio.Future[None]":
+        """Return a future resolved when the bot next sends a reply keyboard, such as the main menu, to a chat."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._menu_waiters.setdefault(chat_id, []).append(waiter)
+        return waiter
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> Any:
+        raise NotImplementedError("The fake Telegram session does not serve files")
+        yield b""  # Makes this an async generator, like the real one
+
+
+class FakeOpenRouter:
+    """Local HTTP server speaking the OpenRouter chat completions protocol.
+
+    Answers are derived from the prompt, so repeated questions get the same
+    answer, and streamed answers arrive in `chunks` pieces spread over
+    `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0.5, chunks: int = 20):
+        """Create a server; it is started by start().
+
+        Args:
+            latency: Seconds taken to produce a full answer
+            chunks: Number of pieces a streamed answer is sent in
+        """
+        self.latency = latency
+        self.chunks = max(1, chunks)
+        self.requests = 0
+        self.url = ""
+        self._runner: Optional[web.AppRunner] = None
+
+    def _answer(self, prompt: str) -> List[str]:
+        """Return the pieces of the answer to a prompt."""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return [f"step {index} of recipe {digest[:8]}. " for index in range(self.chunks)]
+
+    async def _completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        payload = await request.json()
+        pieces = self._answer(payload["messages"][-1]["content"])
+        if not payload.get("stream"):
+            await asyncio.sleep(self.latency)
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": "".join(pieces)}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for piece in pieces:
+            await asyncio.sleep(self.latency / self.chunks)
+            event = {"choices": [{"delta": {"content": piece}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def start(self) -> str:
+        """Start listening on a free local port and return the endpoint URL."""
+        app = web.Application()
+        app.router.add_post("/api/v1/chat/completions", self._completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}/api/v1/chat/completions"
+        return self.url
+
+    async def close(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
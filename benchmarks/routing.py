@@ -0,0 +1,179 @@
+"""Measure the per-update routing cost of linear aiogram filters vs HashDispatch.
+
+Both dispatchers get the same synthetic no-op handlers, shaped like the bot's
+own: menu buttons, commands, one text handler per state and callback actions
+per state. The linear dispatcher gets "action:argument" callback data, as the
+bot used to send, the hashed one compact encoded data decoded by
+CallbackDataMiddleware. Updates are fed through Dispatcher.feed_update(), so
+the numbers include aiogram's middleware and FSM overhead.
+
+Usage:
+    python -m benchmarks.routing [--scale N] [--updates N]
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TOKEN", "42:BENCHMARK")
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import Command, StateFilter
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from handlers.dispatch import HashDispatch
+from keyboards.callbacks import encode_callback
+from middlewares.callback_data import CallbackDataMiddleware
+from translations import TRANSLATIONS
+
+# Handler counts of handlers/user_handlers.py
+BUTTONS = 4
+COMMANDS = 3
+STATES = 13
+# Callback actions with one argument
+CALLBACK_ACTIONS = ("recipe", "edit")
+
+CHAT_ID = 1
+
+
+async def noop(*args: Any, **kwargs: Any) -> None:
+    return None
+
+
+def shape(scale: int) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """Return button keys, commands, states and callback actions for a scale factor.
+
+    Buttons must have translations, so their number does not scale.
+    """
+    buttons = [key for key in TRANSLATIONS if key.endswith("_button")][:BUTTONS]
+    commands = [f"command{i}" for i in range(COMMANDS * scale)]
+    states = [f"States:state{i}" for i in range(STATES * scale)]
+    return buttons, commands, states, list(CALLBACK_ACTIONS)
+
+
+def build_linear(scale: int) -> Dispatcher:
+    """Register one aiogram handler per route, as handlers/user_handlers.py used to."""
+    buttons, commands, states, actions = shape(scale)
+    router = Router()
+    for key in buttons:
+        router.message(F.text == TRANSLATIONS[key]["en"])(noop)
+    for name in commands:
+        router.message(Command(name))(noop)
+    for state in states:
+        for action in actions:
+            router.callback_query(StateFilter(state), F.data.startswith(f"{action}:"))(noop)
+    for state in states:
+        router.message(StateFilter(state))(noop)
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    return dispatcher
+
+
+def build_hashed(scale: int) -> Dispatcher:
+    """Register the same routes through HashDispatch."""
+    buttons, commands, states, actions = shape(scale)
+    router = Router()
+    routes = HashDispatch(router)
+    for key in buttons:
+        routes.button(key)(noop)
+    for name in commands:
+        routes.command(name)(noop)
+    for state in states:
+        for action in actions:
+            routes.callback(action, state)(noop)
+        routes.message(state)(noop)
+    dispatcher = Dispatcher()
+    dispatcher.callback_query.outer_middleware(CallbackDataMiddleware())
+    dispatcher.include_router(router)
+    return dispatcher
+
+
+def text_callback(action: str, argument: int) -> str:
+    return f"{action}:{argument}"
+
+
+def make_updates(scale: int, count: int, callback_data: Callable[[str, int], str]) -> List[Tuple[str, Update]]:
+    """Build a random mix of button, command, state text and callback updates.
+
+    Args:
+        scale: Scale factor of the handler counts
+        count: Number of updates
+        callback_data: Encodes a callback action and its argument
+    """
+    buttons, commands, states, actions = shape(scale)
+    user = User(id=CHAT_ID, is_bot=False, first_name="Bench")
+    chat = Chat(id=CHAT_ID, type="private")
+    ids = itertools.count(1)
+    now = datetime.datetime.now()
+
+    def message(text: str) -> Update:
+        return Update(update_id=next(ids), message=Message(message_id=next(ids), date=now, chat=chat, from_user=user, text=text))
+
+    def callback(data: str) -> Update:
+        source = Message(message_id=next(ids), date=now, chat=chat, from_user=user, text="x")
+        return Update(update_id=next(ids), callback_query=CallbackQuery(
+            id=str(next(ids)), from_user=user, chat_instance="bench", data=data, message=source
+        ))
+
+    rng = random.Random(0)
+    updates = []
+    for _ in range(count):
+        kind = rng.choice(("button", "command", "text", "callback", "callback"))
+        state = rng.choice(states)
+        if kind == "button":
+            update = message(TRANSLATIONS[rng.choice(buttons)]["en"])
+        elif kind == "command":
+            update = message(f"/{rng.choice(commands)} args")
+        elif kind == "text":
+            update = message("free text")
+        else:
+            update = callback(callback_data(rng.choice(actions), rng.randrange(1000)))
+        updates.append((state, update))
+    return updates
+
+
+async def measure(dispatcher: Dispatcher, bot: Bot, updates: List[Tuple[str, Update]]) -> float:
+    """Feed the updates and return the mean microseconds per update."""
+    key = StorageKey(bot_id=bot.id, chat_id=CHAT_ID, user_id=CHAT_ID)
+    elapsed = 0.0
+    for state, update in updates:
+        await dispatcher.storage.set_state(key, state)
+        start = time.perf_counter()
+        await dispatcher.feed_update(bot, update)
+        elapsed += time.perf_counter() - start
+    return elapsed / len(updates) * 1e6
+
+
+async def run(scale: int, count: int) -> None:
+    bot = Bot(os.environ["TOKEN"])
+    buttons, commands, states, actions = shape(scale)
+    handlers = len(buttons) + len(commands) + len(states) * (len(actions) + 1)
+    print(f"{handlers} handlers, {count} updates")
+    for name, build, callback_data in (
+        ("linear filters", build_linear, text_callback),
+        ("hash dispatch", build_hashed, encode_callback),
+    ):
+        dispatcher = build(scale)
+        updates = make_updates(scale, count, callback_data)
+        await measure(dispatcher, bot, updates[:200])  # warm up
+        print(f"  {name:15} {await measure(dispatcher, bot, updates):8.1f} us/update")
+    await bot.session.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="multiply the bot's command and state counts")
+    parser.add_argument("--updates", type=int, default=5000, help="number of updates to feed")
+    args = parser.parse_args()
+    asyncio.run(run(args.scale, args.updates))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Fill a recipes database with synthetic recipes for benchmarks.
+
+Recipes are spread over all categories and share a vocabulary of common
+ingredients, so category pages, /search and /cook all have realistic work.
+The FTS index is filled by its triggers, the ingredient index directly.
+
+Usage:
+    python -m benchmarks.seed --db bench.db --rows 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TOKEN", "42:BENCHMARK")
+
+from config import CATEGORY_NAMES
+from database.db import close_db, init_db, pool
+from database.ingredients import ingredient_terms
+
+INGREDIENTS = (
+    "flour", "sugar", "butter", "eggs", "milk", "salt", "pepper", "olive oil", "garlic", "onion",
+    "tomatoes", "potatoes", "carrots", "rice", "chicken", "beef", "cheese", "cream", "lemon", "honey",
+    "basil", "parsley", "mushrooms", "spinach", "beans", "pasta", "yogurt", "apples", "oats", "cinnamon",
+)
+DISHES = ("soup", "salad", "pie", "stew", "pancakes", "casserole", "porridge", "smoothie", "cake", "omelette")
+UNITS = ("200 g", "1 cup", "2 tbsp", "1 tsp", "3 pieces", "500 ml")
+
+
+def make_recipe(rng: random.Random, number: int) -> tuple:
+    """Return the (category id, title, ingredients, instructions, video_link) of a synthetic recipe."""
+    ingredients = rng.sample(INGREDIENTS, rng.randint(3, 8))
+    title = f"{ingredients[0].capitalize()} {rng.choice(DISHES)} #{number}"
+    lines = "\n".join(f"{rng.choice(UNITS)} {name}" for name in ingredients)
+    instructions = " ".join(f"Step {step}: mix the {name} and cook for {rng.randint(2, 30)} minutes." for step, name in enumerate(ingredients, 1))
+    video_link = f"https://example.com/video/{number}" if rng.random() < 0.2 else None
+    return rng.randrange(len(CATEGORY_NAMES["en"])), title, lines, instructions, video_link
+
+
+async def count_recipes() -> int:
+    """Return the number of recipes in the database."""
+    async with pool.reader() as db:
+        async with db.execute("SELECT COUNT(*) FROM recipes") as cursor:
+            row = await cursor.fetchone()
+            return row[0]
+
+
+async def seed_recipes(rows: int, batch_size: int = 10000, seed: int = 0) -> None:
+    """Add synthetic recipes to the open database.
+
+    Args:
+        rows: Number of recipes to add
+        batch_size: Recipes written per transaction
+        seed: Random seed; the same seed produces the same recipes
+    """
+    rng = random.Random(seed)
+    async with pool.reader() as db:
+        async with db.execute("SELECT COALESCE(MAX(id), 0) FROM recipes") as cursor:
+            next_id = (await cursor.fetchone())[0] + 1
+
+    for start in range(next_id, next_id + rows, batch_size):
+        recipes = [(recipe_id, *make_recipe(rng, recipe_id)) for recipe_id in range(start, min(start + batch_size, next_id + rows))]
+        async with pool.writer() as db:
+            await db.executemany(
+                "INSERT INTO recipes (id, category_id, title, ingredients, instructions, video_link) VALUES (?, ?, ?, ?, ?, ?)",
+                recipes
+            )
+            await db.executemany(
+                "INSERT OR IGNORE INTO recipe_ingredients (ingredient, recipe_id) VALUES (?, ?)",
+                [(term, recipe[0]) for recipe in recipes for term in ingredient_terms(recipe[3])]
+            )
+
+
+async def run(database: str, rows: int, batch_size: int) -> None:
+    pool.database = database
+    await init_db()
+    try:
+        start = time.perf_counter()
+        await seed_recipes(rows, batch_size)
+        print(f"Added {rows} recipes in {time.perf_counter() - start:.1f}s, {await count_recipes()} in {database}")
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="database file to fill, created if missing")
+    parser.add_argument("--rows", type=int, default=10000, help="number of recipes to add")
+    parser.add_argument("--batch", type=int, default=10000, help="recipes written per transaction")
+    args = parser.parse_args()
+    asyncio.run(run(args.db, args.rows, args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Measure the bot's throughput and handler latency on simulated user sessions.
+
+Simulated users drive the real dispatcher of main.py through
+Dispatcher.feed_update(): they press the menu buttons, type their input and
+press the inline buttons the bot showed them. Telegram is replaced by
+FakeTelegramSession and OpenRouter by FakeOpenRouter, so nothing leaves the
+machine, while the database, caches, FSM storage, keyboards and handlers are
+the production ones. The database is seeded with synthetic recipes first.
+
+Every scenario runs on its own, all users at once. For each scenario the
+number of updates, updates per second and the p50/p99 time spent in
+feed_update() are printed; for AI questions also the time until the answer
+is shown. Peak RSS of the process is printed at the end.
+
+Usage:
+    python -m benchmarks.throughput [--rows N] [--users N] [--sessions N] [--db PATH]
+                                    [--scenarios browse,paginate,...] [--ai-latency S]
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TOKEN", "42:BENCHMARK")
+os.environ.setdefault("METRICS_PORT", "0")
+# Telegram's rate limits would measure the fake's patience, not the bot
+for name in ("OUTBOUND_CHAT_RATE", "OUTBOUND_GROUP_RATE", "OUTBOUND_GLOBAL_RATE"):
+    os.environ.setdefault(name, "0")
+
+from aiogram import Bot
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import main as bot_main
+from benchmarks.fakes import FakeOpenRouter, FakeTelegramSession
+from benchmarks.seed import DISHES, INGREDIENTS, count_recipes, seed_recipes
+from database.db import pool
+from keyboards.callbacks import NAVIGATION_STEPS, NEXT, PREV, YES, CallbackPayload, decode_callback
+from services.ai_client import ai_client
+from services.ai_queue import ai_queue
+from services.outbound import outbound
+from translations import get_text
+
+# Seconds a user waits for an AI answer before the question counts as lost
+AI_ANSWER_TIMEOUT = 60
+# Seconds a user reads an AI answer; the bot releases the user's AI slot just after showing it
+AI_READING_TIME = 0.05
+# Seconds between the arrivals of two users; all users arriving at once would measure only the burst
+USER_ARRIVAL_INTERVAL = 0.005
+
+
+class SimulatedUser:
+    """One user chatting with the bot in a private chat, recording handler latencies."""
+
+    def __init__(self, user_id: int, bot: Bot, session: FakeTelegramSession, latencies: List[float], rng: random.Random):
+        self.user = User(id=user_id, is_bot=False, first_name=f"User {user_id}")
+        self.chat = Chat(id=user_id, type="private")
+        self.bot = bot
+        self.session = session
+        self.latencies = latencies
+        self.rng = rng
+        self._ids = itertools.count(1)
+
+    async def _feed(self, update: Update) -> None:
+        start = time.perf_counter()
+        await bot_main.dp.feed_update(self.bot, update)
+        self.latencies.append(time.perf_counter() - start)
+        # Handlers return before their messages are delivered; the user reads them first
+        await outbound.join(self.chat.id)
+
+    def _message(self, text: str) -> Message:
+        return Message(message_id=next(self._ids), date=datetime.datetime.now(), chat=self.chat, from_user=self.user, text=text)
+
+    async def send(self, text: str) -> None:
+        """Send a text message."""
+        await self._feed(Update(update_id=next(self._ids), message=self._message(text)))
+
+    async def tap(self, button_key: str) -> None:
+        """Press a reply keyboard button, given by its translation key."""
+        await self.send(get_text(button_key, "en"))
+
+    async def press(self, action: str, accept: Callable[[CallbackPayload], bool] = lambda payload: True) -> bool:
+        """Press a random inline button of the last keyboard shown, among those with an action.
+
+        Returns:
+            False if the keyboard has no such button
+        """
+        buttons = [
+            button for button in self.session.keyboards.get(self.chat.id, [])
+            if (payload := decode_callback(button.callback_data)) is not None and payload.action == action and accept(payload)
+        ]
+        if not buttons:
+            return False
+        query = CallbackQuery(
+            id=str(next(self._ids)),
+            from_user=self.user,
+            chat_instance=str(self.chat.id),
+            data=self.rng.choice(buttons).callback_data,
+            message=self._message("")
+        )
+        await self._feed(Update(update_id=next(self._ids), callback_query=query))
+        return True
+
+
+async def browse(user: SimulatedUser) -> None:
+    """Open a random category."""
+    await user.tap("view_recipe_button")
+    await user.press("category")
+
+
+async def paginate(user: SimulatedUser) -> None:
+    """Page forward through a category and back once."""
+    await browse(user)
+    for _ in range(3):
+        if not await user.press("page", lambda payload: payload.args[1] == NEXT):
+            break
+    await user.press("page", lambda payload: payload.args[1] == PREV)
+
+
+async def view(user: SimulatedUser) -> None:
+    """Open a recipe of a category and return to the list."""
+    await browse(user)
+    await user.press("recipe")
+    await user.press("back_to_recipe_list")
+
+
+async def add(user: SimulatedUser) -> None:
+    """Add a recipe step by step and confirm it."""
+    await user.tap("add_recipe_button")
+    await user.press("category")
+    ingredients = user.rng.sample(INGREDIENTS, 4)
+    await user.send(f"{ingredients[0].capitalize()} {user.rng.choice(DISHES)}")
+    await user.send("\n".join(ingredients))
+    await user.send("Mix everything and bake for 20 minutes.")
+    await user.send("-")
+    await user.press("confirm", lambda payload: payload.args[0] == YES)
+
+
+async def edit(user: SimulatedUser) -> None:
+    """Open a recipe, step through the edit dialog and confirm it."""
+    await browse(user)
+    await user.press("recipe")
+    await user.press("edit")
+    for step in ("next", "next", "done"):
+        await user.press("navigation", lambda payload: NAVIGATION_STEPS[payload.args[0]] == step)
+    await user.press("confirm", lambda payload: payload.args[0] == YES)
+
+
+async def delete(user: SimulatedUser) -> None:
+    """Open a recipe and delete it."""
+    await browse(user)
+    await user.press("recipe")
+    await user.press("delete")
+    await user.press("confirm", lambda payload: payload.args[0] == YES)
+
+
+def ask_ai(answer_latencies: List[float]) -> Callable[[SimulatedUser], Awaitable[None]]:
+    """Build the AI scenario, recording the time until each answer is shown."""
+    async def scenario(user: SimulatedUser) -> None:
+        await user.tap("ask_ai_button")
+        # A small set of questions, so some are answered from the cache or coalesced
+        question = f"How do I make {user.rng.choice(INGREDIENTS)} {user.rng.choice(DISHES)}?"
+        answered = user.session.expect_menu(user.chat.id)
+        start = time.perf_counter()
+        await user.send(question)
+        try:
+            await asyncio.wait_for(answered, AI_ANSWER_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning(f"User {user.chat.id} got no AI answer in {AI_ANSWER_TIMEOUT}s")
+        else:
+            answer_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(AI_READING_TIME)
+    return scenario
+
+
+def percentile(samples: List[float], share: int) -> float:
+    """Return a percentile of the samples, in milliseconds."""
+    if len(samples) < 2:
+        return samples[0] * 1000 if samples else 0.0
+    return statistics.quantiles(samples, n=100)[share - 1] * 1000
+
+
+def report(name: str, samples: List[float], elapsed: Optional[float] = None) -> None:
+    rate = f"{len(samples) / elapsed:10.0f}" if elapsed else f"{'-':>10}"
+    print(f"  {name:10} {len(samples):8} {rate} {percentile(samples, 50):9.2f} {percentile(samples, 99):9.2f}")
+
+
+async def run_scenario(
+    name: str,
+    scenario: Callable[[SimulatedUser], Awaitable[None]],
+    bot: Bot,
+    session: FakeTelegramSession,
+    users: int,
+    sessions: int
+) -> None:
+    """Run a scenario `sessions` times for every user, all users concurrently."""
+    latencies: List[float] = []
+
+    async def user_loop(index: int) -> None:
+        user = SimulatedUser(1000 + index, bot, session, latencies, random.Random(f"{name}{index}"))
+        await asyncio.sleep(index * USER_ARRIVAL_INTERVAL)
+        for _ in range(sessions):
+            await scenario(user)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user_loop(index) for index in range(users)))
+    await ai_queue.join()
+    report(name, latencies, time.perf_counter() - start)
+
+
+async def run(args: argparse.Namespace) -> None:
+    pool.database = args.db
+    openrouter = FakeOpenRouter(latency=args.ai_latency)
+    ai_client.url = await openrouter.start()
+    session = FakeTelegramSession(latency=args.telegram_latency)
+    session.middleware(outbound)
+    bot = Bot(os.environ["TOKEN"], session=session)
+    await bot_main.dp.emit_startup(bot=bot, dispatcher=bot_main.dp)
+    try:
+        present = await count_recipes()
+        if present < args.rows:
+            start = time.perf_counter()
+            await seed_recipes(args.rows - present)
+            print(f"Seeded {args.rows - present} recipes in {time.perf_counter() - start:.1f}s")
+
+        answer_latencies: List[float] = []
+        scenarios: Dict[str, Callable[[SimulatedUser], Awaitable[None]]] = {
+            "browse": browse,
+            "paginate": paginate,
+            "view": view,
+            "add": add,
+            "edit": edit,
+            "delete": delete,
+            "ai": ask_ai(answer_latencies),
+        }
+        # One unmeasured run of every scenario fills the caches and builds aiogram's lazy models
+        warmup = SimulatedUser(999, bot, session, [], random.Random(0))
+        for name in args.scenarios:
+            await scenarios[name](warmup)
+        await ai_queue.join()
+        answer_latencies.clear()
+
+        print(f"{await count_recipes()} recipes, {args.users} users x {args.sessions} sessions")
+        print(f"  {'scenario':10} {'updates':>8} {'updates/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        for name in args.scenarios:
+            await run_scenario(name, scenarios[name], bot, session, args.users, args.sessions)
+            if name == "ai":
+                report("ai answer", answer_latencies)
+        print(f"OpenRouter requests: {openrouter.requests}, Telegram calls: {sum(session.calls.values())}")
+    finally:
+        await bot_main.dp.emit_shutdown(bot=bot, dispatcher=bot_main.dp)
+        await openrouter.close()
+    # ru_maxrss is in kilobytes on Linux
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+def main() -> None:
+    scenario_names = ("browse", "paginate", "view", "add", "edit", "delete", "ai")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database file to use and seed; a temporary one by default")
+    parser.add_argument("--rows", type=int, default=10000, help="recipes the database is seeded up to")
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--sessions", type=int, default=20, help="runs of each scenario per user")
+    parser.add_argument("--scenarios", default=",".join(scenario_names), help="comma separated scenarios to run")
+    parser.add_argument("--ai-latency", type=float, default=0.2, help="seconds the fake OpenRouter takes per answer")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="seconds every fake Bot API call takes")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(scenario_names)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # Handlers log every AI request and database event at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.db:
+        asyncio.run(run(args))
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        args.db = os.path.join(directory, "bench.db")
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
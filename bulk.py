@@ -0,0 +1,56 @@
+"""Import recipes into the database from JSONL or CSV files, or export them.
+
+Files are streamed: imports are validated row by row and written in batches
+of BULK_BATCH_SIZE recipes per transaction, exports are read in batches and
+never held in memory. The format follows the file extension (.jsonl, .ndjson
+or .csv) unless --format is given. The bot may keep running meanwhile; its
+cached category pages catch up within CACHE_TTL seconds.
+
+Usage:
+    python bulk.py import recipes.jsonl [--db PATH] [--batch N]
+    python bulk.py export recipes.csv [--db PATH]
+"""
+import argparse
+import asyncio
+import sys
+
+from config import BULK_BATCH_SIZE, DATABASE_NAME
+from database.bulk import FORMATS, BulkImportError, export_recipes, format_for, import_recipes
+from database.db import close_db, init_db, pool
+
+
+async def run(args: argparse.Namespace) -> None:
+    pool.database = args.db
+    await init_db()
+    try:
+        if args.command == "import":
+            with open(args.file, encoding="utf-8-sig", newline="") as file:
+                report = await import_recipes(file, args.format, args.batch)
+            print(f"Imported {report.summary()}")
+        else:
+            with open(args.file, "w", encoding="utf-8", newline="") as file:
+                report = await export_recipes(file, args.format, args.batch)
+            print(f"Exported {report.summary()}")
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("file", help="JSONL or CSV file to read or write")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), help="file format; by default from the extension")
+    parser.add_argument("--db", default=DATABASE_NAME, help="database file")
+    parser.add_argument("--batch", type=int, default=BULK_BATCH_SIZE, help="recipes per transaction or query")
+    args = parser.parse_args()
+    try:
+        args.format = format_for(args.file, args.format)
+        asyncio.run(run(args))
+    except BulkImportError as e:
+        sys.exit(f"Error after importing {e.report.rows} recipes: {e}" if e.report.rows else f"Error: {e}")
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import socket
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+# Seconds a worker gets to finish its updates after the front process stops
+WORKER_STOP_TIMEOUT = 30
+
+
+def update_owner(update: Update) -> int:
+    """Return the chat id of an update, or the user id if it has no chat."""
+    context = UserContextMiddleware.resolve_event_context(update)
+    return context.chat.id if context.chat else context.user.id if context.user else 0
+
+
+def shard_for_update(update: Update, shards: int) -> int:
+    """Return the worker that owns the chat of an update.
+
+    All updates of a conversation, and so its FSM state, always reach the
+    same worker.
+    """
+    return update_owner(update) % shards
+
+
+class ShardForwarder:
+    """Outer update middleware of the front dispatcher.
+
+    Instead of handling updates, it writes them to the worker process owning
+    the update's chat, one JSON document per line.
+    """
+
+    def __init__(self, sockets: List[socket.socket]):
+        """Create a forwarder; the connections are opened by start().
+
+        Args:
+            sockets: Front ends of the socket pairs shared with the workers, in shard order
+        """
+        self.sockets = sockets
+        self._writers: List[asyncio.StreamWriter] = []
+
+    async def start(self) -> None:
+        """Open stream connections to all workers."""
+        for sock in self.sockets:
+            _, writer = await asyncio.open_connection(sock=sock)
+            self._writers.append(writer)
+        logging.info(f"Forwarding updates to {len(self._writers)} workers")
+
+    async def close(self) -> None:
+        """Close the connections; workers finish their updates and exit."""
+        for writer in self._writers:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for writer in self._writers), return_exceptions=True)
+        self._writers = []
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        update: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        writer = self._writers[shard_for_update(update, len(self._writers))]
+        writer.write(update.model_dump_json(exclude_unset=True).encode("utf-8") + b"\n")
+        await writer.drain()
+        return True
+
+
+async def _serve_worker(index: int, sock: socket.socket, dispatcher: Dispatcher, bot: Bot) -> None:
+    """Handle updates received from the front process until it disconnects."""
+    reader, writer = await asyncio.open_connection(sock=sock)
+    # Last update task of every chat; the next update of a chat waits for it
+    tails: Dict[int, "asyncio.Task[None]"] = {}
+
+    async def handle(update: Update, previous: "asyncio.Task[None]") -> None:
+        if previous is not None:
+            await asyncio.wait({previous})
+        try:
+            await dispatcher.feed_update(bot, update)
+        except Exception:
+            logging.exception(f"Worker {index} failed to handle update {update.update_id}")
+
+    def forget(owner: int, task: "asyncio.Task[None]") -> None:
+        if tails.get(owner) is task:
+            del tails[owner]
+
+    await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher, worker=index)
+    logging.info(f"Worker {index} started")
+    try:
+        while line := await reader.readline():
+            update = Update.model_validate_json(line, context={"bot": bot})
+            owner = update_owner(update)
+            task = asyncio.create_task(handle(update, tails.get(owner)))
+            tails[owner] = task
+            task.add_done_callback(lambda done, owner=owner: forget(owner, done))
+        await asyncio.gather(*tails.values(), return_exceptions=True)
+    finally:
+        writer.close()
+        await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+        await bot.session.close()
+        logging.info(f"Worker {index} stopped")
+
+
+def _run_worker(index: int, sock: socket.socket, inherited: List[socket.socket], dispatcher: Dispatcher, bot: Bot) -> None:
+    """Entry point of a worker process."""
+    # Front ends inherited through fork would keep other workers from seeing the front disconnect
+    for front in inherited:
+        front.close()
+    # The front process handles Ctrl+C and stops workers by disconnecting
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_serve_worker(index, sock, dispatcher, bot))
+
+
+class WorkerPool:
+    """Worker processes, each running the bot's dispatcher for its share of chats.
+
+    The processes are forked before the front process starts its event loop,
+    so every worker inherits the configured dispatcher and bot.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int):
+        """Fork the worker processes.
+
+        Args:
+            dispatcher: Dispatcher with the bot's handlers
+            bot: Bot used by the workers to answer
+            workers: Number of worker processes
+        """
+        context = multiprocessing.get_context("fork")
+        self.processes: List[multiprocessing.Process] = []
+        front_sockets = []
+        for index in range(workers):
+            front, back = socket.socketpair()
+            process = context.Process(
+                target=_run_worker,
+                args=(index, back, front_sockets + [front], dispatcher, bot),
+                name=f"bot-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            back.close()
+            front_sockets.append(front)
+            self.processes.append(process)
+        self.forwarder = ShardForwarder(front_sockets)
+
+    def attach(self, front: Dispatcher) -> None:
+        """Make a front dispatcher forward its updates to the workers."""
+        front.update.outer_middleware(self.forwarder)
+        front.startup.register(self.forwarder.start)
+        front.shutdown.register(self.stop)
+
+    async def stop(self) -> None:
+        """Disconnect the workers and wait for them to exit."""
+        await self.forwarder.close()
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logging.warning(f"Worker {process.name} did not stop in time, terminating it")
+                process.terminate()
+        logging.info("All workers stopped")
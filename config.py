@@ -8,22 +8,96 @@ load_dotenv()
 # Telegram Bot Token
 TOKEN = os.getenv("TOKEN")
 
+# How updates are received: "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))  # Worker processes handling updates; 1 handles them in-process
+
+# Webhook settings, used when BOT_MODE is "webhook"
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public base URL Telegram sends updates to, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")  # Address the web server listens on
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Checked against X-Telegram-Bot-Api-Secret-Token
+
+# Prometheus metrics endpoint; in multi-process mode worker N listens on METRICS_PORT + N
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Address of the /metrics endpoint
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # 0 disables the endpoint
+
+# Admins and live profiling; admins start a profile with /profile, any worker process also on SIGUSR1
+ADMIN_IDS = [int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()]  # Telegram user ids allowed to use admin commands
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # Directory profiles are written to
+PROFILE_SECONDS = float(os.getenv("PROFILE_SECONDS", "30"))  # Length of a session when none is given
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))  # Longest session an admin can start
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # Seconds between stack samples
+
+# Outbound Telegram rate limits; messages to a chat are delivered in order, a rate of 0 disables the limit
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # Messages per second to one private chat
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", str(20 / 60)))  # Messages per second to one group or channel
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", "3"))  # Messages a chat gets at once before its rate applies
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # Messages per second to all chats together
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))  # Retries of a call rejected with 429 Too Many Requests
+
 # OpenRouter API settings
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = "google/gemma-3-1b-it:free" 
+# Models tried in order when the previous one fails, e.g. "meta-llama/llama-3.2-3b-instruct:free,mistralai/mistral-7b-instruct:free"
+OPENROUTER_FALLBACK_MODELS = [model.strip() for model in os.getenv("OPENROUTER_FALLBACK_MODELS", "").split(",") if model.strip()]
+OPENROUTER_MODELS = [OPENROUTER_MODEL] + [model for model in OPENROUTER_FALLBACK_MODELS if model != OPENROUTER_MODEL]
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# AI HTTP client settings
+AI_CONNECTOR_LIMIT = int(os.getenv("AI_CONNECTOR_LIMIT", "100"))  # Max simultaneous connections
+AI_CONNECTOR_LIMIT_PER_HOST = int(os.getenv("AI_CONNECTOR_LIMIT_PER_HOST", "20"))  # Max connections to one host
+AI_KEEPALIVE_TIMEOUT = float(os.getenv("AI_KEEPALIVE_TIMEOUT", "30"))  # Seconds to keep idle connections
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "10"))  # Seconds to establish a connection
+AI_READ_TIMEOUT = float(os.getenv("AI_READ_TIMEOUT", "120"))  # Seconds to wait between response chunks
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))  # Retries per model on 429/5xx and network errors
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))  # Seconds before the first retry, doubled each time
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "10"))  # Longest wait before a retry
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))  # Consecutive failures that stop calls to a model
+AI_BREAKER_RESET_TIMEOUT = float(os.getenv("AI_BREAKER_RESET_TIMEOUT", "30"))  # Seconds before a stopped model is tried again
+
+# Stream AI answers into the "thinking" message while they are generated
+AI_STREAMING = os.getenv("AI_STREAMING", "true").lower() in ("1", "true", "yes")
+AI_STREAM_EDIT_INTERVAL = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.5"))  # Min seconds between message edits
+
+# AI request queue
+AI_WORKERS = int(os.getenv("AI_WORKERS", "4"))  # AI requests processed concurrently
+AI_QUEUE_MAX_DEPTH = int(os.getenv("AI_QUEUE_MAX_DEPTH", "100"))  # Max AI requests waiting for a worker
+AI_MAX_JOBS_PER_USER = int(os.getenv("AI_MAX_JOBS_PER_USER", "1"))  # Max queued or running AI requests per user
+
+# Persistent cache of AI answers
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds an answer stays valid
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "10000"))  # Max stored answers
+AI_CACHE_SIMILARITY = float(os.getenv("AI_CACHE_SIMILARITY", "0.8"))  # Near-duplicate threshold, 0 disables it
+AI_CACHE_TOUCH_INTERVAL = float(os.getenv("AI_CACHE_TOUCH_INTERVAL", "30"))  # Max seconds a cache hit waits to be written
 
 # Database settings
 DATABASE_NAME = "recipes.db"
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))  # Number of pooled reader connections
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))  # SQLite page cache per connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes of the file to memory-map
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "5000"))  # Recipes written per transaction by bulk imports
 
-# Language settings
-LANGUAGE = os.getenv("LANGUAGE", "en")  # Default language is English, can be 'en' or 'ru'
-
-# Recipe categories
-CATEGORIES = ["Завтраки", "Супы", "Обеды", "Десерты", "Закуски", "Напитки"] if LANGUAGE == "ru" else \
-            ["Breakfasts", "Soups", "Lunches", "Desserts", "Snacks", "Drinks"]
+# Conversation state storage
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", str(7 * 24 * 3600)))  # Seconds before an abandoned conversation is dropped
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))  # Max seconds a state change waits to be written
+FSM_FLUSH_BATCH = int(os.getenv("FSM_FLUSH_BATCH", "500"))  # Pending state changes that trigger an early write
 
-# AI prompt template
-AI_PROMPT_TEMPLATE = """
+# Language settings
+LANGUAGE = os.getenv("LANGUAGE", "en")  # Default language ('en' or 'ru'); users can pick their own with /language
+
+# Recipe category names in every language, kept in the categories table; a category's id is
+# its position in the lists, so new categories are appended and none are removed or reordered
+CATEGORY_NAMES = {
+    "en": ["Breakfasts", "Soups", "Lunches", "Desserts", "Snacks", "Drinks"],
+    "ru": ["Завтраки", "Супы", "Обеды", "Десерты", "Закуски", "Напитки"],
+}
+
+# AI prompt templates in every language
+AI_PROMPT_TEMPLATES = {
+    "ru": """
 Привет. Ты повар мирового класса, специализирующийся на домашней еде. От твоего ответа зависит, вкусно поедят люди или нет.
 
 ---
@@ -33,7 +107,8 @@ AI_PROMPT_TEMPLATE = """
 ---
 
 Ответь пошагово, лаконично и убедительно.
-""" if LANGUAGE == "ru" else """
+""",
+    "en": """
 Hello. You are a world-class chef specializing in home cooking. People's delicious meals depend on your answer.
 
 ---
@@ -43,7 +118,19 @@ Hello. You are a world-class chef specializing in home cooking. People's delicio
 ---
 
 Answer step by step, concisely and convincingly.
-"""
+""",
+}
+AI_PROMPT_TEMPLATE = AI_PROMPT_TEMPLATES.get(LANGUAGE, AI_PROMPT_TEMPLATES["en"])
+
+# In-process cache of recipes and category pages
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "1024"))  # Max cached recipes
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "256"))  # Max cached category pages
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))  # Seconds before a cached entry expires
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))  # Max cached user language settings
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", "512"))  # Max memoized recipe list and details keyboards
+
+# Number of recipes shown per page when browsing a category
+RECIPES_PAGE_SIZE = 10
 
 # Maximum message length for Telegram
 MAX_MESSAGE_LENGTH = 4000
\ No newline at end of file
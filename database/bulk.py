@@ -0,0 +1,210 @@
+import csv
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from config import BULK_BATCH_SIZE, LANGUAGE
+from database.db import add_recipes, iter_recipes
+from translations import category_names, get_category_name
+
+# Columns of an exported recipe; imports ignore the id and number recipes anew
+EXPORT_FIELDS = ("id", "category", "title", "ingredients", "instructions", "video_link")
+REQUIRED_FIELDS = ("category", "title", "ingredients", "instructions")
+
+# File formats by extension
+FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+
+# Invalid rows listed in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+Recipe = Tuple[int, str, str, str, Optional[str]]
+
+
+@dataclass
+class BulkReport:
+    """Outcome of an import or export."""
+    rows: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def rate(self) -> float:
+        """Return the rows processed per second."""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def skip(self, line: int, reason: str) -> None:
+        """Count an invalid row, keeping the first reasons."""
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+    def summary(self) -> str:
+        """Return the report as text, one fact per line."""
+        lines = [f"{self.rows} rows in {self.seconds:.1f}s ({self.rate:.0f} rows/s)" + (f", {self.skipped} skipped" if self.skipped else "")]
+        lines += self.errors
+        if self.skipped > len(self.errors):
+            lines.append(f"... and {self.skipped - len(self.errors)} more")
+        return "\n".join(lines)
+
+
+class BulkImportError(ValueError):
+    """Raised when an import stops partway; the batches written before stay in the database."""
+
+    def __init__(self, error: Exception, report: BulkReport):
+        """Create an error.
+
+        Args:
+            error: The error that stopped the import
+            report: The recipes added and skipped before it
+        """
+        super().__init__(str(error))
+        self.report = report
+
+
+def format_for(path: str, format_name: Optional[str] = None) -> str:
+    """Return the format of a file: the given one, or the one its extension stands for.
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    format_name = format_name or FORMATS.get(os.path.splitext(path)[1].lower())
+    if format_name not in FORMATS.values():
+        raise ValueError(f"Unknown format of {path}; use .jsonl or .csv")
+    return format_name
+
+
+def read_records(file: TextIO, format_name: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, record) pairs from a JSONL or CSV file, one row at a time.
+
+    JSONL lines that are not valid JSON are yielded as their error message,
+    to be reported by validate_record().
+
+    Raises:
+        ValueError: If a CSV file lacks required columns
+    """
+    if format_name == "csv":
+        reader = csv.DictReader(file)
+        missing = [name for name in REQUIRED_FIELDS if name not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, f"invalid JSON: {e.msg}"
+
+
+def _category_lookup() -> Dict[str, int]:
+    """Return the category ids by name in any language, lowercased."""
+    return {name.lower(): category_id for category_id, names in category_names.items() for name in names.values()}
+
+
+def validate_record(record: Any, categories: Dict[str, int]) -> Recipe:
+    """Turn an imported record into a recipe row.
+
+    Categories may be given by name in any language; an empty video link is
+    stored as NULL.
+
+    Args:
+        record: Parsed JSONL line or CSV row
+        categories: Category ids by lowercased name, from _category_lookup()
+
+    Raises:
+        ValueError: If the record is not a valid recipe
+    """
+    if isinstance(record, str):
+        raise ValueError(record)
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    values: Dict[str, Optional[str]] = {}
+    for name in (*REQUIRED_FIELDS, "video_link"):
+        value = record.get(name)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{name} is not a string")
+        values[name] = value.strip() if value else None
+        if name in REQUIRED_FIELDS and not values[name]:
+            raise ValueError(f"{name} is missing")
+    category_id = categories.get(values["category"].lower())
+    if category_id is None:
+        raise ValueError(f"unknown category {values['category']!r}")
+    return category_id, values["title"], values["ingredients"], values["instructions"], values["video_link"]
+
+
+async def import_recipes(file: TextIO, format_name: str, batch_size: int = BULK_BATCH_SIZE) -> BulkReport:
+    """Stream recipes from a file into the database.
+
+    Rows are validated one at a time and written in batches of batch_size,
+    one transaction per batch; invalid rows are skipped and reported.
+
+    Args:
+        file: Open text file
+        format_name: "jsonl" or "csv"
+        batch_size: Recipes written per transaction
+
+    Returns:
+        The number of recipes added and skipped, and the time taken
+
+    Raises:
+        BulkImportError: If the file cannot be read or a batch cannot be written;
+            its report counts the recipes added before
+    """
+    report = BulkReport()
+    start = time.perf_counter()
+    batch: List[Recipe] = []
+    categories = _category_lookup()
+    try:
+        for line_number, record in read_records(file, format_name):
+            try:
+                batch.append(validate_record(record, categories))
+            except ValueError as e:
+                report.skip(line_number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                report.rows += await add_recipes(batch)
+                batch = []
+        report.rows += await add_recipes(batch)
+    # Bad files raise ValueError (UnicodeDecodeError included) or csv.Error
+    except (ValueError, csv.Error, sqlite3.Error) as e:
+        raise BulkImportError(e, report) from e
+    finally:
+        report.seconds = time.perf_counter() - start
+    return report
+
+
+async def export_recipes(file: TextIO, format_name: str, batch_size: int = BULK_BATCH_SIZE) -> BulkReport:
+    """Stream all recipes from the database into a file.
+
+    Categories are written by their name in LANGUAGE.
+
+    Args:
+        file: Open text file; CSV files should be opened with newline=""
+        format_name: "jsonl" or "csv"
+        batch_size: Recipes read per query
+
+    Returns:
+        The number of recipes written and the time taken
+    """
+    report = BulkReport()
+    start = time.perf_counter()
+    writer = csv.DictWriter(file, EXPORT_FIELDS, extrasaction="ignore") if format_name == "csv" else None
+    if writer is not None:
+        writer.writeheader()
+    async for recipe in iter_recipes(batch_size):
+        recipe["category"] = get_category_name(recipe["category_id"], LANGUAGE)
+        if writer is not None:
+            writer.writerow(recipe)
+        else:
+            file.write(json.dumps({name: recipe[name] for name in EXPORT_FIELDS}, ensure_ascii=False) + "\n")
+        report.rows += 1
+    report.seconds = time.perf_counter() - start
+    return report
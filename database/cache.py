@@ -0,0 +1,113 @@
+import multiprocessing
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Returned by TTLCache.get() when a key is absent or expired
+MISSING = object()
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries also expire after a fixed time.
+
+    Every invalidation bumps a version number. A reader captures the version
+    before querying the database and passes it to set(); if a write has
+    invalidated anything in the meantime, the possibly stale result is not
+    stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """Create an empty cache.
+
+        Args:
+            maxsize: Maximum number of entries; the least recently used is evicted first
+            ttl: Lifetime of an entry in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for key, or MISSING."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, version: int) -> None:
+        """Store a value read while the cache was at the given version."""
+        if self.maxsize <= 0 or version != self.version:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single key."""
+        self.version += 1
+        self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Drop every key for which predicate(key) is true."""
+        self.version += 1
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class SharedGeneration:
+    """Write counter shared by the processes forked from the one creating it.
+
+    The counter lives in shared memory. Every write in any process bumps it,
+    and a process that sees it move clears the caches bound to it, so worker
+    processes do not serve what another worker has changed or deleted. The
+    process making a write invalidates its own caches precisely and keeps
+    the rest.
+    """
+
+    def __init__(self, *caches: TTLCache):
+        """Create a counter; must be created before worker processes are forked.
+
+        Args:
+            caches: Caches cleared when another process writes
+        """
+        self.caches = caches
+        self._value = multiprocessing.Value("Q", 0)
+        self._seen = 0
+
+    def bump(self) -> None:
+        """Record a committed write made by this process."""
+        with self._value.get_lock():
+            self._value.value += 1
+            value = self._value.value
+        # Writes of other processes not yet seen still clear the caches at the next sync()
+        if self._seen == value - 1:
+            self._seen = value
+
+    def sync(self) -> None:
+        """Clear the caches if another process has written since the last call."""
+        value = self._value.value
+        if value != self._seen:
+            self._seen = value
+            for cache in self.caches:
+                cache.clear()
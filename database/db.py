@@ -1,30 +1,114 @@
-import aiosqlite
 import logging
-from typing import List, Dict, Optional, Any
+import re
+import time
+from typing import AsyncIterator, List, Dict, Optional, Any, Sequence, Tuple
 
-from config import DATABASE_NAME
+from config import (
+    DATABASE_NAME,
+    DB_READ_POOL_SIZE,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    RECIPES_PAGE_SIZE,
+    RECIPE_CACHE_SIZE,
+    PAGE_CACHE_SIZE,
+    USER_CACHE_SIZE,
+    CACHE_TTL
+)
+from database.cache import MISSING, SharedGeneration, TTLCache
+from database.ingredients import ingredient_terms, normalize_ingredients
+from database.migrations import apply_migrations, sync_categories
+from database.pool import ConnectionPool
+from metrics import cache_entries, cache_hits, cache_misses, registry
+from translations import register_category_names
+
+# Per-connection settings: WAL lets readers proceed while a write is in progress
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size = {DB_MMAP_SIZE}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+# Shared connection pool, opened by init_db() and closed by close_db()
+pool = ConnectionPool(DATABASE_NAME, readers=DB_READ_POOL_SIZE, pragmas=CONNECTION_PRAGMAS)
+
+# Read-through caches; cached values are shared and must not be modified by callers
+recipe_cache = TTLCache(RECIPE_CACHE_SIZE, CACHE_TTL)  # recipe id -> recipe
+page_cache = TTLCache(PAGE_CACHE_SIZE, CACHE_TTL)  # (category id, ...) -> page
+user_cache = TTLCache(USER_CACHE_SIZE, CACHE_TTL)  # user id -> language or None
+category_cache = TTLCache(1, CACHE_TTL)  # "counts" -> {category id: number of recipes}
+
+# Writes of other worker processes clear the caches of this one
+recipe_writes = SharedGeneration(recipe_cache, page_cache, category_cache)
+user_writes = SharedGeneration(user_cache)
+
+def invalidate_category(*category_ids: int):
+    """Drop cached pages of the given categories and the recipe counts, here and in other workers."""
+    page_cache.invalidate_where(lambda key: key[0] in category_ids)
+    category_cache.invalidate("counts")
+    recipe_writes.bump()
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Return hit/miss counters of the recipe, page, category and user caches."""
+    return {
+        "recipes": recipe_cache.stats(),
+        "pages": page_cache.stats(),
+        "categories": category_cache.stats(),
+        "users": user_cache.stats()
+    }
+
+def _collect_cache_metrics():
+    """Copy the cache counters into the exported metrics."""
+    for name, stats in get_cache_stats().items():
+        cache_hits.set(stats["hits"], name)
+        cache_misses.set(stats["misses"], name)
+        cache_entries.set(stats["size"], name)
+
+registry.add_collector(_collect_cache_metrics)
 
 async def init_db():
-    """Initialize the database and create tables if they don't exist."""
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS recipes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            title TEXT NOT NULL,
-            ingredients TEXT NOT NULL,
-            instructions TEXT NOT NULL,
-            video_link TEXT
-        )
-        """)
-        await db.commit()
-    logging.info("Database initialized")
+    """Open the connection pool and migrate the schema to the latest version."""
+    await pool.open()
+    async with pool.writer("init_db") as db:
+        version = await apply_migrations(db)
+        await sync_categories(db)
+        async with db.execute("SELECT category_id, language, name FROM category_names ORDER BY category_id") as cursor:
+            rows = await cursor.fetchall()
+    names: Dict[int, Dict[str, str]] = {}
+    for category_id, language, name in rows:
+        names.setdefault(category_id, {})[language] = name
+    register_category_names(names)
+    logging.info(f"Database initialized (schema version {version})")
 
-async def add_recipe(category: str, title: str, ingredients: str, instructions: str, video_link: Optional[str] = None) -> int:
+async def close_db():
+    """Close all pooled database connections."""
+    await pool.close()
+
+async def _index_ingredients(db, recipe_id: int, ingredients: str):
+    """Replace the inverted ingredient index entries of a recipe.
+    
+    Must be called on the writer connection, inside the transaction that
+    saves the recipe.
+    """
+    await db.execute("DELETE FROM recipe_ingredients WHERE recipe_id = ?", (recipe_id,))
+    await db.executemany(
+        "INSERT OR IGNORE INTO recipe_ingredients (ingredient, recipe_id) VALUES (?, ?)",
+        [(term, recipe_id) for term in ingredient_terms(ingredients)]
+    )
+
+async def _get_category(db, recipe_id: int) -> Optional[int]:
+    """Return the category id of a recipe, or None if it does not exist."""
+    async with db.execute("SELECT category_id FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+async def add_recipe(category_id: int, title: str, ingredients: str, instructions: str, video_link: Optional[str] = None) -> int:
     """Add a new recipe to the database.
     
     Args:
-        category: Recipe category
+        category_id: Recipe category id
         title: Recipe title
         ingredients: Recipe ingredients
         instructions: Cooking instructions
@@ -33,28 +117,286 @@ async def add_recipe(category: str, title: str, ingredients: str, instructions:
     Returns:
         The ID of the newly created recipe
     """
-    async with aiosqlite.connect(DATABASE_NAME) as db:
+    async with pool.writer("add_recipe") as db:
         cursor = await db.execute(
-            "INSERT INTO recipes (category, title, ingredients, instructions, video_link) VALUES (?, ?, ?, ?, ?)",
-            (category, title, ingredients, instructions, video_link)
+            "INSERT INTO recipes (category_id, title, ingredients, instructions, video_link) VALUES (?, ?, ?, ?, ?)",
+            (category_id, title, ingredients, instructions, video_link)
+        )
+        await _index_ingredients(db, cursor.lastrowid, ingredients)
+    # Invalidate only after commit, so a concurrent read cannot re-cache old data
+    invalidate_category(category_id)
+    return cursor.lastrowid
+
+async def add_recipes(recipes: Sequence[Tuple[int, str, str, str, Optional[str]]]) -> int:
+    """Add many recipes in one transaction, e.g. a batch of a bulk import.
+    
+    Rows are written with one executemany per table instead of a statement
+    and commit per recipe; the FTS index is filled by its triggers.
+    
+    Args:
+        recipes: (category id, title, ingredients, instructions, video_link) tuples
+        
+    Returns:
+        The number of recipes added
+    """
+    if not recipes:
+        return 0
+    async with pool.writer("add_recipes") as db:
+        # Take the write lock before reading the last id, so another process cannot take the same ids
+        if not db.in_transaction:
+            await db.execute("BEGIN IMMEDIATE")
+        # Ids of deleted recipes are not reused, as with AUTOINCREMENT
+        async with db.execute(
+            """SELECT MAX(COALESCE((SELECT MAX(id) FROM recipes), 0),
+                          COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'recipes'), 0))"""
+        ) as cursor:
+            first_id = (await cursor.fetchone())[0] + 1
+        rows = [(first_id + offset, *recipe) for offset, recipe in enumerate(recipes)]
+        await db.executemany(
+            "INSERT INTO recipes (id, category_id, title, ingredients, instructions, video_link) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        await db.executemany(
+            "INSERT OR IGNORE INTO recipe_ingredients (ingredient, recipe_id) VALUES (?, ?)",
+            [(term, row[0]) for row in rows for term in ingredient_terms(row[3])]
         )
-        await db.commit()
-        return cursor.lastrowid
+    invalidate_category(*{recipe[0] for recipe in recipes})
+    return len(rows)
+
+async def iter_recipes(batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+    """Yield all recipes in id order without loading the table into memory.
+    
+    Recipes are read in keyset batches, each streamed from a cursor; the
+    reader connection is returned to the pool between batches, so a long
+    export does not hold it or keep a read transaction open.
+    
+    Args:
+        batch_size: Recipes read per query
+    """
+    last_id = 0
+    while True:
+        batch = []
+        async with pool.reader("iter_recipes") as db:
+            async with db.execute(
+                "SELECT * FROM recipes WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ) as cursor:
+                async for row in cursor:
+                    batch.append(dict(row))
+        for recipe in batch:
+            yield recipe
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1]["id"]
+
+async def get_category_counts() -> Dict[int, int]:
+    """Return the number of recipes in every category.
+    
+    The counts are kept up to date by triggers on the recipes table, so this
+    reads one small table instead of counting recipes.
+    
+    Returns:
+        A dictionary from category id to number of recipes
+    """
+    recipe_writes.sync()
+    cached = category_cache.get("counts")
+    if cached is not MISSING:
+        return cached
+    
+    version = category_cache.version
+    async with pool.reader("get_category_counts") as db:
+        async with db.execute("SELECT id, recipe_count FROM categories ORDER BY id") as cursor:
+            counts = {row[0]: row[1] for row in await cursor.fetchall()}
+    category_cache.set("counts", counts, version)
+    return counts
+
+async def count_recipes_in_category(category_id: int) -> int:
+    """Count the recipes in a category.
+    
+    Args:
+        category_id: The category to count
+        
+    Returns:
+        The number of recipes in the category
+    """
+    return (await get_category_counts()).get(category_id, 0)
+
+async def get_recipes_page(
+    category_id: int,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    start_id: Optional[int] = None,
+    limit: int = RECIPES_PAGE_SIZE
+) -> List[Dict[str, Any]]:
+    """Get one page of recipes in a category, ordered by title.
+    
+    Pages are addressed by keyset cursors on (title, id) rather than offsets,
+    so every page is a single index range scan. A cursor is the id of a recipe
+    on a neighbouring page; its title is looked up by the query itself.
+    At most one of the cursor arguments should be given; without any of them
+    the first page is returned.
+    
+    Args:
+        category_id: The category to filter by
+        after_id: Return the page that follows this recipe
+        before_id: Return the page that precedes this recipe
+        start_id: Return the page that starts with this recipe
+        limit: Maximum number of recipes on the page
+        
+    Returns:
+        A list of recipe dictionaries with 'id' and 'title' keys
+    """
+    key = (category_id, after_id, before_id, start_id, limit)
+    recipe_writes.sync()
+    cached = page_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    
+    anchor = "((SELECT title FROM recipes WHERE id = ?), ?)"
+    if before_id is not None:
+        query = f"""SELECT id, title FROM recipes
+                    WHERE category_id = ? AND (title, id) < {anchor}
+                    ORDER BY title DESC, id DESC LIMIT ?"""
+        params = (category_id, before_id, before_id, limit)
+    elif after_id is not None or start_id is not None:
+        operator = ">" if after_id is not None else ">="
+        anchor_id = after_id if after_id is not None else start_id
+        query = f"""SELECT id, title FROM recipes
+                    WHERE category_id = ? AND (title, id) {operator} {anchor}
+                    ORDER BY title, id LIMIT ?"""
+        params = (category_id, anchor_id, anchor_id, limit)
+    else:
+        query = "SELECT id, title FROM recipes WHERE category_id = ? ORDER BY title, id LIMIT ?"
+        params = (category_id, limit)
+
+    version = page_cache.version
+    async with pool.reader("get_recipes_page") as db:
+        async with db.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+            recipes = [dict(row) for row in rows]
+
+    # Backward pages are read in reverse order
+    if before_id is not None:
+        recipes.reverse()
+    page_cache.set(key, recipes, version)
+    return recipes
+
+def build_search_query(text: str) -> Optional[str]:
+    """Turn free user input into a safe FTS5 query.
+    
+    Every word becomes a quoted prefix term, so punctuation and FTS5 operators
+    typed by the user cannot produce a syntax error.
+    
+    Args:
+        text: The text entered by the user
+        
+    Returns:
+        An FTS5 MATCH expression, or None if the text contains no words
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+async def count_search_results(query: str) -> int:
+    """Count the recipes matching a search query.
+    
+    Args:
+        query: The text entered by the user
+        
+    Returns:
+        The number of matching recipes
+    """
+    match = build_search_query(query)
+    if not match:
+        return 0
+    async with pool.reader("count_search_results") as db:
+        async with db.execute(
+            "SELECT COUNT(*) FROM recipes_fts WHERE recipes_fts MATCH ?",
+            (match,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0]
+
+async def search_recipes(query: str, offset: int = 0, limit: int = RECIPES_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Search recipes by title, ingredients and instructions.
+    
+    Results are ranked with BM25, weighting title matches above ingredient
+    matches and ingredient matches above instruction matches.
+    
+    Args:
+        query: The text entered by the user
+        offset: Number of ranked results to skip
+        limit: Maximum number of results to return
+        
+    Returns:
+        A list of recipe dictionaries with 'id' and 'title' keys
+    """
+    match = build_search_query(query)
+    if not match:
+        return []
+    async with pool.reader("search_recipes") as db:
+        async with db.execute(
+            """SELECT recipes.id, recipes.title FROM recipes_fts
+               JOIN recipes ON recipes.id = recipes_fts.rowid
+               WHERE recipes_fts MATCH ?
+               ORDER BY bm25(recipes_fts, 10.0, 3.0, 1.0), recipes.id
+               LIMIT ? OFFSET ?""",
+            (match, limit, offset)
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
 
-async def get_recipes_by_category(category: str) -> List[Dict[str, Any]]:
-    """Get all recipes for a specific category.
+async def count_recipes_by_ingredients(ingredients: str) -> int:
+    """Count the recipes that use at least one of the listed ingredients.
     
     Args:
-        category: The category to filter by
+        ingredients: Ingredients entered by the user, separated by commas or new lines
         
     Returns:
-        A list of recipe dictionaries
+        The number of matching recipes
     """
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        db.row_factory = aiosqlite.Row
+    names = normalize_ingredients(ingredients)
+    if not names:
+        return 0
+    placeholders = ", ".join("?" * len(names))
+    async with pool.reader("count_recipes_by_ingredients") as db:
         async with db.execute(
-            "SELECT id, title FROM recipes WHERE category = ? ORDER BY title",
-            (category,)
+            f"SELECT COUNT(DISTINCT recipe_id) FROM recipe_ingredients WHERE ingredient IN ({placeholders})",
+            names
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0]
+
+async def find_recipes_by_ingredients(ingredients: str, offset: int = 0, limit: int = RECIPES_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Find recipes ranked by how many of the listed ingredients they use.
+    
+    The ranking is an index lookup per ingredient in recipe_ingredients
+    followed by a grouped count, so recipe texts are never scanned.
+    
+    Args:
+        ingredients: Ingredients entered by the user, separated by commas or new lines
+        offset: Number of ranked results to skip
+        limit: Maximum number of results to return
+        
+    Returns:
+        A list of dictionaries with 'id', 'title' and 'matched' (number of listed ingredients used)
+    """
+    names = normalize_ingredients(ingredients)
+    if not names:
+        return []
+    placeholders = ", ".join("?" * len(names))
+    async with pool.reader("find_recipes_by_ingredients") as db:
+        async with db.execute(
+            f"""SELECT recipes.id, recipes.title, matches.matched FROM (
+                    SELECT recipe_id, COUNT(*) AS matched FROM recipe_ingredients
+                    WHERE ingredient IN ({placeholders})
+                    GROUP BY recipe_id
+                ) AS matches
+                JOIN recipes ON recipes.id = matches.recipe_id
+                ORDER BY matches.matched DESC, recipes.title, recipes.id
+                LIMIT ? OFFSET ?""",
+            (*names, limit, offset)
         ) as cursor:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
@@ -68,21 +410,30 @@ async def get_recipe_by_id(recipe_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         A dictionary with recipe details or None if not found
     """
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        db.row_factory = aiosqlite.Row
+    recipe_writes.sync()
+    cached = recipe_cache.get(recipe_id)
+    if cached is not MISSING:
+        return cached
+    
+    version = recipe_cache.version
+    async with pool.reader("get_recipe_by_id") as db:
         async with db.execute(
             "SELECT * FROM recipes WHERE id = ?",
             (recipe_id,)
         ) as cursor:
             row = await cursor.fetchone()
-            return dict(row) if row else None
+    if not row:
+        return None
+    recipe = dict(row)
+    recipe_cache.set(recipe_id, recipe, version)
+    return recipe
 
-async def update_recipe(recipe_id: int, category: str, title: str, ingredients: str, instructions: str, video_link: Optional[str] = None) -> bool:
+async def update_recipe(recipe_id: int, category_id: int, title: str, ingredients: str, instructions: str, video_link: Optional[str] = None) -> bool:
     """Update an existing recipe in the database.
     
     Args:
         recipe_id: The ID of the recipe to update
-        category: Updated recipe category
+        category_id: Updated recipe category id
         title: Updated recipe title
         ingredients: Updated recipe ingredients
         instructions: Updated cooking instructions
@@ -91,15 +442,20 @@ async def update_recipe(recipe_id: int, category: str, title: str, ingredients:
     Returns:
         True if the recipe was updated successfully, False otherwise
     """
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute(
+    async with pool.writer("update_recipe") as db:
+        old_category = await _get_category(db, recipe_id)
+        if old_category is None:
+            return False
+        await db.execute(
             """UPDATE recipes 
-               SET category = ?, title = ?, ingredients = ?, instructions = ?, video_link = ? 
+               SET category_id = ?, title = ?, ingredients = ?, instructions = ?, video_link = ? 
                WHERE id = ?""",
-            (category, title, ingredients, instructions, video_link, recipe_id)
+            (category_id, title, ingredients, instructions, video_link, recipe_id)
         )
-        await db.commit()
-        return cursor.rowcount > 0
+        await _index_ingredients(db, recipe_id, ingredients)
+    recipe_cache.invalidate(recipe_id)
+    invalidate_category(old_category, category_id)
+    return True
 
 async def delete_recipe(recipe_id: int) -> bool:
     """Delete a recipe from the database.
@@ -110,10 +466,171 @@ async def delete_recipe(recipe_id: int) -> bool:
     Returns:
         True if the recipe was deleted successfully, False otherwise
     """
-    async with aiosqlite.connect(DATABASE_NAME) as db:
-        cursor = await db.execute(
+    async with pool.writer("delete_recipe") as db:
+        category = await _get_category(db, recipe_id)
+        if category is None:
+            return False
+        await db.execute(
             "DELETE FROM recipes WHERE id = ?",
             (recipe_id,)
         )
-        await db.commit()
-        return cursor.rowcount > 0
\ No newline at end of file
+    recipe_cache.invalidate(recipe_id)
+    invalidate_category(category)
+    return True
+
+async def get_user_language(user_id: int) -> Optional[str]:
+    """Return the language chosen by a user, or None if they never chose one."""
+    user_writes.sync()
+    cached = user_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+    
+    version = user_cache.version
+    async with pool.reader("get_user_language") as db:
+        async with db.execute("SELECT language FROM users WHERE user_id = ?", (user_id,)) as cursor:
+            row = await cursor.fetchone()
+            language = row[0] if row else None
+    user_cache.set(user_id, language, version)
+    return language
+
+async def set_user_language(user_id: int, language: str):
+    """Store the language chosen by a user."""
+    async with pool.writer("set_user_language") as db:
+        await db.execute(
+            """INSERT INTO users (user_id, language) VALUES (?, ?)
+               ON CONFLICT (user_id) DO UPDATE SET language = excluded.language""",
+            (user_id, language)
+        )
+    user_cache.invalidate(user_id)
+    user_writes.bump()
+
+async def get_ai_response(key: str, max_age: float) -> Optional[str]:
+    """Get a cached AI answer by its exact prompt key.
+    
+    Args:
+        key: Hash of the model and the normalized prompt
+        max_age: Ignore answers older than this many seconds
+        
+    Returns:
+        The cached answer or None
+    """
+    async with pool.reader("get_ai_response") as db:
+        async with db.execute(
+            "SELECT response FROM ai_responses WHERE key = ? AND created_at >= ?",
+            (key, time.time() - max_age)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row[0] if row else None
+
+async def find_ai_response_candidates(model: str, bands: List[int], max_age: float) -> List[Dict[str, Any]]:
+    """Get cached AI answers that share at least one LSH band with a prompt.
+    
+    Args:
+        model: Only consider answers produced by this model
+        bands: LSH band hashes of the prompt's MinHash signature
+        max_age: Ignore answers older than this many seconds
+        
+    Returns:
+        A list of dictionaries with 'key', 'signature' and 'response' keys
+    """
+    if not bands:
+        return []
+    placeholders = ", ".join("?" * len(bands))
+    async with pool.reader("find_ai_response_candidates") as db:
+        async with db.execute(
+            f"""SELECT key, signature, response FROM ai_responses
+                WHERE key IN (SELECT key FROM ai_response_bands WHERE band IN ({placeholders}))
+                  AND model = ? AND created_at >= ?""",
+            (*bands, model, time.time() - max_age)
+        ) as cursor:
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+
+async def touch_ai_responses(touches: List[Tuple[str, float]]):
+    """Record when cached AI answers were last used, so they are evicted last.
+    
+    Args:
+        touches: (key, last used at) tuples, written in one transaction
+    """
+    async with pool.writer("touch_ai_responses") as db:
+        await db.executemany(
+            "UPDATE ai_responses SET last_used_at = MAX(last_used_at, ?) WHERE key = ?",
+            [(used_at, key) for key, used_at in touches]
+        )
+
+async def save_ai_response(key: str, model: str, signature: bytes, bands: List[int], response: str, max_entries: int, max_age: float):
+    """Store an AI answer and evict expired and least recently used answers.
+    
+    Args:
+        key: Hash of the model and the normalized prompt
+        model: Model that produced the answer
+        signature: Packed MinHash signature of the prompt
+        bands: LSH band hashes of the signature
+        response: The answer to cache
+        max_entries: Maximum number of cached answers to keep
+        max_age: Answers older than this many seconds are removed
+    """
+    now = time.time()
+    async with pool.writer("save_ai_response") as db:
+        await db.execute(
+            """INSERT OR REPLACE INTO ai_responses (key, model, signature, response, created_at, last_used_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (key, model, signature, response, now, now)
+        )
+        await db.executemany(
+            "INSERT OR IGNORE INTO ai_response_bands (band, key) VALUES (?, ?)",
+            [(band, key) for band in bands]
+        )
+        await db.execute("DELETE FROM ai_responses WHERE created_at < ?", (now - max_age,))
+        await db.execute(
+            """DELETE FROM ai_responses WHERE key IN (
+                   SELECT key FROM ai_responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+               )""",
+            (max_entries,)
+        )
+
+async def get_fsm_record(key: str, max_age: float) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """Return the state and serialized data stored for a conversation.
+    
+    Args:
+        key: Conversation key built by the FSM storage
+        max_age: Records not updated for this many seconds are ignored
+        
+    Returns:
+        A (state, data) tuple, or None if nothing is stored
+    """
+    async with pool.reader("get_fsm_record") as db:
+        async with db.execute(
+            "SELECT state, data FROM fsm_states WHERE key = ? AND updated_at >= ?",
+            (key, time.time() - max_age)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return (row[0], row[1]) if row else None
+
+async def save_fsm_records(records: List[Tuple[str, Optional[str], Optional[str], float]]):
+    """Write a batch of conversation states in one transaction.
+    
+    Records with neither a state nor data are deleted.
+    
+    Args:
+        records: (key, state, data, updated_at) tuples
+    """
+    async with pool.writer("save_fsm_records") as db:
+        await db.executemany(
+            "DELETE FROM fsm_states WHERE key = ?",
+            [(key,) for key, state, data, _ in records if state is None and data is None]
+        )
+        await db.executemany(
+            "INSERT OR REPLACE INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+            [record for record in records if record[1] is not None or record[2] is not None]
+        )
+
+async def delete_expired_fsm_records(max_age: float) -> int:
+    """Delete conversation states not updated for max_age seconds.
+    
+    Returns:
+        The number of deleted records
+    """
+    async with pool.writer("delete_expired_fsm_records") as db:
+        cursor = await db.execute("DELETE FROM fsm_states WHERE updated_at < ?", (time.time() - max_age,))
+        return cursor.rowcount
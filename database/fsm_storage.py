@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_STATE_TTL, FSM_FLUSH_INTERVAL, FSM_FLUSH_BATCH
+from database.db import delete_expired_fsm_records, get_fsm_record, save_fsm_records
+
+# A pending record: (state, serialized data, updated_at)
+Record = Tuple[Optional[str], Optional[str], float]
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage that keeps conversation states in the recipes database.
+
+    Data is stored as compact JSON, so it must be JSON serializable. Changes
+    are buffered and written in batches: every `flush_interval` seconds, or
+    earlier once `flush_batch` conversations have pending changes. Reads see
+    pending changes, so handlers never observe a stale state. Conversations
+    not touched for `ttl` seconds are ignored and periodically deleted.
+    """
+
+    def __init__(self, ttl: float, flush_interval: float, flush_batch: int):
+        """Create a storage; the background writer is started by start().
+
+        Args:
+            ttl: Seconds before an abandoned conversation expires
+            flush_interval: Maximum seconds a change waits before it is written
+            flush_batch: Number of pending changes that triggers an early write
+        """
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._pending: Dict[str, Record] = {}
+        self._flushing: Dict[str, Record] = {}
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def start(self) -> None:
+        """Start the background writer."""
+        if self._task is not None:
+            return
+        self._flush_requested = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    async def close(self) -> None:
+        """Stop the background writer and write all pending changes."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        """Build the compact database key of a conversation."""
+        return ":".join(
+            str(part) if part is not None else ""
+            for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny)
+        )
+
+    async def _load(self, key: str) -> Record:
+        """Return the current record of a conversation, pending changes included."""
+        record = self._pending.get(key) or self._flushing.get(key)
+        if record is not None:
+            if record[2] >= time.time() - self.ttl:
+                return record
+            return None, None, record[2]
+        stored = await get_fsm_record(key, self.ttl)
+        if stored is None:
+            return None, None, 0.0
+        return stored[0], stored[1], 0.0
+
+    def _store(self, key: str, state: Optional[str], data: Optional[str]) -> None:
+        """Queue a record to be written."""
+        self._pending[key] = (state, data, time.time())
+        if len(self._pending) >= self.flush_batch and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Set the state of a conversation."""
+        db_key = self._key(key)
+        _, data, _ = await self._load(db_key)
+        self._store(db_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Return the state of a conversation."""
+        state, _, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        """Replace the data of a conversation."""
+        db_key = self._key(key)
+        state, _, _ = await self._load(db_key)
+        serialized = json.dumps(data, ensure_ascii=False, separators=(",", ":")) if data else None
+        self._store(db_key, state, serialized)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Return a copy of the data of a conversation."""
+        _, data, _ = await self._load(self._key(key))
+        return json.loads(data) if data else {}
+
+    async def flush(self) -> None:
+        """Write all pending changes in one transaction."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await save_fsm_records([
+                    (key, state, data, updated_at)
+                    for key, (state, data, updated_at) in self._flushing.items()
+                ])
+            except Exception:
+                # Keep the changes for the next attempt unless they were overwritten meanwhile
+                self._pending = {**self._flushing, **self._pending}
+                raise
+            finally:
+                self._flushing = {}
+
+    async def _writer(self) -> None:
+        """Periodically write pending changes and delete expired conversations."""
+        last_cleanup = time.monotonic()
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - last_cleanup >= min(self.ttl, 3600):
+                    deleted = await delete_expired_fsm_records(self.ttl)
+                    last_cleanup = time.monotonic()
+                    if deleted:
+                        logging.info(f"Deleted {deleted} expired conversation states")
+            except Exception as e:
+                logging.error(f"Error writing conversation states: {e}")
+
+
+# Shared FSM storage, started on startup and flushed on shutdown
+storage = SQLiteStorage(ttl=FSM_STATE_TTL, flush_interval=FSM_FLUSH_INTERVAL, flush_batch=FSM_FLUSH_BATCH)
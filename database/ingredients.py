@@ -0,0 +1,82 @@
+import re
+from typing import List
+
+# Measurement units and filler words dropped from ingredient lines
+UNITS = {
+    "g", "gr", "kg", "mg", "ml", "l", "cl", "dl", "oz", "lb", "lbs",
+    "cup", "cups", "tbsp", "tsp", "tablespoon", "tablespoons", "teaspoon", "teaspoons",
+    "pinch", "piece", "pieces", "pcs", "pc", "slice", "slices", "clove", "cloves", "can", "cans",
+    "г", "гр", "кг", "мг", "мл", "л", "ст", "ч", "шт", "стакан", "стакана", "стаканов",
+    "ложка", "ложки", "ложек", "щепотка", "щепотки", "зубчик", "зубчика", "зубчиков",
+}
+FILLERS = {
+    "to", "taste", "of", "a", "an", "some", "fresh", "optional",
+    "по", "вкусу", "для", "свежий", "свежая", "свежие",
+}
+
+# Separators between ingredients in the free-text field
+_SEPARATORS = re.compile(r"[\n,;]+")
+# Parenthesised remarks such as "(about 200 g)"
+_REMARKS = re.compile(r"\([^)]*\)")
+_WORDS = re.compile(r"[^\W\d_]+")
+
+def _singular(word: str) -> str:
+    """Reduce a simple English plural to its singular form."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def normalize_ingredient(line: str) -> str:
+    """Normalize a single ingredient line, e.g. "2 cups Tomatoes (ripe)" -> "tomato".
+
+    Args:
+        line: One ingredient as written by the user
+
+    Returns:
+        The normalized ingredient name, or an empty string if nothing is left
+    """
+    line = _REMARKS.sub(" ", line.lower())
+    words = [
+        _singular(word) for word in _WORDS.findall(line)
+        if word not in UNITS and word not in FILLERS
+    ]
+    return " ".join(words)
+
+def normalize_ingredients(text: str) -> List[str]:
+    """Split a free-text ingredient list into normalized ingredient names.
+
+    Args:
+        text: Ingredients separated by new lines, commas or semicolons
+
+    Returns:
+        Unique normalized names in their original order
+    """
+    names = []
+    for line in _SEPARATORS.split(text):
+        name = normalize_ingredient(line)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def ingredient_terms(text: str) -> List[str]:
+    """Return the terms under which a recipe's ingredients are indexed.
+
+    Every normalized name is indexed as a whole, and the words of multi-word
+    names are indexed on their own too, so "oil" finds "olive oil".
+
+    Args:
+        text: The recipe's free-text ingredient list
+
+    Returns:
+        Unique index terms
+    """
+    terms = []
+    for name in normalize_ingredients(text):
+        for term in [name] + name.split():
+            if term not in terms:
+                terms.append(term)
+    return terms
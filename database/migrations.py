@@ -0,0 +1,316 @@
+import json
+import logging
+from typing import Awaitable, Callable, List
+
+import aiosqlite
+
+from config import CATEGORY_NAMES
+from database.ingredients import ingredient_terms
+
+# A migration receives the writer connection inside an open transaction
+Migration = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+# First id of categories found in old recipes but not in CATEGORY_NAMES, far
+# above the configured ids, so appending to CATEGORY_NAMES never reuses one
+LEGACY_CATEGORY_ID = 1000
+
+async def _create_recipes_table(db: aiosqlite.Connection) -> None:
+    """Version 1: the original recipes table."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS recipes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT NOT NULL,
+        title TEXT NOT NULL,
+        ingredients TEXT NOT NULL,
+        instructions TEXT NOT NULL,
+        video_link TEXT
+    )
+    """)
+
+async def _create_category_title_index(db: aiosqlite.Connection) -> None:
+    """Version 2: covering index for listing recipes of a category by title."""
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recipes_category_title ON recipes (category, title, id)"
+    )
+
+async def _create_recipes_fts(db: aiosqlite.Connection) -> None:
+    """Version 3: FTS5 full-text index over recipe title, ingredients and instructions."""
+    await db.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+        title, ingredients, instructions,
+        content='recipes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """)
+    # External content tables are kept in sync by triggers on the recipes table
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_insert AFTER INSERT ON recipes BEGIN
+        INSERT INTO recipes_fts (rowid, title, ingredients, instructions)
+        VALUES (new.id, new.title, new.ingredients, new.instructions);
+    END
+    """)
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_delete AFTER DELETE ON recipes BEGIN
+        INSERT INTO recipes_fts (recipes_fts, rowid, title, ingredients, instructions)
+        VALUES ('delete', old.id, old.title, old.ingredients, old.instructions);
+    END
+    """)
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_update AFTER UPDATE ON recipes BEGIN
+        INSERT INTO recipes_fts (recipes_fts, rowid, title, ingredients, instructions)
+        VALUES ('delete', old.id, old.title, old.ingredients, old.instructions);
+        INSERT INTO recipes_fts (rowid, title, ingredients, instructions)
+        VALUES (new.id, new.title, new.ingredients, new.instructions);
+    END
+    """)
+    # Index the recipes that existed before this migration
+    await db.execute("INSERT INTO recipes_fts (recipes_fts) VALUES ('rebuild')")
+
+async def _create_recipe_ingredients(db: aiosqlite.Connection) -> None:
+    """Version 4: inverted index from normalized ingredient to recipe."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS recipe_ingredients (
+        ingredient TEXT NOT NULL,
+        recipe_id INTEGER NOT NULL,
+        PRIMARY KEY (ingredient, recipe_id)
+    ) WITHOUT ROWID
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe ON recipe_ingredients (recipe_id)"
+    )
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS recipe_ingredients_delete AFTER DELETE ON recipes BEGIN
+        DELETE FROM recipe_ingredients WHERE recipe_id = old.id;
+    END
+    """)
+    # Index the recipes that existed before this migration
+    async with db.execute("SELECT id, ingredients FROM recipes") as cursor:
+        async for row in cursor:
+            await db.executemany(
+                "INSERT OR IGNORE INTO recipe_ingredients (ingredient, recipe_id) VALUES (?, ?)",
+                [(term, row[0]) for term in ingredient_terms(row[1])]
+            )
+
+async def _create_ai_response_cache(db: aiosqlite.Connection) -> None:
+    """Version 5: persistent cache of AI answers with MinHash LSH bands for near-duplicates."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS ai_responses (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        signature BLOB NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL
+    )
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ai_responses_last_used ON ai_responses (last_used_at)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ai_responses_created ON ai_responses (created_at)"
+    )
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS ai_response_bands (
+        band INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        PRIMARY KEY (band, key)
+    ) WITHOUT ROWID
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ai_response_bands_key ON ai_response_bands (key)"
+    )
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS ai_response_bands_delete AFTER DELETE ON ai_responses BEGIN
+        DELETE FROM ai_response_bands WHERE key = old.key;
+    END
+    """)
+
+async def _create_fsm_storage(db: aiosqlite.Connection):
+    """Version 6: conversation states of the FSM storage."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT,
+        updated_at REAL NOT NULL
+    )
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)"
+    )
+
+async def _create_users(db: aiosqlite.Connection):
+    """Version 7: per-user settings such as the interface language."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        language TEXT NOT NULL
+    )
+    """)
+
+async def sync_categories(db: aiosqlite.Connection) -> None:
+    """Add the categories of CATEGORY_NAMES and update their names.
+
+    A category's id is its position in the name lists, so categories must
+    only ever be appended there.
+    """
+    await db.executemany(
+        "INSERT OR IGNORE INTO categories (id) VALUES (?)",
+        [(category_id,) for category_id in range(max(len(names) for names in CATEGORY_NAMES.values()))]
+    )
+    await db.executemany(
+        """INSERT INTO category_names (category_id, language, name) VALUES (?, ?, ?)
+           ON CONFLICT (category_id, language) DO UPDATE SET name = excluded.name""",
+        [
+            (category_id, language, name)
+            for language, names in CATEGORY_NAMES.items()
+            for category_id, name in enumerate(names)
+        ]
+    )
+
+async def _create_categories(db: aiosqlite.Connection):
+    """Version 8: categories table with per-language names and trigger-maintained recipe counts."""
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        recipe_count INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS category_names (
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        language TEXT NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (category_id, language)
+    ) WITHOUT ROWID
+    """)
+    await sync_categories(db)
+
+    # Recipes were stored with the category name in LANGUAGE; any language is recognized
+    ids = {name.lower(): category_id for language, names in CATEGORY_NAMES.items() for category_id, name in enumerate(names)}
+    next_id = LEGACY_CATEGORY_ID
+    async with db.execute("SELECT DISTINCT category FROM recipes") as cursor:
+        stored = [row[0] for row in await cursor.fetchall()]
+    mapping = []
+    for category in stored:
+        category_id = ids.get(category.lower())
+        if category_id is None:
+            # Unknown names become categories of their own, named the same in every language
+            category_id = ids[category.lower()] = next_id
+            next_id += 1
+            await db.execute("INSERT INTO categories (id) VALUES (?)", (category_id,))
+            await db.executemany(
+                "INSERT INTO category_names (category_id, language, name) VALUES (?, ?, ?)",
+                [(category_id, language, category) for language in CATEGORY_NAMES]
+            )
+        mapping.append((category, category_id))
+    await db.execute("CREATE TEMP TABLE category_ids (category TEXT PRIMARY KEY, category_id INTEGER NOT NULL)")
+    await db.executemany("INSERT INTO category_ids (category, category_id) VALUES (?, ?)", mapping)
+
+    # The table is rebuilt with category_id in place of the name; ALTER TABLE
+    # DROP COLUMN would need SQLite 3.35. Its triggers are recreated as they were.
+    async with db.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'recipes'") as cursor:
+        triggers = [row[0] for row in await cursor.fetchall()]
+    async with db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'recipes'") as cursor:
+        sequence = await cursor.fetchone()
+    await db.execute("""
+    CREATE TABLE recipes_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        title TEXT NOT NULL,
+        ingredients TEXT NOT NULL,
+        instructions TEXT NOT NULL,
+        video_link TEXT
+    )
+    """)
+    await db.execute("""
+    INSERT INTO recipes_new (id, category_id, title, ingredients, instructions, video_link)
+    SELECT recipes.id, category_ids.category_id, recipes.title, recipes.ingredients, recipes.instructions, recipes.video_link
+    FROM recipes JOIN category_ids ON category_ids.category = recipes.category
+    """)
+    await db.execute("DROP TABLE recipes")
+    await db.execute("DROP TABLE temp.category_ids")
+    await db.execute("ALTER TABLE recipes_new RENAME TO recipes")
+    # Ids of deleted recipes stay retired
+    if sequence is not None:
+        await db.execute("DELETE FROM sqlite_sequence WHERE name = 'recipes'")
+        await db.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('recipes', ?)", (sequence[0],))
+    for trigger in triggers:
+        await db.execute(trigger)
+    # The covering index now starts with the id
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recipes_category_title ON recipes (category_id, title, id)"
+    )
+
+    # Counts follow every insert, delete and change of category
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS categories_count_insert AFTER INSERT ON recipes BEGIN
+        UPDATE categories SET recipe_count = recipe_count + 1 WHERE id = new.category_id;
+    END
+    """)
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS categories_count_delete AFTER DELETE ON recipes BEGIN
+        UPDATE categories SET recipe_count = recipe_count - 1 WHERE id = old.category_id;
+    END
+    """)
+    await db.execute("""
+    CREATE TRIGGER IF NOT EXISTS categories_count_update AFTER UPDATE OF category_id ON recipes
+    WHEN old.category_id IS NOT new.category_id BEGIN
+        UPDATE categories SET recipe_count = recipe_count - 1 WHERE id = old.category_id;
+        UPDATE categories SET recipe_count = recipe_count + 1 WHERE id = new.category_id;
+    END
+    """)
+    await db.execute(
+        "UPDATE categories SET recipe_count = (SELECT COUNT(*) FROM recipes WHERE category_id = categories.id)"
+    )
+
+    # Conversations in progress keep their category as an id too
+    async with db.execute("SELECT key, data FROM fsm_states WHERE data IS NOT NULL") as cursor:
+        states = await cursor.fetchall()
+    updates = []
+    for key, data in states:
+        values = json.loads(data)
+        if isinstance(values.get("category"), str):
+            values["category"] = ids.get(values["category"].lower())
+            updates.append((json.dumps(values, ensure_ascii=False, separators=(",", ":")), key))
+    await db.executemany("UPDATE fsm_states SET data = ? WHERE key = ?", updates)
+
+# Schema migrations in order; PRAGMA user_version stores how many have been applied
+MIGRATIONS: List[Migration] = [
+    _create_recipes_table,
+    _create_category_title_index,
+    _create_recipes_fts,
+    _create_recipe_ingredients,
+    _create_ai_response_cache,
+    _create_fsm_storage,
+    _create_users,
+    _create_categories,
+]
+
+async def apply_migrations(db: aiosqlite.Connection) -> int:
+    """Apply all pending migrations.
+
+    All pending migrations run in a single transaction, so a failure leaves
+    the schema at its previous version.
+
+    Args:
+        db: The writer connection
+
+    Returns:
+        The schema version after migrating
+    """
+    async with db.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+        version = row[0]
+
+    if version < len(MIGRATIONS):
+        # DDL does not open a transaction implicitly, so start one explicitly
+        await db.execute("BEGIN IMMEDIATE")
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logging.info(f"Applying database migration {number}: {migration.__doc__}")
+        await migration(db)
+        # PRAGMA does not accept bound parameters
+        await db.execute(f"PRAGMA user_version = {number}")
+
+    return max(version, len(MIGRATIONS))
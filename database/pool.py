@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List, Optional
+
+import aiosqlite
+
+from metrics import db_queries_in_flight, db_query_seconds, db_wait_seconds
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections: a small pool of readers and one serialized writer.
+
+    Opening an aiosqlite connection starts a worker thread and a file handle, so
+    the pool keeps them open for the lifetime of the bot instead of paying that
+    cost on every query.
+    """
+
+    def __init__(self, database: str, readers: int = 4, pragmas: Iterable[str] = ()):
+        """Create a pool for the given database file.
+
+        Args:
+            database: Path to the SQLite database file
+            readers: Number of connections reserved for reads to keep open
+            pragmas: PRAGMA statements executed on every new connection
+        """
+        self.database = database
+        self.size = max(1, readers)
+        self.pragmas = list(pragmas)
+        self._readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if the pool has been opened and not closed yet."""
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open a single connection with row access by column name."""
+        connection = await aiosqlite.connect(self.database)
+        connection.row_factory = aiosqlite.Row
+        for pragma in self.pragmas:
+            await connection.execute(pragma)
+        return connection
+
+    async def open(self) -> None:
+        """Open the writer and all reader connections."""
+        if self.is_open:
+            return
+        self._writer = await self._connect()
+        for _ in range(self.size):
+            connection = await self._connect()
+            self._all_readers.append(connection)
+            self._readers.put_nowait(connection)
+        logging.info(f"Database pool opened with {self.size} readers")
+
+    async def close(self) -> None:
+        """Close every connection owned by the pool."""
+        if not self.is_open:
+            return
+        async with self._write_lock:
+            for connection in self._all_readers:
+                await connection.close()
+            self._all_readers.clear()
+            self._readers = asyncio.Queue()
+            await self._writer.close()
+            self._writer = None
+        logging.info("Database pool closed")
+
+    @asynccontextmanager
+    async def reader(self, name: str = "read") -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a reader connection for the duration of the block.
+
+        Args:
+            name: Query name the time the connection is held is recorded under
+        """
+        start = time.perf_counter()
+        connection = await self._readers.get()
+        acquired = time.perf_counter()
+        db_wait_seconds.observe(acquired - start, "read")
+        db_queries_in_flight.inc("read")
+        try:
+            yield connection
+        finally:
+            self._readers.put_nowait(connection)
+            db_queries_in_flight.dec("read")
+            db_query_seconds.observe(time.perf_counter() - acquired, name)
+
+    @asynccontextmanager
+    async def writer(self, name: str = "write") -> AsyncIterator[aiosqlite.Connection]:
+        """Hold the writer connection exclusively and run the block as one transaction.
+
+        The transaction is committed when the block exits normally and rolled
+        back if it raises.
+
+        Args:
+            name: Query name the time the connection is held is recorded under
+        """
+        start = time.perf_counter()
+        async with self._write_lock:
+            acquired = time.perf_counter()
+            db_wait_seconds.observe(acquired - start, "write")
+            db_queries_in_flight.inc("write")
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
+            finally:
+                db_queries_in_flight.dec("write")
+                db_query_seconds.observe(time.perf_counter() - acquired, name)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+
+from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramBadRequest, TelegramEntityTooLarge
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+
+from config import ADMIN_IDS, MAX_MESSAGE_LENGTH
+from database.bulk import FORMATS, BulkImportError, export_recipes, format_for, import_recipes
+from profiler import MODES, ProfileReport, ProfilerBusyError, profiler
+from services.outbound import outbound
+from translations import get_text
+
+# Initialize router; other users' messages fall through to the user handlers
+router = Router()
+router.message.filter(F.from_user.id.in_(set(ADMIN_IDS)))
+
+@router.message(Command("profile"))
+async def profile_command(message: Message, command: CommandObject):
+    """Profile the bot under live traffic and send the result: /profile [seconds] [sample|cprofile]."""
+    seconds = None
+    mode = "sample"
+    for arg in (command.args or "").split():
+        if arg.lower() in MODES:
+            mode = arg.lower()
+        elif arg.replace(".", "", 1).isdigit():
+            seconds = float(arg)
+        else:
+            outbound.post(message.answer(get_text("profile_usage", modes=" | ".join(MODES), max_seconds=f"{profiler.max_seconds:.0f}")))
+            return
+
+    async def send_report(report: ProfileReport):
+        await message.answer(get_text("profile_finished", path=report.path) + "\n\n" + report.summary[:MAX_MESSAGE_LENGTH])
+        await message.answer_document(FSInputFile(report.path))
+
+    try:
+        seconds = profiler.start(seconds, mode, on_finish=send_report)
+    except ProfilerBusyError:
+        outbound.post(message.answer(get_text("profile_busy")))
+        return
+    outbound.post(message.answer(get_text("profile_started", seconds=f"{seconds:.0f}", mode=mode)))
+
+@router.message(Command("import"), F.document)
+async def import_command(message: Message, bot: Bot):
+    """Import the recipes of a JSONL or CSV file sent with the caption /import."""
+    try:
+        format_name = format_for(message.document.file_name or "")
+    except ValueError:
+        outbound.post(message.answer(get_text("import_usage")))
+        return
+
+    outbound.post(message.answer(get_text("import_started")))
+    try:
+        # Files are streamed from disk, never read into memory at once
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "recipes")
+            await bot.download(message.document, destination=path)
+            # utf-8-sig skips the byte order mark spreadsheet programs write
+            with open(path, encoding="utf-8-sig", newline="") as file:
+                report = await import_recipes(file, format_name)
+    except BulkImportError as e:
+        # Batches written before the failure stay imported
+        if e.report.rows:
+            outbound.post(message.answer(get_text("import_failed_partially", rows=e.report.rows, error=e)))
+        else:
+            outbound.post(message.answer(get_text("bulk_failed", error=e)))
+        return
+    # Files over 20 MB cannot be downloaded
+    except (TelegramBadRequest, TelegramEntityTooLarge) as e:
+        outbound.post(message.answer(get_text("bulk_failed", error=e)))
+        return
+    outbound.post(message.answer(get_text("import_finished", summary=report.summary()[:MAX_MESSAGE_LENGTH])))
+
+@router.message(Command("import"))
+async def import_usage(message: Message):
+    """Explain /import when it is sent without a file."""
+    outbound.post(message.answer(get_text("import_usage")))
+
+@router.message(Command("export"))
+async def export_command(message: Message, command: CommandObject):
+    """Send all recipes as a file: /export [jsonl|csv]."""
+    format_name = (command.args or "jsonl").strip().lower()
+    if format_name not in FORMATS.values():
+        outbound.post(message.answer(get_text("export_usage")))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"recipes.{format_name}")
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            report = await export_recipes(file, format_name)
+        # Awaited, so the file is sent before its directory is removed
+        try:
+            await message.answer_document(FSInputFile(path), caption=get_text("export_finished", summary=report.summary()))
+        # Bots cannot send files over 50 MB
+        except (TelegramBadRequest, TelegramEntityTooLarge) as e:
+            outbound.post(message.answer(get_text("bulk_failed", error=e)))
@@ -0,0 +1,117 @@
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import CommandObject
+from aiogram.fsm.state import State
+from aiogram.types import CallbackQuery, Message
+
+from keyboards.callbacks import ACTIONS, CallbackPayload
+from translations import button_key
+
+Handler = Callable[..., Any]
+StateType = Union[State, str, None]
+
+# Registers a handler for every state
+ANY_STATE = "*"
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    """Return the name stored by the FSM for a state, or ANY_STATE."""
+    return state.state if isinstance(state, State) else state
+
+
+class HashDispatch:
+    """Route messages and callback queries to handlers with hash table lookups.
+
+    aiogram checks the filters of every registered handler in turn until one
+    matches. Here each update is resolved in one step instead: reply keyboard
+    buttons by translation key, commands by name, other text messages by the
+    current state, and callback queries by (state, callback action). Callback
+    data must be decoded into `payload` by CallbackDataMiddleware.
+    Handlers receive the same arguments as regular aiogram handlers.
+
+    Messages are matched in that order: a button or command works in any
+    state, otherwise the handler of the current state gets the message.
+    Updates without a route fall through to the next handlers and routers.
+    """
+
+    def __init__(self, router: Router):
+        """Create the tables and register their entry points on a router.
+
+        Args:
+            router: Router the entry points are registered on
+        """
+        self._buttons: Dict[str, CallableObject] = {}
+        self._commands: Dict[str, CallableObject] = {}
+        self._states: Dict[Optional[str], CallableObject] = {}
+        self._callbacks: Dict[Tuple[Optional[str], str], CallableObject] = {}
+        router.message(self._route_message)(self._dispatch)
+        router.callback_query(self._route_callback)(self._dispatch)
+
+    def _register(self, table: Dict[Any, CallableObject], key: Any) -> Callable[[Handler], Handler]:
+        def decorator(handler: Handler) -> Handler:
+            if key in table:
+                raise ValueError(f"A handler is already registered for {key!r}")
+            table[key] = CallableObject(callback=handler)
+            return handler
+        return decorator
+
+    def button(self, key: str) -> Callable[[Handler], Handler]:
+        """Register a handler for a reply keyboard button, pressed in any language and state.
+
+        Args:
+            key: Translation key of the button text
+        """
+        return self._register(self._buttons, key)
+
+    def command(self, name: str) -> Callable[[Handler], Handler]:
+        """Register a handler for a command in any state; it receives the parsed `command`."""
+        return self._register(self._commands, name.lower())
+
+    def message(self, state: StateType) -> Callable[[Handler], Handler]:
+        """Register the handler for other messages sent in a state."""
+        return self._register(self._states, _state_name(state))
+
+    def callback(self, action: str, state: StateType = ANY_STATE) -> Callable[[Handler], Handler]:
+        """Register a handler for a callback action in a state; it receives the decoded `payload`.
+
+        Args:
+            action: One of keyboards.callbacks.ACTIONS
+            state: State the handler is limited to; any state by default
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown callback action {action!r}")
+        return self._register(self._callbacks, (_state_name(state), action))
+
+    async def _route_message(self, message: Message, raw_state: Optional[str] = None) -> Union[bool, Dict[str, Any]]:
+        """Filter resolving the handler of a message."""
+        text = message.text
+        route = self._buttons.get(button_key(text))
+        parts = text[1:].split(maxsplit=1) if route is None and text and text.startswith("/") else None
+        if parts:
+            name, _, mention = parts[0].partition("@")
+            route = self._commands.get(name.lower())
+            if route is not None:
+                command_object = CommandObject(prefix="/", command=name, mention=mention or None, args=parts[1] if len(parts) > 1 else None)
+                return {"route": route, "command": command_object}
+        if route is None:
+            route = self._states.get(raw_state)
+        return {"route": route} if route is not None else False
+
+    async def _route_callback(
+        self,
+        callback: CallbackQuery,
+        raw_state: Optional[str] = None,
+        payload: Optional[CallbackPayload] = None
+    ) -> Union[bool, Dict[str, Any]]:
+        """Filter resolving the handler of a callback query."""
+        if payload is None:
+            return False
+        route = self._callbacks.get((raw_state, payload.action)) or self._callbacks.get((ANY_STATE, payload.action))
+        return {"route": route} if route is not None else False
+
+    @staticmethod
+    async def _dispatch(event: Union[Message, CallbackQuery], route: CallableObject, **data: Any) -> Any:
+        """Entry handler calling the resolved handler."""
+        return await route.call(event, **data)
@@ -1,17 +1,36 @@
 import logging
-import aiohttp
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
-from aiogram import Router, F, types
-from aiogram.filters import Command, StateFilter
+from aiogram import Router, types
+from aiogram.filters import CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from config import CATEGORIES, AI_PROMPT_TEMPLATE, OPENROUTER_API_KEY, OPENROUTER_MODEL, MAX_MESSAGE_LENGTH
-from database.db import add_recipe, get_recipes_by_category, get_recipe_by_id, update_recipe, delete_recipe
+from config import (
+    AI_PROMPT_TEMPLATES,
+    AI_STREAMING,
+    AI_STREAM_EDIT_INTERVAL,
+    MAX_MESSAGE_LENGTH,
+    RECIPES_PAGE_SIZE
+)
+from database.db import (
+    add_recipe,
+    count_recipes_in_category,
+    count_recipes_by_ingredients,
+    count_search_results,
+    find_recipes_by_ingredients,
+    get_category_counts,
+    get_recipes_page,
+    search_recipes,
+    get_recipe_by_id,
+    set_user_language,
+    update_recipe,
+    delete_recipe
+)
 from keyboards.keyboards import (
     get_main_menu_keyboard, 
     get_cancel_keyboard, 
@@ -20,13 +39,24 @@ from keyboards.keyboards import (
     get_confirmation_keyboard,
     get_recipe_details_keyboard,
     get_navigation_keyboard,
-    get_done_keyboard
+    get_done_keyboard,
+    get_language_keyboard
 )
-from translations import get_text
+from handlers.dispatch import HashDispatch
+from keyboards.callbacks import NAVIGATION_STEPS, NEXT, YES, CallbackPayload
+from services.ai_cache import ai_cache, normalize_query, prompt_key
+from services.ai_client import AIClientError, ai_client
+from services.ai_queue import QueueFullError, UserLimitError, ai_queue
+from services.outbound import outbound
+from services.singleflight import SingleFlight
+from translations import LANGUAGES, button_key, category_names, current_language, get_category_name, get_text, resolve_language
 
 # Initialize router
 router = Router()
 
+# Buttons, commands, states and callback data are routed through hash tables
+routes = HashDispatch(router)
+
 # Define FSM states
 class RecipeStates(StatesGroup):
     # View recipe states
@@ -51,6 +81,10 @@ class RecipeStates(StatesGroup):
     confirming_edit = State()
     confirming_delete = State()
     
+    # Search states
+    searching = State()
+    matching_ingredients = State()
+    
     # AI assistant states
     asking_ai = State()
 
@@ -60,138 +94,305 @@ recipe_data: Dict[int, Dict[str, Any]] = {}
 # Store pagination data
 pagination_data: Dict[int, Dict[str, Any]] = {}
 
+# Identical AI questions asked at the same time share one API request
+ai_requests = SingleFlight()
+
+def get_total_pages(total: int) -> int:
+    """Return the number of recipe list pages needed for the given recipe count."""
+    return max(1, (total + RECIPES_PAGE_SIZE - 1) // RECIPES_PAGE_SIZE)
+
+async def get_category_pages(category: int, page: int) -> int:
+    """Return the number of pages of a category listing from its current recipe count.
+    
+    The count is read on every page turn, so recipes added or deleted since
+    the category was opened are taken into account. Page numbers count the
+    user's page turns, so the shown page is never past the last one.
+    """
+    return max(get_total_pages(await count_recipes_in_category(category)), page + 1)
+
+def get_category(payload: CallbackPayload) -> Optional[int]:
+    """Return the category id a category button stands for, or None if the id is unknown."""
+    category_id = payload.args[0]
+    return category_id if category_id in category_names else None
+
+async def store_page_cursor(state: FSMContext, recipes: List[Dict[str, Any]], page: int):
+    """Remember where the shown page starts, to show it again after viewing a recipe."""
+    await state.update_data(page=page, first_id=recipes[0]["id"])
+
+def get_listing_title(data: Dict[str, Any]) -> str:
+    """Return the header for the recipe list stored in state: a category or search results."""
+    if data.get("search_query"):
+        return get_text("search_results", query=data["search_query"], total=data.get("total", 0))
+    if data.get("ingredients_query"):
+        return get_text("ingredients_search_results", total=data.get("total", 0))
+    return get_text("recipes_in_category", category=get_category_name(data.get("category")))
+
+async def load_ranked_page(data: Dict[str, Any], page: int) -> Optional[List[Dict[str, Any]]]:
+    """Load a page of search or ingredient results stored in state.
+    
+    Ranked results are paged by offset. Returns None if the state holds a
+    category listing, which is paged by keyset cursor instead.
+    """
+    offset = page * RECIPES_PAGE_SIZE
+    if data.get("search_query"):
+        return await search_recipes(data["search_query"], offset=offset)
+    if data.get("ingredients_query"):
+        recipes = await find_recipes_by_ingredients(data["ingredients_query"], offset=offset)
+        # Show how many of the listed ingredients each recipe uses
+        return [
+            {"id": recipe["id"], "title": f"{recipe['title']} ({recipe['matched']})"}
+            for recipe in recipes
+        ]
+    return None
+
+async def show_ranked_results(message: Message, state: FSMContext, **query: str):
+    """Send the first page of results for a search or ingredient query.
+    
+    Exactly one of search_query or ingredients_query must be given.
+    """
+    data = {"search_query": None, "ingredients_query": None, **query}
+    if data["search_query"]:
+        total = await count_search_results(data["search_query"])
+        empty_state, empty_text = RecipeStates.searching, get_text("no_search_results", query=data["search_query"])
+    else:
+        total = await count_recipes_by_ingredients(data["ingredients_query"])
+        empty_state, empty_text = RecipeStates.matching_ingredients, get_text("no_ingredients_search_results")
+    
+    if not total:
+        await state.set_state(empty_state)
+        outbound.post(message.answer(empty_text, reply_markup=get_cancel_keyboard()))
+        return
+    
+    # Ranked results are browsed like a category
+    data.update(total=total, page=0)
+    recipes = await load_ranked_page(data, page=0)
+    await state.update_data(data)
+    await state.set_state(RecipeStates.viewing_recipes)
+    outbound.post(message.answer(
+        get_listing_title(data),
+        reply_markup=get_recipes_keyboard(recipes, page=0, total_pages=get_total_pages(total))
+    ))
+
 # Main menu handlers
-@router.message(F.text == get_text("view_recipe_button"))
+@routes.button("view_recipe_button")
 async def view_recipe_start(message: Message, state: FSMContext):
     """Handle the 'View Recipe' button click."""
+    # Only categories with recipes are offered, with their counts
+    counts = await get_category_counts()
+    if not any(counts.values()):
+        outbound.post(message.answer(get_text("no_recipes_yet")))
+        return
     await state.set_state(RecipeStates.viewing_categories)
-    await message.answer(
+    outbound.post(message.answer(
         get_text("select_category"), 
-        reply_markup=get_categories_keyboard()
-    )
+        reply_markup=get_categories_keyboard(counts)
+    ))
 
-@router.message(F.text == get_text("add_recipe_button"))
+@routes.button("add_recipe_button")
 async def add_recipe_start(message: Message, state: FSMContext):
     """Handle the 'Add Recipe' button click."""
     await state.set_state(RecipeStates.adding_category)
-    await message.answer(
+    outbound.post(message.answer(
         get_text("select_category_for_new"), 
         reply_markup=get_categories_keyboard()
-    )
-    await message.answer(
+    ))
+    outbound.post(message.answer(
         get_text("cancel_anytime"), 
         reply_markup=get_cancel_keyboard()
-    )
+    ))
 
-@router.message(F.text == get_text("ask_ai_button"))
+@routes.button("ask_ai_button")
 async def ask_ai_start(message: Message, state: FSMContext):
     """Handle the 'Ask AI' button click."""
     await state.set_state(RecipeStates.asking_ai)
-    await message.answer(
+    outbound.post(message.answer(
         get_text("ask_ai_prompt"), 
         reply_markup=get_cancel_keyboard()
-    )
+    ))
+
+@routes.command("search")
+async def search_start(message: Message, state: FSMContext, command: CommandObject):
+    """Handle the /search command, searching right away if a query follows it."""
+    if command.args and command.args.strip():
+        await show_ranked_results(message, state, search_query=command.args.strip())
+        return
+    
+    await state.set_state(RecipeStates.searching)
+    outbound.post(message.answer(
+        get_text("search_prompt"),
+        reply_markup=get_cancel_keyboard()
+    ))
+
+@routes.command("cook")
+async def ingredients_search_start(message: Message, state: FSMContext, command: CommandObject):
+    """Handle the /cook command: find recipes for the ingredients the user has."""
+    if command.args and command.args.strip():
+        await show_ranked_results(message, state, ingredients_query=command.args.strip())
+        return
+    
+    await state.set_state(RecipeStates.matching_ingredients)
+    outbound.post(message.answer(
+        get_text("ingredients_search_prompt"),
+        reply_markup=get_cancel_keyboard()
+    ))
+
+@routes.command("language")
+async def language_start(message: Message):
+    """Handle the /language command: let the user choose the interface language."""
+    outbound.post(message.answer(
+        get_text("language_prompt"),
+        reply_markup=get_language_keyboard()
+    ))
+
+@routes.callback("language")
+async def process_language_selection(callback: CallbackQuery, payload: CallbackPayload):
+    """Store the chosen language and show the menu in it."""
+    language_id = payload.args[0]
+    if language_id >= len(LANGUAGES):
+        outbound.post(callback.answer())
+        return
+    language = LANGUAGES[language_id]
+    
+    await set_user_language(callback.from_user.id, language)
+    # The rest of this update is already answered in the new language
+    current_language.set(language)
+    
+    if callback.message:
+        outbound.post(callback.message.edit_text(get_text("language_changed")))
+        outbound.post(callback.message.answer(
+            get_text("choose_menu_item"),
+            reply_markup=get_main_menu_keyboard()
+        ))
+    outbound.post(callback.answer())
 
 # Cancel handler - works in any state
-@router.message(F.text == get_text("cancel_button"))
+@routes.button("cancel_button")
 async def cancel_handler(message: Message, state: FSMContext):
     """Handle the 'Cancel' button click in any state."""
     current_state = await state.get_state()
     if current_state is None:
         return
     
+    # Drop the user's queued or running AI questions
+    if current_state == RecipeStates.asking_ai and message.from_user:
+        ai_queue.cancel_user(message.from_user.id)
+    
     # Clear state and return to main menu
     await state.clear()
-    await message.answer(
+    outbound.post(message.answer(
         get_text("action_cancelled"), 
         reply_markup=get_main_menu_keyboard()
-    )
+    ))
 
 # View recipe handlers
-@router.callback_query(StateFilter(RecipeStates.viewing_categories), F.data.startswith("category:"))
-async def process_category_selection_for_viewing(callback: CallbackQuery, state: FSMContext):
+@routes.callback("category", RecipeStates.viewing_categories)
+async def process_category_selection_for_viewing(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Process category selection when viewing recipes."""
     # Extract category from callback data
-    # Check if callback.data exists before splitting
-    category = callback.data.split(":")[1] if callback.data else None
-    if not category:
-        await callback.answer(get_text("invalid_category"))
+    category = get_category(payload)
+    if category is None:
+        outbound.post(callback.answer(get_text("invalid_category")))
         return
     
-    # Get recipes for this category
-    recipes = await get_recipes_by_category(category)
+    # Get the first page of recipes for this category
+    recipes = await get_recipes_page(category)
     
     if not recipes:
         if callback.message:
-            await callback.message.edit_text(
-                get_text("no_recipes_in_category", category=category),
-                reply_markup=get_categories_keyboard()
-            )
+            outbound.post(callback.message.edit_text(
+                get_text("no_recipes_in_category", category=get_category_name(category)),
+                reply_markup=get_categories_keyboard(await get_category_counts())
+            ))
         else:
-            await callback.answer(get_text("no_recipes_in_category", category=category))
+            outbound.post(callback.answer(get_text("no_recipes_in_category", category=get_category_name(category))))
         return
     
-    # Store category and recipes in state data
-    await state.update_data(category=category, recipes=recipes)
+    # Store category and the page cursor in state data; the count is read again on every page turn
+    await state.update_data(category=category, search_query=None, ingredients_query=None)
+    await store_page_cursor(state, recipes, page=0)
     
     # Set state to viewing recipes
     await state.set_state(RecipeStates.viewing_recipes)
     
     # Show recipes with pagination
     if callback.message:
-        await callback.message.edit_text(
-            get_text("recipes_in_category", category=category),
-            reply_markup=get_recipes_keyboard(recipes, page=0)
-        )
+        outbound.post(callback.message.edit_text(
+            get_text("recipes_in_category", category=get_category_name(category)),
+            reply_markup=get_recipes_keyboard(recipes, page=0, total_pages=await get_category_pages(category, 0))
+        ))
     else:
-        await callback.answer(get_text("recipes_in_category", category=category))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("recipes_in_category", category=get_category_name(category))))
+    outbound.post(callback.answer())
 
-@router.callback_query(StateFilter(RecipeStates.viewing_recipes), F.data.startswith("page:"))
-async def process_recipe_pagination(callback: CallbackQuery, state: FSMContext):
+@routes.callback("page", RecipeStates.viewing_recipes)
+async def process_recipe_pagination(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Handle pagination when viewing recipe list."""
-    # Get page number from callback data
-    page = int(callback.data.split(":")[1])
+    # The button carries the target page and the recipe id next to it
+    page, direction, anchor_id = payload.args
     
-    # Get stored recipes from state
     data = await state.get_data()
-    recipes = data.get("recipes", [])
-    category = data.get("category", "")
+    category = data.get("category")
+    
+    if data.get("search_query") or data.get("ingredients_query"):
+        recipes = await load_ranked_page(data, page)
+        await state.update_data(page=page)
+        if callback.message:
+            outbound.post(callback.message.edit_text(
+                get_listing_title(data),
+                reply_markup=get_recipes_keyboard(recipes, page=page, total_pages=get_total_pages(data.get("total", 0)))
+            ))
+        outbound.post(callback.answer())
+        return
+    
+    if direction == NEXT:
+        recipes = await get_recipes_page(category, after_id=anchor_id)
+    else:
+        recipes = await get_recipes_page(category, before_id=anchor_id)
+    
+    # The cursor recipe may have been deleted meanwhile; start over from the first page
+    if not recipes:
+        recipes = await get_recipes_page(category)
+        page = 0
+    if not recipes:
+        outbound.post(callback.answer(get_text("no_recipes_in_category", category=get_category_name(category))))
+        return
+    
+    await store_page_cursor(state, recipes, page)
     
     # Update message with new page
     if callback.message:
-        await callback.message.edit_text(
-            get_text("recipes_in_category", category=category),
-            reply_markup=get_recipes_keyboard(recipes, page=page)
-        )
+        outbound.post(callback.message.edit_text(
+            get_text("recipes_in_category", category=get_category_name(category)),
+            reply_markup=get_recipes_keyboard(recipes, page=page, total_pages=await get_category_pages(category, page))
+        ))
     else:
-        await callback.answer(get_text("page_number", page=page+1))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("page_number", page=page+1)))
+    outbound.post(callback.answer())
 
-@router.callback_query(StateFilter(RecipeStates.viewing_recipes), F.data == "back_to_categories")
+@routes.callback("back_to_categories", RecipeStates.viewing_recipes)
 async def back_to_categories(callback: CallbackQuery, state: FSMContext):
     """Handle 'Back to Categories' button click."""
     await state.set_state(RecipeStates.viewing_categories)
     if callback.message:
-        await callback.message.edit_text(
+        outbound.post(callback.message.edit_text(
             get_text("select_category"), 
-            reply_markup=get_categories_keyboard()
-        )
+            reply_markup=get_categories_keyboard(await get_category_counts())
+        ))
     else:
-        await callback.answer(get_text("back_to_categories"))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("back_to_categories")))
+    outbound.post(callback.answer())
 
-@router.callback_query(StateFilter(RecipeStates.viewing_recipes), F.data.startswith("recipe:"))
-async def show_recipe_details(callback: CallbackQuery, state: FSMContext):
+@routes.callback("recipe", RecipeStates.viewing_recipes)
+async def show_recipe_details(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Show details for a selected recipe."""
     # Get recipe ID from callback data
-    recipe_id = int(callback.data.split(":")[1])
+    recipe_id = payload.args[0]
     
     # Get recipe details from database
     recipe = await get_recipe_by_id(recipe_id)
     
     if not recipe:
-        await callback.answer(get_text("recipe_not_found"))
+        outbound.post(callback.answer(get_text("recipe_not_found")))
         return
     
     # Format recipe details
@@ -211,50 +412,61 @@ async def show_recipe_details(callback: CallbackQuery, state: FSMContext):
     
     # Send recipe details
     if callback.message:
-        await callback.message.edit_text(
+        outbound.post(callback.message.edit_text(
             recipe_text,
             reply_markup=keyboard
-        )
+        ))
     else:
-        await callback.answer(get_text("view_recipe"))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("view_recipe")))
+    outbound.post(callback.answer())
 
-@router.callback_query(StateFilter(RecipeStates.viewing_recipe_details), F.data == "back_to_recipe_list")
+@routes.callback("back_to_recipe_list", RecipeStates.viewing_recipe_details)
 async def back_to_recipe_list(callback: CallbackQuery, state: FSMContext):
     """Handle 'Back to Recipe List' button click."""
-    # Get stored data
+    # Get stored data and reload the page the user came from
     data = await state.get_data()
-    recipes = data.get("recipes", [])
-    category = data.get("category", "")
+    category = data.get("category")
+    page = data.get("page", 0)
+    recipes = await load_ranked_page(data, page)
+    if recipes is None:
+        recipes = await get_recipes_page(category, start_id=data.get("first_id"))
+        if not recipes:
+            recipes = await get_recipes_page(category)
+            page = 0
+        if recipes:
+            await store_page_cursor(state, recipes, page)
+        total_pages = await get_category_pages(category, page)
+    else:
+        total_pages = get_total_pages(data.get("total", 0))
     
     # Go back to recipe list
     await state.set_state(RecipeStates.viewing_recipes)
     if callback.message:
-        await callback.message.edit_text(
-            get_text("recipes_in_category", category=category),
-            reply_markup=get_recipes_keyboard(recipes, page=0)
-        )
+        outbound.post(callback.message.edit_text(
+            get_listing_title(data),
+            reply_markup=get_recipes_keyboard(recipes, page=page, total_pages=total_pages)
+        ))
     else:
-        await callback.answer(get_text("back_to_recipe_list", category=category))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("back_to_recipe_list", category=get_category_name(category))))
+    outbound.post(callback.answer())
 
-@router.callback_query(StateFilter(RecipeStates.viewing_recipe_details), F.data.startswith("edit:"))
-async def start_recipe_edit(callback: CallbackQuery, state: FSMContext):
+@routes.callback("edit", RecipeStates.viewing_recipe_details)
+async def start_recipe_edit(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Handle 'Edit' button click for a recipe."""
     # Get recipe ID from callback data
-    recipe_id = int(callback.data.split(":")[1])
+    recipe_id = payload.args[0]
     
     # Get recipe details from database
     recipe = await get_recipe_by_id(recipe_id)
     
     if not recipe:
-        await callback.answer(get_text("recipe_not_found"))
+        outbound.post(callback.answer(get_text("recipe_not_found")))
         return
     
     # Store recipe data in state
     await state.update_data({
         "edit_recipe_id": recipe_id,
-        "category": recipe["category"],
+        "category": recipe["category_id"],
         "title": recipe["title"],
         "ingredients": recipe["ingredients"],
         "instructions": recipe["instructions"],
@@ -266,28 +478,28 @@ async def start_recipe_edit(callback: CallbackQuery, state: FSMContext):
     
     # Show title editing with navigation buttons
     if callback.message:
-        await callback.message.edit_text(
+        outbound.post(callback.message.edit_text(
             get_text("edit_title", current=recipe["title"]),
             reply_markup=get_navigation_keyboard()
-        )
-        await callback.message.answer(
+        ))
+        outbound.post(callback.message.answer(
             get_text("cancel_edit_anytime")
-        )
+        ))
     else:
-        await callback.answer(get_text("edit_recipe"))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("edit_recipe")))
+    outbound.post(callback.answer())
 
-@router.callback_query(StateFilter(RecipeStates.viewing_recipe_details), F.data.startswith("delete:"))
-async def confirm_recipe_delete(callback: CallbackQuery, state: FSMContext):
+@routes.callback("delete", RecipeStates.viewing_recipe_details)
+async def confirm_recipe_delete(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Handle 'Delete' button click for a recipe."""
     # Get recipe ID from callback data
-    recipe_id = int(callback.data.split(":")[1])
+    recipe_id = payload.args[0]
     
     # Get recipe details from database
     recipe = await get_recipe_by_id(recipe_id)
     
     if not recipe:
-        await callback.answer(get_text("recipe_not_found"))
+        outbound.post(callback.answer(get_text("recipe_not_found")))
         return
     
     # Store recipe ID in state
@@ -298,20 +510,40 @@ async def confirm_recipe_delete(callback: CallbackQuery, state: FSMContext):
     
     # Ask for confirmation
     if callback.message:
-        await callback.message.edit_text(
+        outbound.post(callback.message.edit_text(
             get_text("confirm_delete", title=recipe["title"]),
             reply_markup=get_confirmation_keyboard()
-        )
+        ))
     else:
-        await callback.answer(get_text("confirm_delete_short"))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("confirm_delete_short")))
+    outbound.post(callback.answer())
+
+# Search handlers
+@routes.message(RecipeStates.searching)
+async def process_search_query(message: Message, state: FSMContext):
+    """Process the search text entered after /search."""
+    if not message.text or button_key(message.text) == "cancel_button":
+        return
+    
+    await show_ranked_results(message, state, search_query=message.text.strip())
+
+@routes.message(RecipeStates.matching_ingredients)
+async def process_ingredients_query(message: Message, state: FSMContext):
+    """Process the ingredient list entered after /cook."""
+    if not message.text or button_key(message.text) == "cancel_button":
+        return
+    
+    await show_ranked_results(message, state, ingredients_query=message.text.strip())
 
 # Add recipe handlers
-@router.callback_query(StateFilter(RecipeStates.adding_category), F.data.startswith("category:"))
-async def process_category_selection_for_adding(callback: CallbackQuery, state: FSMContext):
+@routes.callback("category", RecipeStates.adding_category)
+async def process_category_selection_for_adding(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Process category selection when adding a recipe."""
     # Extract category from callback data
-    category = callback.data.split(":")[1]
+    category = get_category(payload)
+    if category is None:
+        outbound.post(callback.answer(get_text("invalid_category")))
+        return
     
     # Store category in state data
     await state.update_data(category=category)
@@ -319,16 +551,16 @@ async def process_category_selection_for_adding(callback: CallbackQuery, state:
     # Move to next state - adding title
     await state.set_state(RecipeStates.adding_title)
     
-    await callback.message.answer(
-        get_text("selected_category", category=category),
+    outbound.post(callback.message.answer(
+        get_text("selected_category", category=get_category_name(category)),
         reply_markup=get_cancel_keyboard()
-    )
-    await callback.answer()
+    ))
+    outbound.post(callback.answer())
 
-@router.message(StateFilter(RecipeStates.adding_title))
+@routes.message(RecipeStates.adding_title)
 async def process_recipe_title(message: Message, state: FSMContext):
     """Process recipe title input."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Store title in state data
@@ -337,15 +569,15 @@ async def process_recipe_title(message: Message, state: FSMContext):
     # Move to next state - adding ingredients
     await state.set_state(RecipeStates.adding_ingredients)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("enter_ingredients"),
         reply_markup=get_cancel_keyboard()
-    )
+    ))
 
-@router.message(StateFilter(RecipeStates.adding_ingredients))
+@routes.message(RecipeStates.adding_ingredients)
 async def process_recipe_ingredients(message: Message, state: FSMContext):
     """Process recipe ingredients input."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Store ingredients in state data
@@ -354,15 +586,15 @@ async def process_recipe_ingredients(message: Message, state: FSMContext):
     # Move to next state - adding instructions
     await state.set_state(RecipeStates.adding_instructions)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("enter_instructions"),
         reply_markup=get_cancel_keyboard()
-    )
+    ))
 
-@router.message(StateFilter(RecipeStates.adding_instructions))
+@routes.message(RecipeStates.adding_instructions)
 async def process_recipe_instructions(message: Message, state: FSMContext):
     """Process recipe instructions input."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Store instructions in state data
@@ -371,15 +603,15 @@ async def process_recipe_instructions(message: Message, state: FSMContext):
     # Move to next state - adding video link (optional)
     await state.set_state(RecipeStates.adding_video_link)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("enter_video_link"),
         reply_markup=get_cancel_keyboard()
-    )
+    ))
 
-@router.message(StateFilter(RecipeStates.adding_video_link))
+@routes.message(RecipeStates.adding_video_link)
 async def process_recipe_video_link(message: Message, state: FSMContext):
     """Process recipe video link input."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Store video link in state data (or None if not provided)
@@ -391,7 +623,7 @@ async def process_recipe_video_link(message: Message, state: FSMContext):
     
     # Format recipe preview
     preview_text = f"🍽️ {recipe_data['title']}\n\n"
-    preview_text += f"{get_text('category_label')} {recipe_data['category']}\n\n"
+    preview_text += f"{get_text('category_label')} {get_category_name(recipe_data['category'])}\n\n"
     preview_text += f"{get_text('ingredients_label')}\n{recipe_data['ingredients']}\n\n"
     preview_text += f"{get_text('instructions_label')}\n{recipe_data['instructions']}"
     
@@ -401,24 +633,24 @@ async def process_recipe_video_link(message: Message, state: FSMContext):
     # Move to confirmation state
     await state.set_state(RecipeStates.confirming_recipe)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("check_recipe", preview=preview_text),
         reply_markup=get_confirmation_keyboard()
-    )
+    ))
 
-@router.callback_query(StateFilter(RecipeStates.confirming_recipe), F.data.startswith("confirm:"))
-async def confirm_recipe_addition(callback: CallbackQuery, state: FSMContext):
+@routes.callback("confirm", RecipeStates.confirming_recipe)
+async def confirm_recipe_addition(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Handle recipe confirmation."""
     # Get confirmation choice
-    choice = callback.data.split(":")[1]
+    choice = payload.args[0]
     
-    if choice == "yes":
+    if choice == YES:
         # Get recipe data
         recipe_data = await state.get_data()
         
         # Add recipe to database
         recipe_id = await add_recipe(
-            category=recipe_data["category"],
+            category_id=recipe_data["category"],
             title=recipe_data["title"],
             ingredients=recipe_data["ingredients"],
             instructions=recipe_data["instructions"],
@@ -426,36 +658,39 @@ async def confirm_recipe_addition(callback: CallbackQuery, state: FSMContext):
         )
         
         if callback.message:
-            await callback.message.edit_text(get_text("recipe_saved"))
+            outbound.post(callback.message.edit_text(get_text("recipe_saved")))
             # Return to main menu
-            await callback.message.answer(
+            outbound.post(callback.message.answer(
                 get_text("what_next"),
                 reply_markup=get_main_menu_keyboard()
-            )
+            ))
         else:
-            await callback.answer(get_text("recipe_saved"))
-        await callback.answer()
-    else:  # choice == "no"
+            outbound.post(callback.answer(get_text("recipe_saved")))
+        outbound.post(callback.answer())
+    else:  # choice == NO
         if callback.message:
-            await callback.message.edit_text(get_text("recipe_cancelled"))
+            outbound.post(callback.message.edit_text(get_text("recipe_cancelled")))
             # Return to main menu
-            await callback.message.answer(
+            outbound.post(callback.message.answer(
                 get_text("what_next"),
                 reply_markup=get_main_menu_keyboard()
-            )
+            ))
         else:
-            await callback.answer(get_text("recipe_cancelled"))
-        await callback.answer()
+            outbound.post(callback.answer(get_text("recipe_cancelled")))
+        outbound.post(callback.answer())
     
     # Clear state
     await state.clear()
 
 # Edit recipe handlers
-@router.callback_query(StateFilter(RecipeStates.editing_category), F.data.startswith("category:"))
-async def process_category_selection_for_editing(callback: CallbackQuery, state: FSMContext):
+@routes.callback("category", RecipeStates.editing_category)
+async def process_category_selection_for_editing(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Process category selection when editing a recipe."""
     # Extract category from callback data
-    category = callback.data.split(":")[1]
+    category = get_category(payload)
+    if category is None:
+        outbound.post(callback.answer(get_text("invalid_category")))
+        return
     
     # Update category in state data
     await state.update_data(category=category)
@@ -468,18 +703,18 @@ async def process_category_selection_for_editing(callback: CallbackQuery, state:
     await state.set_state(RecipeStates.editing_title)
     
     if callback.message:
-        await callback.message.edit_text(
+        outbound.post(callback.message.edit_text(
             get_text("edit_title", current=title),
             reply_markup=get_cancel_keyboard()
-        )
+        ))
     else:
-        await callback.answer(get_text("edit_title_short"))
-    await callback.answer()
+        outbound.post(callback.answer(get_text("edit_title_short")))
+    outbound.post(callback.answer())
 
-@router.message(StateFilter(RecipeStates.editing_title))
+@routes.message(RecipeStates.editing_title)
 async def process_recipe_title_edit(message: Message, state: FSMContext):
     """Process recipe title input when editing."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Update title in state data
@@ -492,15 +727,15 @@ async def process_recipe_title_edit(message: Message, state: FSMContext):
     # Move to next state - editing ingredients
     await state.set_state(RecipeStates.editing_ingredients)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("edit_ingredients", current=ingredients),
         reply_markup=get_navigation_keyboard()
-    )
+    ))
 
-@router.message(StateFilter(RecipeStates.editing_ingredients))
+@routes.message(RecipeStates.editing_ingredients)
 async def process_recipe_ingredients_edit(message: Message, state: FSMContext):
     """Process recipe ingredients input when editing."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Update ingredients in state data
@@ -513,15 +748,15 @@ async def process_recipe_ingredients_edit(message: Message, state: FSMContext):
     # Move to next state - editing instructions
     await state.set_state(RecipeStates.editing_instructions)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("edit_instructions", current=instructions),
         reply_markup=get_done_keyboard()
-    )
+    ))
 
-@router.message(StateFilter(RecipeStates.editing_instructions))
+@routes.message(RecipeStates.editing_instructions)
 async def process_recipe_instructions_edit(message: Message, state: FSMContext):
     """Process recipe instructions input when editing."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Update instructions in state data
@@ -532,7 +767,7 @@ async def process_recipe_instructions_edit(message: Message, state: FSMContext):
     
     # Format recipe preview
     preview_text = f"🍽️ {recipe_data['title']}\n\n"
-    preview_text += f"{get_text('category_label')} {recipe_data['category']}\n\n"
+    preview_text += f"{get_text('category_label')} {get_category_name(recipe_data['category'])}\n\n"
     preview_text += f"{get_text('ingredients_label')}\n{recipe_data['ingredients']}\n\n"
     preview_text += f"{get_text('instructions_label')}\n{recipe_data['instructions']}"
     
@@ -542,15 +777,15 @@ async def process_recipe_instructions_edit(message: Message, state: FSMContext):
     # Move to confirmation state
     await state.set_state(RecipeStates.confirming_edit)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("check_recipe_edit", preview=preview_text),
         reply_markup=get_confirmation_keyboard()
-    )
+    ))
 
-@router.message(StateFilter(RecipeStates.editing_video_link))
+@routes.message(RecipeStates.editing_video_link)
 async def process_recipe_video_link_edit(message: Message, state: FSMContext):
     """Process recipe video link input when editing."""
-    if not message.text or message.text == get_text("cancel_button"):
+    if not message.text or button_key(message.text) == "cancel_button":
         return
     
     # Update video link in state data (or None if not provided)
@@ -562,7 +797,7 @@ async def process_recipe_video_link_edit(message: Message, state: FSMContext):
     
     # Format recipe preview
     preview_text = f"🍽️ {recipe_data['title']}\n\n"
-    preview_text += f"{get_text('category_label')} {recipe_data['category']}\n\n"
+    preview_text += f"{get_text('category_label')} {get_category_name(recipe_data['category'])}\n\n"
     preview_text += f"{get_text('ingredients_label')}\n{recipe_data['ingredients']}\n\n"
     preview_text += f"{get_text('instructions_label')}\n{recipe_data['instructions']}"
     
@@ -572,28 +807,28 @@ async def process_recipe_video_link_edit(message: Message, state: FSMContext):
     # Move to confirmation state
     await state.set_state(RecipeStates.confirming_edit)
     
-    await message.answer(
+    outbound.post(message.answer(
         get_text("check_recipe_edit", preview=preview_text),
         reply_markup=get_confirmation_keyboard()
-    )
+    ))
 
 # Navigation button handlers
-@router.callback_query(F.data.startswith("navigation:"))
-async def handle_navigation_buttons(callback: CallbackQuery, state: FSMContext):
+@routes.callback("navigation")
+async def handle_navigation_buttons(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Handle navigation buttons (Next, Cancel, Done) in recipe editing flow."""
-    action = callback.data.split(":")[1]
+    action = NAVIGATION_STEPS[payload.args[0]] if payload.args[0] < len(NAVIGATION_STEPS) else None
     current_state = await state.get_state()
     
     if action == "cancel":
         # Cancel editing and return to main menu
         await state.clear()
         if callback.message:
-            await callback.message.edit_text(get_text("recipe_edit_cancelled"))
-            await callback.message.answer(
+            outbound.post(callback.message.edit_text(get_text("recipe_edit_cancelled")))
+            outbound.post(callback.message.answer(
                 get_text("what_next"),
                 reply_markup=get_main_menu_keyboard()
-            )
-        await callback.answer()
+            ))
+        outbound.post(callback.answer())
         return
     
     if action == "next":
@@ -605,26 +840,26 @@ async def handle_navigation_buttons(callback: CallbackQuery, state: FSMContext):
             ingredients = data.get("ingredients", "")
             await state.set_state(RecipeStates.editing_ingredients)
             if callback.message:
-                await callback.message.edit_text(
+                outbound.post(callback.message.edit_text(
                     get_text("edit_ingredients", current=ingredients),
                     reply_markup=get_navigation_keyboard()
-                )
+                ))
         
         elif current_state == RecipeStates.editing_ingredients:
             # Move to instructions editing
             instructions = data.get("instructions", "")
             await state.set_state(RecipeStates.editing_instructions)
             if callback.message:
-                await callback.message.edit_text(
+                outbound.post(callback.message.edit_text(
                     get_text("edit_instructions", current=instructions),
                     reply_markup=get_done_keyboard()
-                )
+                ))
     
     if action == "done":
         # Format recipe preview
         data = await state.get_data()
         preview_text = f"🍽️ {data['title']}\n\n"
-        preview_text += f"{get_text('category_label')} {data['category']}\n\n"
+        preview_text += f"{get_text('category_label')} {get_category_name(data['category'])}\n\n"
         preview_text += f"{get_text('ingredients_label')}\n{data['ingredients']}\n\n"
         preview_text += f"{get_text('instructions_label')}\n{data['instructions']}"
         
@@ -635,20 +870,20 @@ async def handle_navigation_buttons(callback: CallbackQuery, state: FSMContext):
         await state.set_state(RecipeStates.confirming_edit)
         
         if callback.message:
-            await callback.message.edit_text(
+            outbound.post(callback.message.edit_text(
                 get_text("check_recipe_edit", preview=preview_text),
                 reply_markup=get_confirmation_keyboard()
-            )
+            ))
     
-    await callback.answer()
+    outbound.post(callback.answer())
 
-@router.callback_query(StateFilter(RecipeStates.confirming_edit), F.data.startswith("confirm:"))
-async def confirm_recipe_edit(callback: CallbackQuery, state: FSMContext):
+@routes.callback("confirm", RecipeStates.confirming_edit)
+async def confirm_recipe_edit(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Handle recipe edit confirmation."""
     # Get confirmation choice
-    choice = callback.data.split(":")[1]
+    choice = payload.args[0]
     
-    if choice == "yes":
+    if choice == YES:
         # Get recipe data
         recipe_data = await state.get_data()
         recipe_id = recipe_data.get("edit_recipe_id")
@@ -656,7 +891,7 @@ async def confirm_recipe_edit(callback: CallbackQuery, state: FSMContext):
         # Update recipe in database
         success = await update_recipe(
             recipe_id=recipe_id,
-            category=recipe_data["category"],
+            category_id=recipe_data["category"],
             title=recipe_data["title"],
             ingredients=recipe_data["ingredients"],
             instructions=recipe_data["instructions"],
@@ -665,46 +900,46 @@ async def confirm_recipe_edit(callback: CallbackQuery, state: FSMContext):
         
         if success:
             if callback.message:
-                await callback.message.edit_text(get_text("recipe_updated"))
+                outbound.post(callback.message.edit_text(get_text("recipe_updated")))
                 # Return to main menu
-                await callback.message.answer(
+                outbound.post(callback.message.answer(
                     get_text("what_next"),
                     reply_markup=get_main_menu_keyboard()
-                )
+                ))
             else:
-                await callback.answer(get_text("recipe_updated"))
+                outbound.post(callback.answer(get_text("recipe_updated")))
         else:
             if callback.message:
-                await callback.message.edit_text(get_text("recipe_update_failed"))
+                outbound.post(callback.message.edit_text(get_text("recipe_update_failed")))
                 # Return to main menu
-                await callback.message.answer(
+                outbound.post(callback.message.answer(
                     get_text("what_next"),
                     reply_markup=get_main_menu_keyboard()
-                )
+                ))
             else:
-                await callback.answer(get_text("recipe_update_failed"))
-    else:  # choice == "no"
+                outbound.post(callback.answer(get_text("recipe_update_failed")))
+    else:  # choice == NO
         if callback.message:
-            await callback.message.edit_text(get_text("recipe_edit_cancelled"))
+            outbound.post(callback.message.edit_text(get_text("recipe_edit_cancelled")))
             # Return to main menu
-            await callback.message.answer(
+            outbound.post(callback.message.answer(
                 get_text("what_next"),
                 reply_markup=get_main_menu_keyboard()
-            )
+            ))
         else:
-            await callback.answer(get_text("recipe_edit_cancelled"))
+            outbound.post(callback.answer(get_text("recipe_edit_cancelled")))
     
-    await callback.answer()
+    outbound.post(callback.answer())
     # Clear state
     await state.clear()
 
-@router.callback_query(StateFilter(RecipeStates.confirming_delete), F.data.startswith("confirm:"))
-async def process_recipe_delete(callback: CallbackQuery, state: FSMContext):
+@routes.callback("confirm", RecipeStates.confirming_delete)
+async def process_recipe_delete(callback: CallbackQuery, state: FSMContext, payload: CallbackPayload):
     """Handle recipe delete confirmation."""
     # Get confirmation choice
-    choice = callback.data.split(":")[1]
+    choice = payload.args[0]
     
-    if choice == "yes":
+    if choice == YES:
         # Get recipe ID from state
         data = await state.get_data()
         recipe_id = data.get("delete_recipe_id")
@@ -714,25 +949,25 @@ async def process_recipe_delete(callback: CallbackQuery, state: FSMContext):
         
         if success:
             if callback.message:
-                await callback.message.edit_text(get_text("recipe_deleted"))
+                outbound.post(callback.message.edit_text(get_text("recipe_deleted")))
                 # Return to main menu
-                await callback.message.answer(
+                outbound.post(callback.message.answer(
                     get_text("what_next"),
                     reply_markup=get_main_menu_keyboard()
-                )
+                ))
             else:
-                await callback.answer(get_text("recipe_deleted"))
+                outbound.post(callback.answer(get_text("recipe_deleted")))
         else:
             if callback.message:
-                await callback.message.edit_text(get_text("recipe_delete_failed"))
+                outbound.post(callback.message.edit_text(get_text("recipe_delete_failed")))
                 # Return to main menu
-                await callback.message.answer(
+                outbound.post(callback.message.answer(
                     get_text("what_next"),
                     reply_markup=get_main_menu_keyboard()
-                )
+                ))
             else:
-                await callback.answer(get_text("recipe_delete_failed"))
-    else:  # choice == "no"
+                outbound.post(callback.answer(get_text("recipe_delete_failed")))
+    else:  # choice == NO
         # Get stored data to return to recipe details
         data = await state.get_data()
         recipe_id = data.get("delete_recipe_id")
@@ -751,92 +986,188 @@ async def process_recipe_delete(callback: CallbackQuery, state: FSMContext):
             
             # Return to recipe details
             await state.set_state(RecipeStates.viewing_recipe_details)
-            await callback.message.edit_text(
+            outbound.post(callback.message.edit_text(
                 recipe_text,
                 reply_markup=get_recipe_details_keyboard(recipe_id)
-            )
+            ))
         else:
             # Return to main menu if recipe not found
             if callback.message:
-                await callback.message.edit_text(get_text("recipe_delete_cancelled"))
-                await callback.message.answer(
+                outbound.post(callback.message.edit_text(get_text("recipe_delete_cancelled")))
+                outbound.post(callback.message.answer(
                     get_text("what_next"),
                     reply_markup=get_main_menu_keyboard()
-                )
+                ))
             else:
-                await callback.answer(get_text("recipe_delete_cancelled"))
+                outbound.post(callback.answer(get_text("recipe_delete_cancelled")))
             await state.clear()
     
-    await callback.answer()
+    outbound.post(callback.answer())
 
 # AI assistant handlers
-@router.message(StateFilter(RecipeStates.asking_ai))
-async def process_ai_query(message: Message, state: FSMContext):
-    """Process user query to AI assistant."""
-    if not message.text or message.text == get_text("cancel_button"):
-        return
-    
-    user_query = message.text.strip()
+def truncate_ai_response(text: str) -> str:
+    """Shorten an AI answer to fit into a single Telegram message."""
+    if len(text) > MAX_MESSAGE_LENGTH:
+        return text[:MAX_MESSAGE_LENGTH] + get_text("response_truncated")
+    return text
+
+def edit_ai_message(message: Message, text: str):
+    """Replace the text of the message that shows the AI answer.
     
-    # Show typing indicator
-    await message.answer(get_text("thinking"))
+    The edit is queued without waiting. An earlier edit still waiting for
+    the chat's rate limit is replaced, so only the latest text is sent.
+    """
+    outbound.post(message.edit_text(text))
+
+async def stream_ai_response(answer_message: Message, prompt: str) -> Tuple[str, str]:
+    """Stream the AI answer into answer_message, editing it as text arrives.
+    
+    Edits are rate limited to one per AI_STREAM_EDIT_INTERVAL seconds to stay
+    within Telegram's flood limits; the complete answer is always shown at the end.
+    
+    Returns:
+        The model that answered and its complete answer
+    """
+    model = ai_client.model
+    chunks = []
+    shown_length = 0
+    last_edit = time.monotonic()
+    async for model, chunk in ai_client.stream(prompt):
+        chunks.append(chunk)
+        now = time.monotonic()
+        if now - last_edit >= AI_STREAM_EDIT_INTERVAL:
+            text = "".join(chunks)
+            if len(text) != shown_length and shown_length <= MAX_MESSAGE_LENGTH:
+                edit_ai_message(answer_message, truncate_ai_response(text) + " ▌")
+                shown_length = len(text)
+                last_edit = now
+    
+    ai_response = "".join(chunks)
+    if not ai_response.strip():
+        raise AIClientError("OpenRouter returned an empty answer")
+    edit_ai_message(answer_message, truncate_ai_response(ai_response))
+    return model, ai_response
+
+async def answer_ai_query(message: Message, thinking_message: Message, user_query: str) -> str:
+    """Get the AI answer to a question and show it to the user.
+    
+    Questions answered while this one was queued are shown from the cache.
+    Otherwise the question is sent to the API, unless the same normalized
+    question is already in flight for another chat, in which case that
+    request's answer is reused.
+    
+    Returns:
+        The complete answer
+    """
+    # Answer in the user's language
+    language = resolve_language()
+    
+    # The question may have been answered for another chat while this one was queued
+    cached_response = await ai_cache.get(user_query, language)
+    if cached_response is not None:
+        edit_ai_message(thinking_message, truncate_ai_response(cached_response))
+        return cached_response
+    
+    # Format prompt with user query
+    prompt = AI_PROMPT_TEMPLATES[language].format(user_query=user_query)
+    shown = False
+    
+    async def request_answer() -> str:
+        nonlocal shown
+        shown = True
+        # Call OpenRouter API over the shared session
+        if AI_STREAMING:
+            model, ai_response = await stream_ai_response(thinking_message, prompt)
+        else:
+            model, ai_response = await ai_client.complete(prompt)
+            # Send AI response, truncated if too long
+            outbound.post(message.answer(truncate_ai_response(ai_response)))
+        await ai_cache.put(user_query, ai_response, language, model)
+        return ai_response
+    
+    ai_response = await ai_requests.do(prompt_key(normalize_query(user_query), language=language), request_answer)
+    
+    # Answers shared from another chat's request were not shown here yet
+    if not shown:
+        edit_ai_message(thinking_message, truncate_ai_response(ai_response))
+    return ai_response
+
+async def run_ai_query(message: Message, state: FSMContext, user_query: str):
+    """Answer a queued AI question and return the user to the main menu."""
+    # Show typing indicator; a streamed answer replaces this message
+    thinking_message = await message.answer(get_text("thinking"))
     
     try:
-        # Format prompt with user query
-        prompt = AI_PROMPT_TEMPLATE.format(user_query=user_query)
-        
-        # Call OpenRouter API
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": OPENROUTER_MODEL,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ]
-            }
-            
-            async with session.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logging.error(f"OpenRouter API error: {error_text}")
-                    await message.answer(
-                        get_text("ai_error"),
-                        reply_markup=get_main_menu_keyboard()
-                    )
-                    await state.clear()
-                    return
-                
-                result = await response.json()
-                ai_response = result["choices"][0]["message"]["content"]
-        
-        # Truncate response if too long
-        if len(ai_response) > MAX_MESSAGE_LENGTH:
-            ai_response = ai_response[:MAX_MESSAGE_LENGTH] + get_text("response_truncated") 
-        
-        # Send AI response
-        await message.answer(ai_response)
+        await answer_ai_query(message, thinking_message, user_query)
         
         # Return to main menu
-        await message.answer(
+        outbound.post(message.answer(
             get_text("what_next"),
             reply_markup=get_main_menu_keyboard()
-        )
+        ))
         
         # Clear state
         await state.clear()
         
+    except AIClientError as e:
+        logging.error(f"OpenRouter API error: {e}")
+        outbound.post(message.answer(
+            get_text("ai_error"),
+            reply_markup=get_main_menu_keyboard()
+        ))
+        await state.clear()
+        
     except Exception as e:
         logging.error(f"Error in AI processing: {e}")
-        await message.answer(
+        outbound.post(message.answer(
             get_text("processing_error"),
             reply_markup=get_main_menu_keyboard()
-        )
-        await state.clear()
\ No newline at end of file
+        ))
+        await state.clear()
+
+@routes.message(RecipeStates.asking_ai)
+async def process_ai_query(message: Message, state: FSMContext):
+    """Process user query to AI assistant by putting it into the AI queue."""
+    if not message.text or button_key(message.text) == "cancel_button":
+        return
+    
+    user_query = message.text.strip()
+    user_id = message.from_user.id if message.from_user else message.chat.id
+    
+    # Repeated questions are answered from the cache at once, without taking a queue slot
+    try:
+        cached_response = await ai_cache.get(user_query, resolve_language())
+    except Exception as e:
+        logging.error(f"Error reading the AI cache: {e}")
+        cached_response = None
+    if cached_response is not None:
+        outbound.post(message.answer(truncate_ai_response(cached_response)))
+        outbound.post(message.answer(
+            get_text("what_next"),
+            reply_markup=get_main_menu_keyboard()
+        ))
+        await state.clear()
+        return
+    
+    # The answer is produced by a queue worker, so this handler returns at once
+    try:
+        position = await ai_queue.submit(user_id, lambda: run_ai_query(message, state, user_query))
+    except UserLimitError:
+        outbound.post(message.answer(get_text("ai_user_limit")))
+        return
+    except QueueFullError:
+        outbound.post(message.answer(
+            get_text("ai_queue_full"),
+            reply_markup=get_main_menu_keyboard()
+        ))
+        await state.clear()
+        return
+    
+    if position:
+        outbound.post(message.answer(get_text("ai_queued", position=position)))
+
+# Buttons of older bot versions, or pressed in a state they do not belong to
+@router.callback_query()
+async def outdated_button(callback: CallbackQuery):
+    """Tell the user that a button no longer works."""
+    outbound.post(callback.answer(get_text("button_outdated")))
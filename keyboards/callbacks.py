@@ -0,0 +1,87 @@
+import base64
+import binascii
+from typing import NamedTuple, Optional, Tuple
+
+# Bumped whenever the encoding changes; buttons of other versions are rejected as outdated
+CALLBACK_VERSION = 1
+
+# Actions and their number of arguments. Append only: the position of an
+# action is its code in encoded callback data
+_ACTION_ARITIES = (
+    ("category", 1),  # category id: categories.id
+    ("page", 3),  # page number, PREV or NEXT, anchor recipe id
+    ("recipe", 1),  # recipe id
+    ("edit", 1),  # recipe id
+    ("delete", 1),  # recipe id
+    ("confirm", 1),  # YES or NO
+    ("navigation", 1),  # position in NAVIGATION_STEPS
+    ("language", 1),  # position in LANGUAGES
+    ("back_to_categories", 0),
+    ("back_to_recipe_list", 0),
+)
+ACTIONS = tuple(action for action, _ in _ACTION_ARITIES)
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# Argument values of the "page" and "confirm" actions
+PREV, NEXT = 0, 1
+NO, YES = 0, 1
+
+# Steps of the "navigation" action, by argument value
+NAVIGATION_STEPS = ("next", "cancel", "done")
+
+
+class CallbackPayload(NamedTuple):
+    """Decoded callback data: an action name and its integer arguments."""
+    action: str
+    args: Tuple[int, ...]
+
+
+def encode_callback(action: str, *args: int) -> str:
+    """Encode an action and non-negative integer arguments as callback data.
+
+    The data is a version byte, an action byte and the arguments as LEB128
+    varints, in unpadded URL-safe base64. A recipe button takes 4 to 8
+    characters and a page cursor about 10, far below Telegram's 64 byte limit.
+    """
+    code = _ACTION_CODES[action]
+    if len(args) != _ACTION_ARITIES[code][1]:
+        raise ValueError(f"Callback action {action!r} takes {_ACTION_ARITIES[code][1]} arguments")
+    data = bytearray((CALLBACK_VERSION, code))
+    for value in args:
+        if value < 0:
+            raise ValueError(f"Callback arguments must not be negative: {value}")
+        while value >= 0x80:
+            data.append(value & 0x7F | 0x80)
+            value >>= 7
+        data.append(value)
+    return base64.urlsafe_b64encode(bytes(data)).rstrip(b"=").decode("ascii")
+
+
+def decode_callback(data: Optional[str]) -> Optional[CallbackPayload]:
+    """Decode callback data made by encode_callback().
+
+    Returns:
+        The payload, or None for malformed data, unknown actions, wrong
+        argument counts and other versions
+    """
+    if not data:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) < 2 or raw[0] != CALLBACK_VERSION or raw[1] >= len(ACTIONS):
+        return None
+
+    args = []
+    value = shift = 0
+    for byte in raw[2:]:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            args.append(value)
+            value = shift = 0
+    # A truncated last varint or a wrong argument count means the data was not made by us
+    if shift or len(args) != _ACTION_ARITIES[raw[1]][1]:
+        return None
+    return CallbackPayload(ACTIONS[raw[1]], tuple(args))
@@ -1,129 +1,224 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
-from typing import List
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
 
-from config import CATEGORIES
-from translations import get_text
+from config import KEYBOARD_CACHE_SIZE
+from keyboards.callbacks import NAVIGATION_STEPS, NEXT, NO, PREV, YES, encode_callback
+from translations import LANGUAGES, category_names, get_category_name, get_text, resolve_language
+
+# Keyboards returned by this module are shared between messages and must not be modified
+
+Markup = TypeVar("Markup")
+
+def _build_per_language(build: Callable[[str], Markup]) -> Dict[str, Markup]:
+    """Build a static keyboard once for every language."""
+    return {language: build(language) for language in LANGUAGES}
 
 # Main menu keyboard
-def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
-    """Return the main menu keyboard with three options."""
+def _build_main_menu_keyboard(language: str) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.add(
-        KeyboardButton(text=get_text("view_recipe_button")),
-        KeyboardButton(text=get_text("add_recipe_button")),
-        KeyboardButton(text=get_text("ask_ai_button"))
+        KeyboardButton(text=get_text("view_recipe_button", language)),
+        KeyboardButton(text=get_text("add_recipe_button", language)),
+        KeyboardButton(text=get_text("ask_ai_button", language))
     )
     builder.adjust(1)  # One button per row
     return builder.as_markup(resize_keyboard=True)
 
+_MAIN_MENU_KEYBOARDS = _build_per_language(_build_main_menu_keyboard)
+
+def get_main_menu_keyboard(language: Optional[str] = None) -> ReplyKeyboardMarkup:
+    """Return the main menu keyboard with three options."""
+    return _MAIN_MENU_KEYBOARDS[resolve_language(language)]
+
 # Cancel button keyboard
-def get_cancel_keyboard() -> ReplyKeyboardMarkup:
-    """Return a keyboard with just a cancel button."""
+def _build_cancel_keyboard(language: str) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
-    builder.add(KeyboardButton(text=get_text("cancel_button")))
+    builder.add(KeyboardButton(text=get_text("cancel_button", language)))
     return builder.as_markup(resize_keyboard=True)
 
+_CANCEL_KEYBOARDS = _build_per_language(_build_cancel_keyboard)
+
+def get_cancel_keyboard(language: Optional[str] = None) -> ReplyKeyboardMarkup:
+    """Return a keyboard with just a cancel button."""
+    return _CANCEL_KEYBOARDS[resolve_language(language)]
+
 # Categories keyboard (inline)
-def get_categories_keyboard() -> InlineKeyboardMarkup:
-    """Return an inline keyboard with all recipe categories."""
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _build_categories_keyboard(buttons: Tuple[Tuple[int, str], ...]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for category in CATEGORIES:
-        builder.add(InlineKeyboardButton(text=category, callback_data=f"category:{category}"))
+    # Callbacks carry the id of the category
+    for category_id, text in buttons:
+        builder.add(InlineKeyboardButton(text=text, callback_data=encode_callback("category", category_id)))
     builder.adjust(2)  # Two buttons per row
     return builder.as_markup()
 
-# Recipe list keyboard with pagination
-def get_recipes_keyboard(recipes: List[dict], page: int = 0, page_size: int = 10) -> InlineKeyboardMarkup:
-    """Return an inline keyboard with recipe titles and pagination controls.
+def get_categories_keyboard(counts: Optional[Dict[int, int]] = None, language: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Return an inline keyboard of recipe categories.
     
-    Args:
-        recipes: List of recipe dictionaries with 'id' and 'title' keys
-        page: Current page number (0-indexed)
-        page_size: Number of recipes per page
+    With counts, only categories that have recipes are shown, each followed
+    by its number of recipes; without, all categories are shown.
     """
+    language = resolve_language(language)
+    if counts is None:
+        buttons = tuple((category_id, get_category_name(category_id, language)) for category_id in category_names)
+    else:
+        buttons = tuple(
+            (category_id, f"{get_category_name(category_id, language)} ({counts[category_id]})")
+            for category_id in category_names if counts.get(category_id)
+        )
+    return _build_categories_keyboard(buttons)
+
+# Recipe list keyboard with pagination
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _build_recipes_keyboard(
+    recipes: Tuple[Tuple[int, str], ...],
+    page: int,
+    has_prev: bool,
+    has_next: bool,
+    language: str
+) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
-    # Calculate pagination
-    total_pages = (len(recipes) + page_size - 1) // page_size
-    start_idx = page * page_size
-    end_idx = min(start_idx + page_size, len(recipes))
-    
     # Add recipe buttons
-    for recipe in recipes[start_idx:end_idx]:
+    for recipe_id, title in recipes:
         builder.add(InlineKeyboardButton(
-            text=recipe['title'], 
-            callback_data=f"recipe:{recipe['id']}"
+            text=title, 
+            callback_data=encode_callback("recipe", recipe_id)
         ))
     
-    # Add pagination controls if needed
-    if total_pages > 1:
+    # Add pagination controls if needed; each carries the target page and its keyset anchor
+    if has_prev or has_next:
         row = []
-        if page > 0:
-            row.append(InlineKeyboardButton(text=get_text("back_button"), callback_data=f"page:{page-1}"))
-        if page < total_pages - 1:
-            row.append(InlineKeyboardButton(text=get_text("next_button"), callback_data=f"page:{page+1}"))
+        if has_prev:
+            row.append(InlineKeyboardButton(
+                text=get_text("back_button", language),
+                callback_data=encode_callback("page", page - 1, PREV, recipes[0][0])
+            ))
+        if has_next:
+            row.append(InlineKeyboardButton(
+                text=get_text("next_button", language),
+                callback_data=encode_callback("page", page + 1, NEXT, recipes[-1][0])
+            ))
         builder.row(*row)
     
     # Add back button
-    builder.row(InlineKeyboardButton(text=get_text("back_to_categories_button"), callback_data="back_to_categories"))
+    builder.row(InlineKeyboardButton(text=get_text("back_to_categories_button", language), callback_data=encode_callback("back_to_categories")))
     
     # Adjust layout - one recipe per row
     builder.adjust(1)
     return builder.as_markup()
 
+def get_recipes_keyboard(
+    recipes: List[dict],
+    page: int = 0,
+    total_pages: int = 1,
+    language: Optional[str] = None
+) -> InlineKeyboardMarkup:
+    """Return an inline keyboard with recipe titles and pagination controls.
+    
+    Keyboards are memoized on the recipes shown and the available controls.
+    
+    Args:
+        recipes: Recipe dictionaries with 'id' and 'title' keys for the current page only
+        page: Current page number (0-indexed)
+        total_pages: Total number of pages in the listing
+        language: Language of the buttons; defaults to the current user's language
+    """
+    return _build_recipes_keyboard(
+        tuple((recipe['id'], recipe['title']) for recipe in recipes),
+        page,
+        page > 0 and bool(recipes),
+        page < total_pages - 1 and bool(recipes),
+        resolve_language(language)
+    )
+
 # Confirmation keyboard
-def get_confirmation_keyboard() -> InlineKeyboardMarkup:
-    """Return a confirmation keyboard with Yes/No buttons."""
+def _build_confirmation_keyboard(language: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.add(
-        InlineKeyboardButton(text=get_text("yes_button"), callback_data="confirm:yes"),
-        InlineKeyboardButton(text=get_text("no_button"), callback_data="confirm:no")
+        InlineKeyboardButton(text=get_text("yes_button", language), callback_data=encode_callback("confirm", YES)),
+        InlineKeyboardButton(text=get_text("no_button", language), callback_data=encode_callback("confirm", NO))
     )
     return builder.as_markup()
 
+_CONFIRMATION_KEYBOARDS = _build_per_language(_build_confirmation_keyboard)
+
+def get_confirmation_keyboard(language: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Return a confirmation keyboard with Yes/No buttons."""
+    return _CONFIRMATION_KEYBOARDS[resolve_language(language)]
+
 # Recipe details keyboard with edit and delete buttons
-def get_recipe_details_keyboard(recipe_id: int) -> InlineKeyboardMarkup:
-    """Return an inline keyboard for recipe details with edit and delete buttons.
-    
-    Args:
-        recipe_id: The ID of the recipe
-    """
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _build_recipe_details_keyboard(recipe_id: int, language: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
     # Add edit and delete buttons
     builder.row(
-        InlineKeyboardButton(text=get_text("edit_button"), callback_data=f"edit:{recipe_id}"),
-        InlineKeyboardButton(text=get_text("delete_button"), callback_data=f"delete:{recipe_id}")
+        InlineKeyboardButton(text=get_text("edit_button", language), callback_data=encode_callback("edit", recipe_id)),
+        InlineKeyboardButton(text=get_text("delete_button", language), callback_data=encode_callback("delete", recipe_id))
     )
     
     # Add back button
-    builder.row(InlineKeyboardButton(text=get_text("back_to_recipe_list_button"), callback_data="back_to_recipe_list"))
+    builder.row(InlineKeyboardButton(text=get_text("back_to_recipe_list_button", language), callback_data=encode_callback("back_to_recipe_list")))
     
     return builder.as_markup()
 
+def get_recipe_details_keyboard(recipe_id: int, language: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Return an inline keyboard for recipe details with edit and delete buttons.
+    
+    Args:
+        recipe_id: The ID of the recipe
+        language: Language of the buttons; defaults to the current user's language
+    """
+    return _build_recipe_details_keyboard(recipe_id, resolve_language(language))
+
 # Navigation keyboard with Next and Cancel buttons
-def get_navigation_keyboard() -> InlineKeyboardMarkup:
-    """Return an inline keyboard with Next and Cancel buttons for recipe editing."""
+def _build_navigation_keyboard(language: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
     # Add Next and Cancel buttons
     builder.row(
-        InlineKeyboardButton(text=get_text("next_button"), callback_data="navigation:next"),
-        InlineKeyboardButton(text=get_text("cancel_button"), callback_data="navigation:cancel")
+        InlineKeyboardButton(text=get_text("next_button", language), callback_data=encode_callback("navigation", NAVIGATION_STEPS.index("next"))),
+        InlineKeyboardButton(text=get_text("cancel_button", language), callback_data=encode_callback("navigation", NAVIGATION_STEPS.index("cancel")))
     )
     
     return builder.as_markup()
 
+_NAVIGATION_KEYBOARDS = _build_per_language(_build_navigation_keyboard)
+
+def get_navigation_keyboard(language: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Return an inline keyboard with Next and Cancel buttons for recipe editing."""
+    return _NAVIGATION_KEYBOARDS[resolve_language(language)]
+
 # Done keyboard with Done and Cancel buttons
-def get_done_keyboard() -> InlineKeyboardMarkup:
-    """Return an inline keyboard with Done and Cancel buttons for recipe editing."""
+def _build_done_keyboard(language: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
     # Add Done and Cancel buttons
     builder.row(
-        InlineKeyboardButton(text=get_text("yes_button"), callback_data="navigation:done"),
-        InlineKeyboardButton(text=get_text("cancel_button"), callback_data="navigation:cancel")
+        InlineKeyboardButton(text=get_text("yes_button", language), callback_data=encode_callback("navigation", NAVIGATION_STEPS.index("done"))),
+        InlineKeyboardButton(text=get_text("cancel_button", language), callback_data=encode_callback("navigation", NAVIGATION_STEPS.index("cancel")))
     )
     
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+_DONE_KEYBOARDS = _build_per_language(_build_done_keyboard)
+
+def get_done_keyboard(language: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Return an inline keyboard with Done and Cancel buttons for recipe editing."""
+    return _DONE_KEYBOARDS[resolve_language(language)]
+
+# Language selection keyboard
+def _build_language_keyboard() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for language_id, language in enumerate(LANGUAGES):
+        builder.add(InlineKeyboardButton(text=get_text("language_name", language), callback_data=encode_callback("language", language_id)))
+    return builder.as_markup()
+
+_LANGUAGE_KEYBOARD = _build_language_keyboard()
+
+def get_language_keyboard() -> InlineKeyboardMarkup:
+    """Return an inline keyboard with every supported language."""
+    return _LANGUAGE_KEYBOARD
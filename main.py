@@ -1,24 +1,56 @@
 import asyncio
 import logging
+import secrets
+import signal
 import sys
+from typing import Optional
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher, Router, types
 from aiogram.filters import CommandStart
 from aiogram.types import Message
 from aiogram.utils.markdown import hbold
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import TOKEN
+from cluster import WorkerPool
+from config import TOKEN, BOT_MODE, BOT_WORKERS, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET, METRICS_PORT
+from handlers.admin_handlers import router as admin_router
 from handlers.user_handlers import router as user_router
-from database.db import init_db
+from middlewares.callback_data import CallbackDataMiddleware
+from middlewares.language import LanguageMiddleware
+from middlewares.metrics import HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from database.db import init_db, close_db
+from database.fsm_storage import storage
+from metrics import metrics_server
+from profiler import profiler
+from services.ai_cache import ai_cache
+from services.ai_client import ai_client
+from services.ai_queue import ai_queue
+from services.outbound import outbound
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 
 # Initialize bot and dispatcher
 bot = Bot(token=TOKEN)  # TOKEN is loaded from .env via config.py
-dp = Dispatcher()
+bot.session.middleware(outbound)  # Messages are rate limited per chat and globally
+dp = Dispatcher(storage=storage)  # Conversation states survive restarts
 
-# Register routers
+# Measure every update before the bot's own middlewares run
+dp.update.outer_middleware(UpdateMetricsMiddleware())
+
+# Answer every user in their own language
+dp.update.outer_middleware(LanguageMiddleware())
+
+# Decode compact callback data once for routing and handlers
+dp.callback_query.outer_middleware(CallbackDataMiddleware())
+
+# Measure every handler of every router
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+# Register routers; admin commands come first, the user handlers take any message
+dp.include_router(admin_router)
 dp.include_router(user_router)
 
 # Main router
@@ -30,21 +62,118 @@ async def command_start_handler(message: Message) -> None:
     from translations import get_text
     
     name = message.from_user.full_name if message.from_user else 'Guest'
-    await message.answer(get_text("welcome_message", name=name))
+    outbound.post(message.answer(get_text("welcome_message", name=name)))
     
     # Send main menu
     from keyboards.keyboards import get_main_menu_keyboard
-    await message.answer(get_text("choose_menu_item"), reply_markup=get_main_menu_keyboard())
+    outbound.post(message.answer(get_text("choose_menu_item"), reply_markup=get_main_menu_keyboard()))
 
 dp.include_router(main_router)
 
-async def main() -> None:
-    # Initialize database
+async def on_startup(worker: Optional[int] = None) -> None:
+    """Initialize database, state storage, the shared AI HTTP session, AI workers and the metrics endpoint.
+    
+    SIGUSR1 starts a profiling session; in multi-process mode /profile only reaches the worker owning the admin's chat.
+    
+    Args:
+        worker: Index of the worker process in multi-process mode; each serves its own metrics port
+    """
+    await init_db()
+    await storage.start()
+    await ai_cache.start()
+    await ai_client.start()
+    await ai_queue.start()
+    if METRICS_PORT:
+        await metrics_server.start(METRICS_PORT + (worker or 0))
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, profiler.start_from_signal)
+
+async def on_shutdown() -> None:
+    """Release connections, stop AI workers, the metrics endpoint and profiling, and deliver queued messages."""
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+    await profiler.close()
+    await metrics_server.close()
+    await ai_queue.close()
+    await outbound.close()
+    await ai_client.close()
+    await ai_cache.close()
+    # The dispatcher closed the storage before this handler, but AI jobs drained
+    # above clear their conversation states afterwards; write those too
+    await storage.close()
+    await close_db()
+
+# Run for both polling and webhook mode
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
+
+async def main(dispatcher: Dispatcher = dp) -> None:
+    # A webhook left over from webhook mode would make getUpdates fail
+    await bot.delete_webhook()
+    
+    # Start the bot in long polling mode; a front dispatcher forwards updates in order
+    await dispatcher.start_polling(
+        bot,
+        handle_as_tasks=dispatcher is dp,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+
+def create_webhook_app(secret_token: str, dispatcher: Dispatcher = dp) -> web.Application:
+    """Create the aiohttp application that receives updates from Telegram.
+    
+    Requests without the matching X-Telegram-Bot-Api-Secret-Token header are
+    rejected. Updates are acknowledged right away and handled in the background,
+    except by a front dispatcher, which forwards them before answering.
+    
+    Args:
+        secret_token: Secret Telegram sends with every webhook request
+        dispatcher: Dispatcher handling the updates
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        handle_in_background=dispatcher is dp,
+        secret_token=secret_token
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+def run_webhook(dispatcher: Dispatcher = dp) -> None:
+    """Serve updates over a webhook instead of long polling."""
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL must be set to run in webhook mode")
+    
+    # A random secret works for a single instance; several instances need a shared WEBHOOK_SECRET
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    
+    async def register_webhook() -> None:
+        await bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=secret_token)
+        logging.info(f"Webhook set to {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+    
+    dispatcher.startup.register(register_webhook)
+    web.run_app(create_webhook_app(secret_token, dispatcher), host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+
+async def migrate_db() -> None:
+    """Apply pending migrations once, before worker processes open the database."""
     await init_db()
+    await close_db()
+
+def create_front_dispatcher(workers: int) -> Dispatcher:
+    """Fork worker processes and return a dispatcher that forwards updates to them.
     
-    # Start the bot
-    await dp.start_polling(bot)
+    Every worker runs the bot's handlers for the chats sharded to it, so a
+    chat's updates are handled in order by one process that owns its state.
+    """
+    asyncio.run(migrate_db())
+    front = Dispatcher()
+    WorkerPool(dp, bot, workers).attach(front)
+    return front
 
 if __name__ == "__main__":
-    logging.info("Starting bot")
-    asyncio.run(main())
\ No newline at end of file
+    logging.info(f"Starting bot in {BOT_MODE} mode with {BOT_WORKERS} worker(s)")
+    dispatcher = create_front_dispatcher(BOT_WORKERS) if BOT_WORKERS > 1 else dp
+    if BOT_MODE == "webhook":
+        run_webhook(dispatcher)
+    else:
+        asyncio.run(main(dispatcher))
@@ -0,0 +1,235 @@
+import bisect
+import logging
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT
+
+# Histogram buckets in seconds, from sub-millisecond handlers up to slow AI answers
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+MetricType = TypeVar("MetricType", bound="Metric")
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Format label pairs as {name="value",...}."""
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Metric:
+    """A named metric with optional labels; label values are passed positionally."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """Create a metric.
+
+        Args:
+            name: Metric name, e.g. bot_handler_seconds
+            documentation: One line shown as # HELP
+            labelnames: Names of the labels, in the order their values are passed
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def render(self) -> List[str]:
+        """Return the lines of the metric in text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up, such as a number of requests."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increase the counter of the given label values."""
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set a counter maintained elsewhere, e.g. by a cache, before it is rendered."""
+        self._values[labels] = value
+
+
+class Gauge(Metric):
+    """A value that goes up and down, such as the number of requests in flight."""
+
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increase the gauge of the given label values."""
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        """Decrease the gauge of the given label values."""
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set the gauge of the given label values."""
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values, such as latencies, in fixed buckets.
+
+    An observation costs one binary search and two additions; bucket counts
+    are accumulated only when the histogram is rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """Create a histogram.
+
+        Args:
+            name: Metric name, e.g. bot_handler_seconds
+            documentation: One line shown as # HELP
+            labelnames: Names of the labels, in the order their values are passed
+            buckets: Upper bounds of the buckets, in increasing order; +Inf is added
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record a value for the given label values."""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Set of metrics rendered together.
+
+    Collectors are called before every render, to copy values kept elsewhere
+    (cache statistics, queue depth) into metrics without any cost per event.
+    """
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: MetricType) -> MetricType:
+        """Add a metric and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Call collector before every render."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Return all metrics in text exposition format."""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.error(f"Metrics collector {collector.__name__} failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Local HTTP server exposing a registry on /metrics."""
+
+    def __init__(self, registry: Registry, host: str, port: int):
+        """Create a server; it is started by start().
+
+        Args:
+            registry: Metrics to expose
+            host: Address to listen on
+            port: Port to listen on
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self, port: Optional[int] = None) -> None:
+        """Start listening, on another port than the configured one if given."""
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, port or self.port).start()
+        logging.info(f"Serving metrics on http://{self.host}:{port or self.port}/metrics")
+
+    async def close(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# Shared registry and the metrics of the bot's hot paths
+registry = Registry()
+
+updates_in_flight = registry.register(Gauge("bot_updates_in_flight", "Updates being handled"))
+update_seconds = registry.register(Histogram("bot_update_seconds", "Time to handle an update, middlewares included"))
+handler_seconds = registry.register(Histogram("bot_handler_seconds", "Time spent in a handler", ("handler",)))
+handler_errors = registry.register(Counter("bot_handler_errors_total", "Exceptions raised by a handler", ("handler",)))
+
+db_query_seconds = registry.register(Histogram("db_query_seconds", "Time a database connection was held by a query", ("query",)))
+db_wait_seconds = registry.register(Histogram("db_connection_wait_seconds", "Time spent waiting for a pooled connection", ("mode",)))
+db_queries_in_flight = registry.register(Gauge("db_queries_in_flight", "Database queries holding a connection", ("mode",)))
+
+cache_hits = registry.register(Counter("cache_hits_total", "Lookups answered by an in-process cache", ("cache",)))
+cache_misses = registry.register(Counter("cache_misses_total", "Lookups missed by an in-process cache", ("cache",)))
+cache_entries = registry.register(Gauge("cache_entries", "Entries held by an in-process cache", ("cache",)))
+ai_cache_lookups = registry.register(Counter("ai_cache_lookups_total", "AI answer cache lookups by result: exact, similar or miss", ("result",)))
+
+ai_request_seconds = registry.register(Histogram("ai_request_seconds", "OpenRouter round trip, until the last chunk when streaming", ("model",)))
+ai_errors = registry.register(Counter("ai_errors_total", "Failed OpenRouter requests by model and HTTP status, 0 for network errors", ("model", "status")))
+ai_requests_in_flight = registry.register(Gauge("ai_requests_in_flight", "OpenRouter requests in progress"))
+ai_queue_depth = registry.register(Gauge("ai_queue_depth", "AI questions waiting for a worker"))
+
+telegram_outbound_queued = registry.register(Gauge("telegram_outbound_queued", "Bot API calls waiting for their chat's rate limit"))
+telegram_flood_waits = registry.register(Counter("telegram_flood_waits_total", "Bot API calls rejected with 429 Too Many Requests"))
+telegram_coalesced_edits = registry.register(Counter("telegram_coalesced_edits_total", "Queued message edits replaced by a newer edit of the same message"))
+
+# Local /metrics endpoint, started on startup unless METRICS_PORT is 0
+metrics_server = MetricsServer(registry, METRICS_HOST, METRICS_PORT)
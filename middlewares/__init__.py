@@ -0,0 +1 @@
+# Middlewares package initialization file
\ No newline at end of file
@@ -0,0 +1,24 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+from keyboards.callbacks import decode_callback
+
+
+class CallbackDataMiddleware(BaseMiddleware):
+    """Decode the data of every callback query once.
+
+    Registered as an outer callback query middleware. Routing and handlers get
+    the decoded CallbackPayload as `payload`, or None if the button was made
+    by an older version of the bot.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        data["payload"] = decode_callback(event.data)
+        return await handler(event, data)
@@ -0,0 +1,33 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from config import LANGUAGE
+from database.db import get_user_language
+from translations import current_language, resolve_language
+
+
+class LanguageMiddleware(BaseMiddleware):
+    """Handle every update in the language chosen by its user.
+
+    Registered as an outer update middleware, after aiogram has resolved the
+    user. The language is set in `current_language`, which get_text() and the
+    keyboards read, and passed to handlers as `language`.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        # A stored or configured language without texts falls back to English
+        language = resolve_language((await get_user_language(user.id) if user else None) or LANGUAGE)
+        data["language"] = language
+        token = current_language.set(language)
+        try:
+            return await handler(event, data)
+        finally:
+            current_language.reset(token)
@@ -0,0 +1,56 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from metrics import handler_errors, handler_seconds, update_seconds, updates_in_flight
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Record the number of updates in flight and the time to handle each.
+
+    Registered as the first of the bot's own outer update middlewares, so the
+    time includes them but not aiogram's user context and FSM middlewares,
+    which run before it.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        updates_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_seconds.observe(time.perf_counter() - start)
+            updates_in_flight.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Record the time spent in every handler and the exceptions it raises.
+
+    Registered as an inner message and callback query middleware, so it runs
+    once the handler is chosen. Handlers routed by HashDispatch are reported
+    under their own name rather than the dispatch entry point.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        route = data.get("route") or data["handler"]
+        name = route.callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - start, name)
@@ -0,0 +1,298 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from types import CodeType, FrameType
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Dispatcher
+
+from config import PROFILE_DIR, PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL, PROFILE_SECONDS
+
+# Profiling modes: periodic stack samples written as collapsed stacks, or cProfile written as pstats
+MODES = ("sample", "cprofile")
+
+# Root of the project; frames of its files are shown relative to it
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules whose outermost frame names the handler of a sample
+HANDLER_FILES = {
+    os.path.join(PROJECT_DIR, "main.py"),
+    *(os.path.join(PROJECT_DIR, "handlers", name) for name in ("admin_handlers.py", "user_handlers.py")),
+}
+
+# Root frame of every update handled by the bot
+FEED_UPDATE_CODE = Dispatcher.feed_update.__code__
+
+# Lines of the summary sent to the admin per table
+SUMMARY_ROWS = 10
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profiling session is already running."""
+
+
+@dataclass
+class ProfileReport:
+    """Result of a profiling session."""
+    mode: str
+    seconds: float
+    path: str
+    summary: str
+
+
+def _short_path(filename: str) -> str:
+    """Return a file name relative to the project or to site-packages."""
+    if filename.startswith(PROJECT_DIR):
+        return os.path.relpath(filename, PROJECT_DIR)
+    _, separator, inside = filename.rpartition("site-packages" + os.sep)
+    return inside if separator else os.path.basename(filename)
+
+
+class StackSampler:
+    """Samples the stack of the thread running the event loop.
+
+    Where available, SIGPROF interrupts the main thread every `interval`
+    seconds of CPU time, so the samples show where CPU time goes and an idle
+    bot is not sampled. Elsewhere a background thread samples the stack
+    every `interval` seconds; those samples are biased toward points where
+    the loop releases the GIL, such as writes and socket calls.
+
+    Only the running coroutine chain is on the stack, so every sample shows
+    what the event loop was busy with. Samples inside Dispatcher.feed_update
+    start at that frame and are grouped by the handler found on the stack,
+    or under [dispatch] while aiogram parses, routes and runs middlewares.
+    Handler code running outside an update, such as AI queue workers, is
+    grouped under [background] and everything else is only counted.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        """Create a sampler; sampling is started by start().
+
+        Args:
+            thread_id: Thread whose stack is sampled, the event loop's
+            interval: Seconds of CPU time between samples
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.handlers: Counter = Counter()
+        self.functions: Counter = Counter()
+        self.samples = 0
+        self._labels: Dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # co_qualname is new in Python 3.11
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _record(self, frame: Optional[FrameType]) -> None:
+        """Add the stack of one sample, outermost frame first."""
+        codes: List[CodeType] = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        self.samples += 1
+
+        start = next((index for index, code in enumerate(codes) if code is FEED_UPDATE_CODE), None)
+        handler = next((code for code in codes[start or 0:] if code.co_filename in HANDLER_FILES), None)
+        if handler is not None:
+            root = handler.co_name
+            if start is None:
+                root = "[background] " + root
+                start = codes.index(handler)
+        elif start is not None:
+            root = "[dispatch]"
+        else:
+            return
+
+        frames = [self._label(code) for code in codes[start:]]
+        self.stacks[";".join([root, *frames])] += 1
+        self.handlers[root] += 1
+        self.functions[frames[-1]] += 1
+
+    def _on_signal(self, signum: int, frame: Optional[FrameType]) -> None:
+        self._record(frame)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._record(sys._current_frames().get(self.thread_id))
+
+    @property
+    def uses_signal(self) -> bool:
+        """Return whether SIGPROF can be used: on Unix, sampling the main thread."""
+        return hasattr(signal, "setitimer") and self.thread_id == threading.main_thread().ident
+
+    def start(self) -> None:
+        """Start sampling, with SIGPROF or in a daemon thread."""
+        if self.uses_signal:
+            signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            return
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        if self.uses_signal:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self, path: str) -> None:
+        """Write the stacks in the collapsed format read by flamegraph.pl and speedscope."""
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def summary(self) -> str:
+        """Return the samples per handler and the functions most often on top of the stack."""
+        in_updates = sum(self.handlers.values())
+        lines = [f"{self.samples} samples, {in_updates} while handling updates or AI requests", "", "Handlers:"]
+        lines += [f"{count * 100 / max(self.samples, 1):5.1f}%  {name}" for name, count in self.handlers.most_common(SUMMARY_ROWS)]
+        lines += ["", "Functions on top of the stack:"]
+        lines += [f"{count * 100 / max(self.samples, 1):5.1f}%  {name}" for name, count in self.functions.most_common(SUMMARY_ROWS)]
+        return "\n".join(lines)
+
+
+def _pstats_summary(profile: cProfile.Profile) -> str:
+    """Return the handlers by cumulative time and the functions by own time."""
+    output = io.StringIO()
+    stats = pstats.Stats(profile, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(r"handlers[/\\]|main\.py", SUMMARY_ROWS)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(SUMMARY_ROWS)
+    # Keep the tables only, with the same short file names as collapsed stacks
+    lines = [
+        re.sub(r"\S*site-packages[/\\]", "", line.replace(PROJECT_DIR + os.sep, "")).rstrip()
+        for line in output.getvalue().splitlines()
+        if line.strip() and "function calls" not in line and "List reduced" not in line
+    ]
+    return "\n".join(lines)
+
+
+class Profiler:
+    """Time-bounded profiling of the running bot, one session at a time.
+
+    In "sample" mode the event loop's stack is sampled (see StackSampler)
+    and the result is written as collapsed stacks; the cost is a few
+    percent of one core. In "cprofile" mode cProfile traces every call on the event
+    loop's thread and the result is written as a pstats file; it is exact
+    but slows the bot down noticeably while it runs.
+    """
+
+    def __init__(self, directory: str, interval: float, default_seconds: float, max_seconds: float):
+        """Create a profiler.
+
+        Args:
+            directory: Directory the profiles are written to
+            interval: Seconds between stack samples in "sample" mode
+            default_seconds: Length of a session when none is given
+            max_seconds: Longest session that can be started
+        """
+        self.directory = directory
+        self.interval = interval
+        self.default_seconds = default_seconds
+        self.max_seconds = max_seconds
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def running(self) -> bool:
+        """Return whether a session is in progress."""
+        return self._task is not None and not self._task.done()
+
+    def start(
+        self,
+        seconds: Optional[float] = None,
+        mode: str = "sample",
+        on_finish: Optional[Callable[[ProfileReport], Awaitable[None]]] = None
+    ) -> float:
+        """Start a session in the background on the running event loop.
+
+        Args:
+            seconds: Length of the session, capped at max_seconds; default_seconds if None
+            mode: One of MODES
+            on_finish: Coroutine function called with the report once the profile is written
+
+        Returns:
+            The length of the session in seconds
+
+        Raises:
+            ProfilerBusyError: If a session is already running
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}")
+        if self.running:
+            raise ProfilerBusyError("A profiling session is already running")
+        seconds = min(max(seconds or self.default_seconds, 1.0), self.max_seconds)
+        self._task = asyncio.create_task(self._run(seconds, mode, on_finish))
+        return seconds
+
+    async def _run(self, seconds: float, mode: str, on_finish: Optional[Callable[[ProfileReport], Awaitable[None]]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        logging.info(f"Profiling for {seconds:.0f}s in {mode} mode")
+
+        # Collect until the session ends or the bot shuts down
+        if mode == "sample":
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+            path = os.path.join(self.directory, name + ".collapsed")
+            sampler.write(path)
+            summary = sampler.summary()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+            path = os.path.join(self.directory, name + ".pstats")
+            profile.dump_stats(path)
+            summary = _pstats_summary(profile)
+        logging.info(f"Profile written to {path}")
+
+        if on_finish is not None:
+            try:
+                await on_finish(ProfileReport(mode=mode, seconds=seconds, path=path, summary=summary))
+            except Exception as e:
+                logging.error(f"Error reporting profile {path}: {e}")
+
+    def start_from_signal(self) -> None:
+        """Start a sampling session of the default length, e.g. on SIGUSR1."""
+        try:
+            self.start()
+        except ProfilerBusyError:
+            logging.warning("Ignoring profiling signal: a session is already running")
+
+    async def close(self) -> None:
+        """Stop a running session without writing its profile."""
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+# Profiler of this process, started by admins with /profile or by SIGUSR1
+profiler = Profiler(PROFILE_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_SECONDS, PROFILE_MAX_SECONDS)
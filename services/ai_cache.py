@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import logging
+import re
+import struct
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    AI_PROMPT_TEMPLATE,
+    AI_PROMPT_TEMPLATES,
+    LANGUAGE,
+    OPENROUTER_MODEL,
+    AI_CACHE_ENABLED,
+    AI_CACHE_TTL,
+    AI_CACHE_MAX_ENTRIES,
+    AI_CACHE_SIMILARITY,
+    AI_CACHE_TOUCH_INTERVAL
+)
+from database.db import (
+    find_ai_response_candidates,
+    get_ai_response,
+    save_ai_response,
+    touch_ai_responses
+)
+from metrics import ai_cache_lookups
+
+# MinHash signature length and its split into LSH bands (NUM_BANDS * ROWS_PER_BAND == NUM_HASHES)
+NUM_HASHES = 64
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // NUM_BANDS
+# Length of the character shingles compared between questions
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def _make_permutations() -> List[Tuple[int, int]]:
+    """Derive fixed (a, b) coefficients for the MinHash functions."""
+    permutations = []
+    for i in range(NUM_HASHES):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a, b = struct.unpack("<QQ", digest)
+        permutations.append((a % (_MERSENNE_PRIME - 1) + 1, b % _MERSENNE_PRIME))
+    return permutations
+
+# Coefficients must stay the same across restarts, so they are derived, not random
+PERMUTATIONS = _make_permutations()
+
+def normalize_query(query: str) -> str:
+    """Lowercase a question and strip punctuation and extra whitespace."""
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+def prompt_key(normalized_query: str, model: str = OPENROUTER_MODEL, language: str = LANGUAGE) -> str:
+    """Return the exact-match cache key for a normalized question, model and answer language."""
+    prompt = AI_PROMPT_TEMPLATES.get(language, AI_PROMPT_TEMPLATE).format(user_query=normalized_query)
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+def minhash_signature(normalized_query: str) -> List[int]:
+    """Compute the MinHash signature of the question's character shingles."""
+    text = f" {normalized_query} "
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+        for shingle in shingles
+    ]
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in PERMUTATIONS
+    ]
+
+def lsh_bands(signature: List[int], language: str = LANGUAGE) -> List[int]:
+    """Hash each band of the signature, tagged with the band number, into a signed 64-bit integer.
+    
+    Bands are salted with the answer language, so questions only match
+    answers given in the same language.
+    """
+    bands = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        data = language.encode("utf-8") + struct.pack(f"<I{ROWS_PER_BAND}I", band, *rows)
+        digest = hashlib.blake2b(data, digest_size=8).digest()
+        bands.append(struct.unpack("<q", digest)[0])
+    return bands
+
+def estimate_similarity(first: List[int], second: List[int]) -> float:
+    """Estimate the Jaccard similarity of two questions from their signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_HASHES
+
+class AIResponseCache:
+    """Persistent cache of AI answers stored in the recipes database.
+
+    Questions are looked up by an exact key first. If similarity matching is
+    enabled, a miss falls back to MinHash locality-sensitive hashing: answers
+    whose question shares an LSH band are candidates, and the most similar one
+    above the threshold is returned.
+
+    Hits only read the database. The time of each hit, which decides what is
+    evicted, is kept in memory and written in one transaction every
+    `touch_interval` seconds and before an answer is stored.
+    """
+
+    def __init__(self, model: str, ttl: float, max_entries: int, similarity: float, enabled: bool = True, touch_interval: float = 30):
+        """Create a cache; the background writer is started by start().
+
+        Args:
+            model: Model whose answers are cached
+            ttl: Seconds an answer stays valid
+            max_entries: Maximum number of stored answers
+            similarity: Minimum estimated similarity for a near-duplicate hit; 0 disables it
+            enabled: Whether the cache is used at all
+            touch_interval: Maximum seconds the time of a hit waits before it is written
+        """
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.enabled = enabled
+        self.touch_interval = touch_interval
+        # Prompt key -> time of its last hit, not written yet
+        self._touched: Dict[str, float] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def start(self) -> None:
+        """Start the background writer of hit times."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    async def close(self) -> None:
+        """Stop the background writer and write the pending hit times."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write the pending hit times in one transaction."""
+        async with self._flush_lock:
+            if not self._touched:
+                return
+            touched, self._touched = self._touched, {}
+            try:
+                await touch_ai_responses(list(touched.items()))
+            except Exception:
+                # Keep the hits for the next attempt, unless newer ones replaced them meanwhile
+                self._touched = {**touched, **self._touched}
+                raise
+
+    async def _writer(self) -> None:
+        """Periodically write the pending hit times."""
+        while True:
+            await asyncio.sleep(self.touch_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Error writing AI cache hits: {e}")
+
+    async def get(self, query: str, language: str = LANGUAGE) -> Optional[str]:
+        """Return a cached answer in the given language for the question, or None."""
+        if not self.enabled:
+            return None
+        normalized = normalize_query(query)
+        key = prompt_key(normalized, self.model, language)
+        response = await get_ai_response(key, self.ttl)
+        if response is not None:
+            ai_cache_lookups.inc("exact")
+            self._touched[key] = time.time()
+            return response
+
+        if self.similarity <= 0:
+            ai_cache_lookups.inc("miss")
+            return None
+        signature = minhash_signature(normalized)
+        best_key, best_response, best_score = None, None, self.similarity
+        for candidate in await find_ai_response_candidates(self.model, lsh_bands(signature, language), self.ttl):
+            score = estimate_similarity(signature, array("Q", candidate["signature"]).tolist())
+            if score >= best_score:
+                best_key, best_response, best_score = candidate["key"], candidate["response"], score
+        if best_key is None:
+            ai_cache_lookups.inc("miss")
+            return None
+        ai_cache_lookups.inc("similar")
+        logging.info(f"AI cache near-duplicate hit (similarity {best_score:.2f})")
+        self._touched[best_key] = time.time()
+        return best_response
+
+    async def put(self, query: str, response: str, language: str = LANGUAGE, model: Optional[str] = None) -> None:
+        """Store the answer to a question; language is the language of the answer.
+        
+        model is the model that answered. Answers of fallback models are not
+        stored, so cached answers are always the cached model's own.
+        """
+        if not self.enabled or (model or self.model) != self.model:
+            return
+        normalized = normalize_query(query)
+        signature = minhash_signature(normalized)
+        # Storing an answer may evict others, so recent hits must be written first
+        await self.flush()
+        await save_ai_response(
+            key=prompt_key(normalized, self.model, language),
+            model=self.model,
+            signature=array("Q", signature).tobytes(),
+            bands=lsh_bands(signature, language),
+            response=response,
+            max_entries=self.max_entries,
+            max_age=self.ttl
+        )
+
+
+# Shared cache of AI answers
+ai_cache = AIResponseCache(
+    model=OPENROUTER_MODEL,
+    ttl=AI_CACHE_TTL,
+    max_entries=AI_CACHE_MAX_ENTRIES,
+    similarity=AI_CACHE_SIMILARITY,
+    enabled=AI_CACHE_ENABLED,
+    touch_interval=AI_CACHE_TOUCH_INTERVAL
+)
@@ -0,0 +1,429 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_API_URL,
+    OPENROUTER_MODELS,
+    AI_CONNECTOR_LIMIT,
+    AI_CONNECTOR_LIMIT_PER_HOST,
+    AI_KEEPALIVE_TIMEOUT,
+    AI_CONNECT_TIMEOUT,
+    AI_READ_TIMEOUT,
+    AI_MAX_RETRIES,
+    AI_RETRY_BASE_DELAY,
+    AI_RETRY_MAX_DELAY,
+    AI_BREAKER_FAILURES,
+    AI_BREAKER_RESET_TIMEOUT
+)
+from metrics import ai_errors, ai_request_seconds, ai_requests_in_flight
+
+# HTTP statuses worth retrying: rate limiting, timeouts and server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+# Statuses after which another model may still succeed
+FALLBACK_STATUSES = RETRYABLE_STATUSES | {404}
+
+
+class AIClientError(Exception):
+    """Raised when the AI provider returns an error or an unusable response."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False, retry_after: Optional[float] = None):
+        """Create an error.
+
+        Args:
+            message: Description of the failure
+            status: HTTP status of the response, if there was one
+            retryable: Whether repeating the request may succeed
+            retry_after: Seconds the server asked to wait before retrying
+        """
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_status(cls, status: int, text: str, headers: Any) -> "AIClientError":
+        """Build an error for a non-200 HTTP response."""
+        return cls(
+            f"OpenRouter API error {status}: {text}",
+            status=status,
+            retryable=status in RETRYABLE_STATUSES or status >= 500,
+            retry_after=parse_retry_after(headers.get("Retry-After"))
+        )
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@contextmanager
+def _observe_request(model: str) -> Iterator[None]:
+    """Record the round trip of one OpenRouter request, and its status if it fails."""
+    ai_requests_in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except AIClientError as e:
+        ai_errors.inc(model, str(e.status or 0))
+        raise
+    finally:
+        ai_requests_in_flight.dec()
+        ai_request_seconds.observe(time.perf_counter() - start, model)
+
+
+class CircuitBreaker:
+    """Stops sending requests to a model after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests fail fast. Once `reset_timeout` seconds have passed, a single
+    trial request is let through; its success closes the circuit again and its
+    failure keeps it open for another period.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_started_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        """Return True while requests are being rejected."""
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent now."""
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_timeout:
+            return False
+        # A trial that never reported back (e.g. was cancelled) expires after another period
+        if self._trial_started_at is not None and now - self._trial_started_at < self.reset_timeout:
+            return False
+        self._trial_started_at = now
+        return True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful request."""
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started_at = None
+
+    def record_failure(self) -> None:
+        """Count a failed request and open the circuit if there were too many."""
+        self.failures += 1
+        self._trial_started_at = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class OpenRouterClient:
+    """Client for the OpenRouter chat completions API.
+
+    One aiohttp session with a pooled, keep-alive connector is shared by all
+    requests, so consecutive questions reuse open TLS connections instead of
+    paying DNS, TCP and TLS setup every time.
+
+    Requests go to the first model in `models` whose circuit breaker is
+    closed. Rate limiting, timeouts and server errors are retried with
+    jittered exponential backoff, honoring Retry-After; when retries run out
+    the next model in the list is tried.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        models: List[str],
+        url: str,
+        connector_limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30,
+        connect_timeout: float = 10,
+        read_timeout: float = 120,
+        max_retries: int = 2,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 10,
+        breaker_failures: int = 5,
+        breaker_reset_timeout: float = 30
+    ):
+        """Create a client; the HTTP session is opened by start().
+
+        Args:
+            api_key: OpenRouter API key
+            models: Models used for completions, in order of preference
+            url: Chat completions endpoint
+            connector_limit: Maximum number of simultaneous connections
+            limit_per_host: Maximum number of simultaneous connections to one host
+            keepalive_timeout: Seconds an idle connection is kept open for reuse
+            connect_timeout: Seconds allowed to establish a connection
+            read_timeout: Seconds allowed between two reads of the response
+            max_retries: Retries per model after the first attempt
+            retry_base_delay: Backoff before the first retry, doubled for every next one
+            retry_max_delay: Longest wait before a retry; a longer Retry-After moves on to the next model
+            breaker_failures: Consecutive failures that open a model's circuit
+            breaker_reset_timeout: Seconds before an open circuit lets a trial request through
+        """
+        self.api_key = api_key
+        self.models = list(models)
+        self.url = url
+        self.connector_limit = connector_limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.breakers = {model: CircuitBreaker(breaker_failures, breaker_reset_timeout) for model in self.models}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def model(self) -> str:
+        """Return the preferred model."""
+        return self.models[0]
+
+    async def start(self) -> None:
+        """Open the shared HTTP session if it is not open yet."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.connector_limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+        )
+        logging.info("AI client session opened")
+
+    async def close(self) -> None:
+        """Close the shared HTTP session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logging.info("AI client session closed")
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, opening it on first use."""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def _payload(self, prompt: str, model: str, stream: bool = False) -> Dict[str, Any]:
+        """Build the request body for a single-message conversation."""
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _retry_delay(self, error: AIClientError, attempt: int) -> Optional[float]:
+        """Return how long to wait before retrying the same model, or None to give up on it."""
+        if not error.retryable or attempt >= self.max_retries:
+            return None
+        if error.retry_after is not None:
+            return error.retry_after if error.retry_after <= self.retry_max_delay else None
+        # Exponential backoff with jitter, so clients do not retry in lockstep
+        backoff = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt)
+        return random.uniform(backoff / 2, backoff)
+
+    def _can_fall_back(self, error: AIClientError) -> bool:
+        """Return True if another model may succeed where this one failed."""
+        return error.retryable or error.status in FALLBACK_STATUSES
+
+    async def _complete_once(self, prompt: str, model: str) -> str:
+        """Send a single completion request to one model."""
+        with _observe_request(model):
+            session = await self._get_session()
+            try:
+                async with session.post(self.url, json=self._payload(prompt, model)) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        raise AIClientError.from_status(response.status, error_text, response.headers)
+                    result = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise AIClientError(f"OpenRouter connection error: {e!r}", retryable=True)
+
+            try:
+                return result["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                raise AIClientError(f"Unexpected OpenRouter response: {result}")
+
+    async def complete(self, prompt: str) -> Tuple[str, str]:
+        """Send a prompt and return the full completion text.
+
+        Args:
+            prompt: The formatted prompt
+
+        Returns:
+            The model that answered, which is a fallback model if the preferred one failed, and its answer
+
+        Raises:
+            AIClientError: If every model failed or has an open circuit
+        """
+        last_error = AIClientError("All AI models are temporarily unavailable")
+        for model in self.models:
+            breaker = self.breakers[model]
+            if not breaker.allow():
+                continue
+            attempt = 0
+            while True:
+                try:
+                    result = await self._complete_once(prompt, model)
+                except AIClientError as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        last_error = e
+                        break
+                    logging.warning(f"Retrying {model} in {delay:.2f}s after error: {e}")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                else:
+                    breaker.record_success()
+                    return model, result
+            if self._can_fall_back(last_error):
+                breaker.record_failure()
+                logging.warning(f"Model {model} failed, trying the next one: {last_error}")
+            else:
+                # The upstream answered, it was the request that was rejected
+                breaker.record_success()
+                raise last_error
+        raise last_error
+
+    async def _stream_once(self, prompt: str, model: str) -> AsyncIterator[str]:
+        """Stream a single completion request from one model."""
+        with _observe_request(model):
+            session = await self._get_session()
+            try:
+                async with session.post(self.url, json=self._payload(prompt, model, stream=True)) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        raise AIClientError.from_status(response.status, error_text, response.headers)
+
+                    async for raw_line in response.content:
+                        line = raw_line.decode("utf-8").strip()
+                        # Blank lines separate events; lines starting with ':' are keep-alive comments
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            return
+
+                        try:
+                            event = json.loads(data)
+                        except ValueError:
+                            event = None
+                        # Valid JSON that is not an object is as unusable as invalid JSON
+                        if not isinstance(event, dict):
+                            logging.warning(f"Skipping malformed stream event: {data}")
+                            continue
+                        if "error" in event:
+                            raise AIClientError(f"OpenRouter stream error: {event['error']}", retryable=True)
+
+                        choices = event.get("choices")
+                        choice = choices[0] if isinstance(choices, list) and choices and isinstance(choices[0], dict) else {}
+                        delta = choice.get("delta")
+                        content = delta.get("content") if isinstance(delta, dict) else None
+                        if content and isinstance(content, str):
+                            yield content
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise AIClientError(f"OpenRouter connection error: {e!r}", retryable=True)
+
+    async def stream(self, prompt: str) -> AsyncIterator[Tuple[str, str]]:
+        """Send a prompt and yield the completion as it is generated.
+
+        Reads the server-sent event stream of the chat completions endpoint
+        and yields each content delta as soon as it arrives. Retries and model
+        fallback apply only until the first piece of text has been yielded.
+
+        Args:
+            prompt: The formatted prompt
+
+        Yields:
+            (model, piece) pairs: the model that answers, a fallback model if the
+            preferred one failed, and the pieces of its answer in order
+
+        Raises:
+            AIClientError: If every model failed, or the stream broke after text was yielded
+        """
+        last_error = AIClientError("All AI models are temporarily unavailable")
+        for model in self.models:
+            breaker = self.breakers[model]
+            if not breaker.allow():
+                continue
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    async for chunk in self._stream_once(prompt, model):
+                        started = True
+                        yield model, chunk
+                except AIClientError as e:
+                    if started:
+                        breaker.record_failure()
+                        raise
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        last_error = e
+                        break
+                    logging.warning(f"Retrying {model} in {delay:.2f}s after error: {e}")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                else:
+                    breaker.record_success()
+                    return
+            if self._can_fall_back(last_error):
+                breaker.record_failure()
+                logging.warning(f"Model {model} failed, trying the next one: {last_error}")
+            else:
+                # The upstream answered, it was the request that was rejected
+                breaker.record_success()
+                raise last_error
+        raise last_error
+
+
+# Shared client, started in main() and closed on shutdown
+ai_client = OpenRouterClient(
+    api_key=OPENROUTER_API_KEY,
+    models=OPENROUTER_MODELS,
+    url=OPENROUTER_API_URL,
+    connector_limit=AI_CONNECTOR_LIMIT,
+    limit_per_host=AI_CONNECTOR_LIMIT_PER_HOST,
+    keepalive_timeout=AI_KEEPALIVE_TIMEOUT,
+    connect_timeout=AI_CONNECT_TIMEOUT,
+    read_timeout=AI_READ_TIMEOUT,
+    max_retries=AI_MAX_RETRIES,
+    retry_base_delay=AI_RETRY_BASE_DELAY,
+    retry_max_delay=AI_RETRY_MAX_DELAY,
+    breaker_failures=AI_BREAKER_FAILURES,
+    breaker_reset_timeout=AI_BREAKER_RESET_TIMEOUT
+)
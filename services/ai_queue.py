@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from config import AI_WORKERS, AI_QUEUE_MAX_DEPTH, AI_MAX_JOBS_PER_USER
+from metrics import ai_queue_depth, registry
+
+
+class QueueFullError(Exception):
+    """Raised when the AI queue already holds the maximum number of waiting jobs."""
+
+
+class UserLimitError(Exception):
+    """Raised when a user already has the maximum number of AI jobs queued or running."""
+
+
+@dataclass
+class AIJob:
+    """A queued AI request of one user."""
+    user_id: int
+    run: Callable[[], Awaitable[None]]
+    # Context of the submitting handler, e.g. the user's language
+    context: contextvars.Context = field(default_factory=contextvars.copy_context, repr=False)
+    task: Optional["asyncio.Task[None]"] = field(default=None, repr=False)
+
+
+class AIJobQueue:
+    """Bounded queue of AI requests served by a fixed pool of workers.
+
+    At most `workers` requests run at the same time. Waiting requests are
+    limited to `max_depth` in total and every user may have at most
+    `per_user_limit` requests queued or running, so a burst of questions
+    cannot open an unbounded number of upstream connections.
+    """
+
+    def __init__(self, workers: int, max_depth: int, per_user_limit: int):
+        """Create a queue; the workers are started by start().
+
+        Args:
+            workers: Number of requests processed concurrently
+            max_depth: Maximum number of requests waiting for a worker
+            per_user_limit: Maximum number of queued or running requests per user
+        """
+        self.workers = workers
+        self.max_depth = max_depth
+        self.per_user_limit = per_user_limit
+        self._pending: Deque[AIJob] = deque()
+        self._running: List[AIJob] = []
+        self._user_jobs: Dict[int, int] = {}
+        self._idle = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._worker_tasks: List["asyncio.Task[None]"] = []
+
+    @property
+    def depth(self) -> int:
+        """Return the number of requests waiting for a worker."""
+        return len(self._pending)
+
+    async def start(self) -> None:
+        """Start the worker tasks."""
+        if self._worker_tasks:
+            return
+        self._condition = asyncio.Condition()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"AI queue started with {self.workers} workers")
+
+    async def close(self) -> None:
+        """Stop the workers and cancel all queued and running requests."""
+        for task in self._worker_tasks:
+            task.cancel()
+        for job in self._running:
+            job.task.cancel()
+        await asyncio.gather(*self._worker_tasks, *(job.task for job in self._running), return_exceptions=True)
+        self._worker_tasks = []
+        self._pending.clear()
+        self._running.clear()
+        self._user_jobs.clear()
+        self._check_drained()
+        logging.info("AI queue stopped")
+
+    async def join(self) -> None:
+        """Wait until no request is queued or running."""
+        if self._drained is not None:
+            await self._drained.wait()
+
+    async def submit(self, user_id: int, run: Callable[[], Awaitable[None]]) -> int:
+        """Queue a request.
+
+        Args:
+            user_id: The user the request belongs to
+            run: Creates the coroutine that handles the request
+
+        Returns:
+            The position in the queue; 0 if a worker picks the request up right away
+
+        Raises:
+            UserLimitError: If the user has too many requests queued or running
+            QueueFullError: If too many requests are waiting
+        """
+        if self._condition is None:
+            await self.start()
+        if self._user_jobs.get(user_id, 0) >= self.per_user_limit:
+            raise UserLimitError(f"User {user_id} already has {self.per_user_limit} AI requests")
+        if len(self._pending) >= self.max_depth:
+            raise QueueFullError(f"AI queue is full ({self.max_depth} waiting)")
+
+        async with self._condition:
+            position = max(0, len(self._pending) + 1 - self._idle)
+            self._pending.append(AIJob(user_id=user_id, run=run))
+            self._user_jobs[user_id] = self._user_jobs.get(user_id, 0) + 1
+            self._drained.clear()
+            self._condition.notify()
+        return position
+
+    def cancel_user(self, user_id: int) -> int:
+        """Cancel all queued and running requests of a user.
+
+        Returns:
+            The number of cancelled requests
+        """
+        queued = [job for job in self._pending if job.user_id == user_id]
+        for job in queued:
+            self._pending.remove(job)
+            self._finish(job)
+        running = [job for job in self._running if job.user_id == user_id]
+        for job in running:
+            job.task.cancel()
+        self._check_drained()
+        return len(queued) + len(running)
+
+    def _finish(self, job: AIJob) -> None:
+        """Release the user's slot taken by a job."""
+        remaining = self._user_jobs.get(job.user_id, 0) - 1
+        if remaining > 0:
+            self._user_jobs[job.user_id] = remaining
+        else:
+            self._user_jobs.pop(job.user_id, None)
+
+    def _check_drained(self) -> None:
+        """Wake up join() once the last request is done."""
+        if not self._pending and not self._running and self._drained is not None:
+            self._drained.set()
+
+    async def _worker(self) -> None:
+        """Take requests from the queue one at a time and run them."""
+        while True:
+            async with self._condition:
+                while not self._pending:
+                    self._idle += 1
+                    try:
+                        await self._condition.wait()
+                    finally:
+                        self._idle -= 1
+                job = self._pending.popleft()
+
+            job.task = job.context.run(asyncio.create_task, job.run())
+            self._running.append(job)
+            try:
+                # wait() does not propagate our own cancellation into the job
+                await asyncio.wait({job.task})
+                if not job.task.cancelled() and job.task.exception() is not None:
+                    logging.error("AI request failed", exc_info=job.task.exception())
+            finally:
+                self._running.remove(job)
+                self._finish(job)
+                self._check_drained()
+
+
+# Shared AI request queue, started in main() and closed on shutdown
+ai_queue = AIJobQueue(
+    workers=AI_WORKERS,
+    max_depth=AI_QUEUE_MAX_DEPTH,
+    per_user_limit=AI_MAX_JOBS_PER_USER
+)
+registry.add_collector(lambda: ai_queue_depth.set(ai_queue.depth))
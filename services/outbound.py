@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import EditMessageText, TelegramMethod
+
+from config import (
+    OUTBOUND_CHAT_BURST,
+    OUTBOUND_CHAT_RATE,
+    OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_GROUP_RATE,
+    OUTBOUND_MAX_RETRIES
+)
+from metrics import registry, telegram_coalesced_edits, telegram_flood_waits, telegram_outbound_queued
+
+ChatId = Union[int, str]
+
+# Seconds close() waits for queued messages to be delivered
+DRAIN_TIMEOUT = 10
+
+# Set in queue workers, whose calls are sent instead of being queued again
+_delivering: ContextVar[bool] = ContextVar("outbound_delivering", default=False)
+
+
+class TokenBucket:
+    """Token bucket that hands out waiting times instead of blocking.
+
+    Every reservation takes a token, going into debt when none is left, and
+    returns the seconds the caller has to wait, so callers are served in the
+    order they reserve. A rate of 0 means no limit.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """Create a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Most tokens the bucket holds, i.e. the largest burst
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it."""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def refill_time(self) -> float:
+        """Return the seconds until the bucket is full again."""
+        return (self.capacity - self.tokens) / self.rate if self.rate else 0.0
+
+
+@dataclass
+class OutboundJob:
+    """A Bot API call waiting in its chat's queue."""
+    method: TelegramMethod
+    send: Callable[[], Awaitable[Any]]
+    # Callers waiting for the result; several when edits were coalesced
+    futures: List["asyncio.Future[Any]"] = field(default_factory=list)
+    attempts: int = 0
+
+
+@dataclass
+class ChatQueue:
+    """Pending calls of one chat and the chat's rate limit."""
+    bucket: TokenBucket
+    jobs: Deque[OutboundJob] = field(default_factory=deque)
+    task: Optional["asyncio.Task[None]"] = None
+
+
+def _edit_key(method: TelegramMethod) -> Optional[int]:
+    """Return the message a text edit replaces, or None for other calls."""
+    return method.message_id if isinstance(method, EditMessageText) else None
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    """Rate limited delivery of Bot API calls, registered as a session middleware.
+
+    Calls addressed to a chat are queued per chat and sent in order by one
+    task per busy chat. Each chat has a token bucket, groups and channels a
+    slower one, and all chats share a global bucket, so bursts are spread
+    out instead of answered with 429 Too Many Requests. A call rejected with
+    429 anyway is retried after the time Telegram asks for. A queued edit of
+    a message is replaced by a newer edit of the same message, so only the
+    latest text is sent. Calls without a chat, such as callback query
+    answers, are sent at once.
+
+    Awaited calls wait for delivery as before. post() queues a call without
+    waiting, so handlers can return while their messages are delivered.
+    """
+
+    def __init__(self, chat_rate: float, group_rate: float, burst: int, global_rate: float, max_retries: int):
+        """Create a queue.
+
+        Args:
+            chat_rate: Messages per second to one private chat
+            group_rate: Messages per second to one group or channel
+            burst: Messages a chat gets at once before its rate applies
+            global_rate: Messages per second to all chats together
+            max_retries: Retries of a call rejected with 429
+        """
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[ChatId, ChatQueue] = {}
+        # Results of posted calls by chat; calls without a chat are under None
+        self._posted: Dict[Optional[ChatId], Set["asyncio.Future[Any]"]] = {}
+
+    @property
+    def depth(self) -> int:
+        """Return the number of calls waiting in chat queues."""
+        return sum(len(chat.jobs) for chat in self._chats.values())
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or _delivering.get():
+            return await make_request(bot, method)
+        return await self._enqueue(chat_id, method, lambda: make_request(bot, method))
+
+    def post(self, method: TelegramMethod) -> "asyncio.Future[Any]":
+        """Queue a call bound to a bot, such as message.answer(...), without waiting for it.
+
+        Calls are queued right away, so they keep their order with the
+        chat's other calls. Errors are logged.
+
+        Returns:
+            A future with the result of the call
+        """
+        bot = method.bot
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            future = asyncio.ensure_future(bot(method))
+        else:
+            future = self._enqueue(chat_id, method, lambda: bot(method))
+        self._posted.setdefault(chat_id, set()).add(future)
+        future.add_done_callback(lambda done: self._posted_done(chat_id, done))
+        return future
+
+    def _posted_done(self, chat_id: Optional[ChatId], future: "asyncio.Future[Any]") -> None:
+        posted = self._posted.get(chat_id)
+        if posted is not None:
+            posted.discard(future)
+            if not posted:
+                del self._posted[chat_id]
+        if future.cancelled():
+            return
+        error = future.exception()
+        # Editing to identical text is rejected by Telegram and is harmless
+        if isinstance(error, TelegramBadRequest) and "message is not modified" in str(error):
+            return
+        if error is not None:
+            logging.error(f"Failed to deliver a message to chat {chat_id}: {error}")
+
+    async def join(self, chat_id: Optional[ChatId] = None) -> None:
+        """Wait until the posted calls of a chat, or of all chats, are delivered."""
+        while True:
+            if chat_id is None:
+                pending = set().union(*self._posted.values())
+            else:
+                pending = set(self._posted.get(chat_id, ()))
+            if not pending:
+                return
+            await asyncio.wait(pending)
+
+    def _enqueue(self, chat_id: ChatId, method: TelegramMethod, send: Callable[[], Awaitable[Any]]) -> "asyncio.Future[Any]":
+        """Add a call to its chat's queue, replacing a queued edit of the same message."""
+        future = asyncio.get_running_loop().create_future()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            # Negative ids are groups, usernames are channels
+            rate = self.chat_rate if isinstance(chat_id, int) and chat_id > 0 else self.group_rate
+            chat = self._chats[chat_id] = ChatQueue(TokenBucket(rate, self.burst))
+
+        key = _edit_key(method)
+        if key is not None:
+            for job in chat.jobs:
+                if _edit_key(job.method) == key:
+                    job.method = method
+                    job.send = send
+                    job.futures.append(future)
+                    telegram_coalesced_edits.inc()
+                    return future
+
+        chat.jobs.append(OutboundJob(method, send, [future]))
+        if chat.task is None:
+            chat.task = asyncio.create_task(self._deliver(chat_id, chat))
+        return future
+
+    async def _deliver(self, chat_id: ChatId, chat: ChatQueue) -> None:
+        """Send the calls of a chat in order until its queue is empty."""
+        _delivering.set(True)
+        try:
+            while chat.jobs:
+                # Wait before taking the next call, so edits keep coalescing meanwhile
+                delay = chat.bucket.reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+                delay = self.global_bucket.reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+                if not chat.jobs:
+                    break
+                job = chat.jobs.popleft()
+                try:
+                    await self._send(chat, job)
+                except asyncio.CancelledError:
+                    for future in job.futures:
+                        future.cancel()
+                    raise
+        finally:
+            chat.task = None
+            # A chat is forgotten once idle with a full bucket; earlier it would get a fresh burst
+            asyncio.get_running_loop().call_later(chat.bucket.refill_time(), self._forget, chat_id, chat)
+
+    async def _send(self, chat: ChatQueue, job: OutboundJob) -> None:
+        """Send one call, retrying on 429, and resolve its callers."""
+        while True:
+            try:
+                result = await job.send()
+            except TelegramRetryAfter as e:
+                telegram_flood_waits.inc()
+                if job.attempts >= self.max_retries:
+                    _resolve(job, error=e)
+                    return
+                job.attempts += 1
+                logging.warning(f"Flood control: retrying {type(job.method).__name__} in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+                # A newer edit of the same message queued meanwhile supersedes this one
+                key = _edit_key(job.method)
+                newer = next((pending for pending in chat.jobs if key is not None and _edit_key(pending.method) == key), None)
+                if newer is not None:
+                    newer.futures[:0] = job.futures
+                    telegram_coalesced_edits.inc()
+                    return
+            except Exception as e:
+                _resolve(job, error=e)
+                return
+            else:
+                _resolve(job, result=result)
+                return
+
+    def _forget(self, chat_id: ChatId, chat: ChatQueue) -> None:
+        if chat.task is None and not chat.jobs and self._chats.get(chat_id) is chat:
+            del self._chats[chat_id]
+
+    async def close(self) -> None:
+        """Deliver the queued calls for up to DRAIN_TIMEOUT seconds, then cancel the rest."""
+        tasks = [chat.task for chat in self._chats.values() if chat.task is not None]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=DRAIN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        for chat in self._chats.values():
+            for job in chat.jobs:
+                for future in job.futures:
+                    future.cancel()
+        self._chats.clear()
+
+
+def _resolve(job: OutboundJob, result: Any = None, error: Optional[BaseException] = None) -> None:
+    """Pass the result or error of a call to everyone waiting for it."""
+    for future in job.futures:
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+# Outbound queue of the bot, registered on its session in main.py
+outbound = OutboundQueue(OUTBOUND_CHAT_RATE, OUTBOUND_GROUP_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_GLOBAL_RATE, OUTBOUND_MAX_RETRIES)
+
+# Queued calls are reported when metrics are scraped
+registry.add_collector(lambda: telegram_outbound_queued.set(outbound.depth))
@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key.
+
+    The first caller for a key runs the call; callers that arrive while it is
+    in flight wait for the same result instead of starting their own. If the
+    running call is cancelled, one of the waiters takes over.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Return True if a call for key is currently running."""
+        return key in self._calls
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call() unless a call for key is already in flight, and return its result.
+
+        Args:
+            key: Identifies calls that produce the same result
+            call: Creates the awaitable to run when this caller leads
+
+        Returns:
+            The result of the call, shared by all callers of the same key
+
+        Raises:
+            Whatever the leading call raised
+        """
+        while key in self._calls:
+            future = self._calls[key]
+            try:
+                # Shield so a cancelled waiter does not cancel the shared call
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; retry, possibly as the new leader
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
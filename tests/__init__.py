@@ -0,0 +1 @@
+# Tests package initialization file
\ No newline at end of file
@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+import pytest
+
+# Settings the modules under test read at import time
+os.environ.setdefault("TOKEN", "42:TEST")
+os.environ.setdefault("METRICS_PORT", "0")
+
+from database import db
+from database.pool import ConnectionPool
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Point the database functions at an empty database file with empty caches.
+
+    The test opens it with init_db() and closes it with close_db() inside its
+    own event loop.
+    """
+    monkeypatch.setattr(db, "pool", ConnectionPool(str(tmp_path / "recipes.db"), readers=2, pragmas=db.CONNECTION_PRAGMAS))
+    for cache in (db.recipe_cache, db.page_cache, db.user_cache, db.category_cache):
+        cache.clear()
+    return db.pool.database
+
+
+@pytest.fixture
+def run_in_database(database):
+    """Return a function that runs a coroutine function against the test database.
+
+    The database is opened with init_db() before the call and closed with
+    close_db() after it, in one event loop.
+    """
+    def run(scenario, *args):
+        async def main():
+            await db.init_db()
+            try:
+                return await scenario(*args)
+            finally:
+                await db.close_db()
+        return asyncio.run(main())
+    return run
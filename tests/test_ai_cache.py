@@ -0,0 +1,134 @@
+import sqlite3
+
+import pytest
+
+from database import db
+from services import ai_cache as ai_cache_module
+from services.ai_cache import (
+    NUM_BANDS,
+    AIResponseCache,
+    estimate_similarity,
+    lsh_bands,
+    minhash_signature,
+    normalize_query,
+    prompt_key
+)
+
+QUESTION = "How do I make chicken soup at home?"
+
+
+def make_cache(**kwargs):
+    settings = dict(model="model", ttl=3600, max_entries=100, similarity=0.8)
+    settings.update(kwargs)
+    return AIResponseCache(**settings)
+
+
+def signature(question):
+    return minhash_signature(normalize_query(question))
+
+
+def test_normalized_questions_share_the_exact_key():
+    assert normalize_query("  How do I make Chicken-Soup?! ") == "how do i make chicken soup"
+    assert prompt_key(normalize_query(QUESTION), "model", "en") == prompt_key(normalize_query("how DO i make chicken soup at home"), "model", "en")
+    assert prompt_key(normalize_query(QUESTION), "model", "en") != prompt_key(normalize_query(QUESTION), "model", "ru")
+    assert prompt_key(normalize_query(QUESTION), "model", "en") != prompt_key(normalize_query(QUESTION), "other", "en")
+
+
+def test_signatures_estimate_similarity():
+    assert signature(QUESTION) == signature(QUESTION)
+    assert estimate_similarity(signature(QUESTION), signature("How can I make chicken soup at home?")) >= 0.8
+    assert estimate_similarity(signature(QUESTION), signature("How do I bake an apple pie?")) < 0.5
+
+
+def test_bands_are_salted_with_the_language():
+    bands = lsh_bands(signature(QUESTION), "en")
+    assert len(bands) == NUM_BANDS
+    assert bands == lsh_bands(signature(QUESTION), "en")
+    assert not set(bands) & set(lsh_bands(signature(QUESTION), "ru"))
+
+
+def test_paraphrase_hits_and_dissimilar_question_misses(run_in_database):
+    cache = make_cache()
+
+    async def scenario():
+        await cache.put(QUESTION, "Boil a chicken.", "en")
+        return (
+            await cache.get("how do I make chicken soup at home", "en"),
+            await cache.get("How can I make chicken soup at home?", "en"),
+            await cache.get("How do I bake an apple pie?", "en")
+        )
+
+    assert run_in_database(scenario) == ("Boil a chicken.", "Boil a chicken.", None)
+
+
+def test_similarity_matching_can_be_disabled(run_in_database):
+    cache = make_cache(similarity=0)
+
+    async def scenario():
+        await cache.put(QUESTION, "Boil a chicken.", "en")
+        return await cache.get(QUESTION, "en"), await cache.get("How can I make chicken soup at home?", "en")
+
+    assert run_in_database(scenario) == ("Boil a chicken.", None)
+
+
+def test_answers_are_kept_apart_by_language(run_in_database):
+    cache = make_cache()
+
+    async def scenario():
+        await cache.put(QUESTION, "Boil a chicken.", "en")
+        missing = await cache.get(QUESTION, "ru"), await cache.get("How can I make chicken soup at home?", "ru")
+        await cache.put(QUESTION, "Сварите курицу.", "ru")
+        return missing, await cache.get(QUESTION, "ru"), await cache.get(QUESTION, "en")
+
+    assert run_in_database(scenario) == ((None, None), "Сварите курицу.", "Boil a chicken.")
+
+
+def test_hits_are_written_in_batches(run_in_database, monkeypatch):
+    cache = make_cache(touch_interval=3600)
+    writes = []
+    touch = ai_cache_module.touch_ai_responses
+
+    async def touch_ai_responses(touches):
+        writes.append(sorted(key for key, _ in touches))
+        await touch(touches)
+
+    monkeypatch.setattr(ai_cache_module, "touch_ai_responses", touch_ai_responses)
+    key = prompt_key(normalize_query(QUESTION), "model", "en")
+
+    async def scenario():
+        await cache.start()
+        await cache.put(QUESTION, "Boil a chicken.", "en")
+        for _ in range(3):
+            await cache.get(QUESTION, "en")
+            await cache.get("How can I make chicken soup at home?", "en")
+        # Hits only read the database until the cache is flushed
+        written_early = list(writes)
+        await cache.close()
+        return written_early
+
+    assert run_in_database(scenario) == []
+    assert writes == [[key]]
+    with sqlite3.connect(db.pool.database) as connection:
+        created_at, last_used_at = connection.execute("SELECT created_at, last_used_at FROM ai_responses").fetchone()
+    assert last_used_at > created_at
+
+
+def test_failed_hit_write_is_retried(run_in_database, monkeypatch):
+    cache = make_cache()
+    touch = ai_cache_module.touch_ai_responses
+
+    async def fail(touches):
+        raise sqlite3.OperationalError("database is locked")
+
+    async def scenario():
+        await cache.put(QUESTION, "Boil a chicken.", "en")
+        await cache.get(QUESTION, "en")
+        monkeypatch.setattr(ai_cache_module, "touch_ai_responses", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            await cache.flush()
+        monkeypatch.setattr(ai_cache_module, "touch_ai_responses", touch)
+        pending = len(cache._touched)
+        await cache.flush()
+        return pending, len(cache._touched)
+
+    assert run_in_database(scenario) == (1, 0)
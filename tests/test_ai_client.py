@@ -0,0 +1,227 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from services import ai_cache as ai_cache_module
+from services import ai_client as ai_client_module
+from services.ai_cache import AIResponseCache
+from services.ai_client import AIClientError, CircuitBreaker, OpenRouterClient
+
+
+def make_client(models, url="http://127.0.0.1:1/", **kwargs):
+    """Create a client with short delays and a low breaker threshold."""
+    settings = dict(max_retries=2, retry_base_delay=0.5, retry_max_delay=10, breaker_failures=2, breaker_reset_timeout=30)
+    settings.update(kwargs)
+    return OpenRouterClient(api_key="key", models=models, url=url, **settings)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace time.monotonic of the client module with a settable clock."""
+    now = [1000.0]
+    monkeypatch.setattr(ai_client_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry delays instead of waiting."""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(ai_client_module.asyncio, "sleep", sleep)
+    return delays
+
+
+def scripted(client, outcomes):
+    """Make client._complete_once return or raise the next outcome of each model."""
+    calls = []
+
+    async def complete_once(prompt, model):
+        calls.append(model)
+        outcome = outcomes[model].pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client._complete_once = complete_once
+    return calls
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+
+
+def test_breaker_half_open_trial_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    # One trial request goes through, the ones arriving meanwhile do not
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow()
+
+
+def test_breaker_half_open_trial_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+
+
+def test_breaker_lost_trial_expires(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    # The trial never reports back, e.g. it was cancelled
+    clock[0] += 30
+    assert breaker.allow()
+
+
+def test_retry_delay_backs_off_exponentially(monkeypatch):
+    client = make_client(["m"], max_retries=5, retry_base_delay=0.5, retry_max_delay=3)
+    monkeypatch.setattr(ai_client_module.random, "uniform", lambda low, high: high)
+    error = AIClientError("busy", status=503, retryable=True)
+    assert [client._retry_delay(error, attempt) for attempt in range(6)] == [0.5, 1.0, 2.0, 3, 3, None]
+
+
+def test_retry_delay_honors_retry_after():
+    client = make_client(["m"], retry_max_delay=10)
+    assert client._retry_delay(AIClientError("slow down", status=429, retryable=True, retry_after=4), 0) == 4
+    # A longer wait than allowed gives up on the model
+    assert client._retry_delay(AIClientError("slow down", status=429, retryable=True, retry_after=60), 0) is None
+    assert client._retry_delay(AIClientError("bad request", status=400), 0) is None
+
+
+def test_complete_retries_then_succeeds(sleeps):
+    client = make_client(["primary", "fallback"])
+    calls = scripted(client, {"primary": [AIClientError("busy", status=503, retryable=True), "answer"]})
+    assert asyncio.run(client.complete("prompt")) == ("primary", "answer")
+    assert calls == ["primary", "primary"]
+    assert len(sleeps) == 1
+    assert client.breakers["primary"].failures == 0
+
+
+def test_complete_falls_back_to_the_next_model(sleeps):
+    client = make_client(["primary", "fallback"])
+    busy = AIClientError("busy", status=503, retryable=True)
+    calls = scripted(client, {"primary": [busy, busy, busy], "fallback": ["answer"]})
+    assert asyncio.run(client.complete("prompt")) == ("fallback", "answer")
+    assert calls == ["primary"] * 3 + ["fallback"]
+    assert len(sleeps) == 2
+    assert client.breakers["primary"].failures == 1
+
+
+def test_complete_skips_models_with_an_open_circuit(sleeps):
+    client = make_client(["primary", "fallback"], max_retries=0, breaker_failures=1)
+    calls = scripted(client, {
+        "primary": [AIClientError("down", status=502, retryable=True)],
+        "fallback": ["first", "second"]
+    })
+    asyncio.run(client.complete("prompt"))
+    assert asyncio.run(client.complete("prompt")) == ("fallback", "second")
+    assert calls == ["primary", "fallback", "fallback"]
+
+
+def test_complete_does_not_fall_back_on_rejected_requests(sleeps):
+    client = make_client(["primary", "fallback"])
+    calls = scripted(client, {"primary": [AIClientError("bad request", status=400)]})
+    with pytest.raises(AIClientError):
+        asyncio.run(client.complete("prompt"))
+    assert calls == ["primary"]
+    assert not client.breakers["primary"].is_open
+
+
+def test_complete_raises_when_every_model_fails(sleeps):
+    client = make_client(["primary", "fallback"], max_retries=0)
+    calls = scripted(client, {
+        "primary": [AIClientError("down", status=502, retryable=True)],
+        "fallback": [AIClientError("missing", status=404)]
+    })
+    with pytest.raises(AIClientError) as error:
+        asyncio.run(client.complete("prompt"))
+    assert error.value.status == 404
+    assert calls == ["primary", "fallback"]
+
+
+def serve(handler):
+    """Start a local HTTP server for handler and return its runner and URL."""
+    async def start():
+        app = web.Application()
+        app.router.add_post("/", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://127.0.0.1:{port}/"
+    return start()
+
+
+def test_stream_yields_the_answering_model_and_skips_malformed_events():
+    events = ['[1]', '"text"', '{"choices": "bad"}', '{"choices": [{"delta": {"content": "Hel"}}]}', ': keep-alive',
+              '{"choices": [{"delta": {"content": "lo"}}]}', '[DONE]']
+    requests = []
+
+    async def handler(request):
+        payload = await request.json()
+        requests.append(payload["model"])
+        if payload["model"] == "primary":
+            return web.Response(status=404, text="no such model")
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for event in events:
+            await response.write(f"data: {event}\n\n".encode() if not event.startswith(":") else f"{event}\n\n".encode())
+        return response
+
+    async def scenario():
+        runner, url = await serve(handler)
+        client = make_client(["primary", "fallback"], url=url)
+        try:
+            return [piece async for piece in client.stream("prompt")]
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    assert asyncio.run(scenario()) == [("fallback", "Hel"), ("fallback", "lo")]
+    assert requests == ["primary", "fallback"]
+
+
+def test_cache_stores_only_answers_of_the_cached_model(monkeypatch):
+    saved = []
+
+    async def save_ai_response(**entry):
+        saved.append(entry["model"])
+
+    monkeypatch.setattr(ai_cache_module, "save_ai_response", save_ai_response)
+    cache = AIResponseCache(model="primary", ttl=60, max_entries=10, similarity=0.8)
+
+    async def scenario():
+        await cache.put("How long to boil an egg?", "answer", "en", "fallback")
+        await cache.put("How long to boil an egg?", "answer", "en", "primary")
+
+    asyncio.run(scenario())
+    assert saved == ["primary"]
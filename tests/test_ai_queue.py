@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from services.ai_queue import AIJobQueue, QueueFullError, UserLimitError
+
+
+def blocker(started, release):
+    """Return a job that records its start and runs until release is set."""
+    async def run():
+        started.append(1)
+        await release.wait()
+    return run
+
+
+def test_workers_limit_concurrent_jobs():
+    async def scenario():
+        queue = AIJobQueue(workers=2, max_depth=10, per_user_limit=10)
+        await queue.start()
+        # Let the workers wait for jobs
+        await asyncio.sleep(0)
+        started, release = [], asyncio.Event()
+        positions = [await queue.submit(user_id, blocker(started, release)) for user_id in range(4)]
+        await asyncio.sleep(0.01)
+        running, depth = len(started), queue.depth
+
+        release.set()
+        await asyncio.wait_for(queue.join(), 1)
+        await queue.close()
+        return positions, running, depth, len(started)
+
+    positions, running, depth, finished = asyncio.run(scenario())
+    assert positions == [0, 0, 1, 2]
+    assert running == 2
+    assert depth == 2
+    assert finished == 4
+
+
+def test_queue_depth_is_limited():
+    async def scenario():
+        queue = AIJobQueue(workers=1, max_depth=1, per_user_limit=10)
+        started, release = [], asyncio.Event()
+        await queue.submit(1, blocker(started, release))
+        await asyncio.sleep(0.01)
+        await queue.submit(2, blocker(started, release))
+        try:
+            with pytest.raises(QueueFullError):
+                await queue.submit(3, blocker(started, release))
+        finally:
+            await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_jobs_per_user_are_limited():
+    async def scenario():
+        queue = AIJobQueue(workers=1, max_depth=10, per_user_limit=2)
+        started, release = [], asyncio.Event()
+        await queue.submit(1, blocker(started, release))
+        await queue.submit(1, blocker(started, release))
+        try:
+            with pytest.raises(UserLimitError):
+                await queue.submit(1, blocker(started, release))
+            # Other users are not affected
+            await queue.submit(2, blocker(started, release))
+
+            # A finished job frees the user's slot
+            release.set()
+            await asyncio.wait_for(queue.join(), 1)
+            await queue.submit(1, blocker(started, release))
+        finally:
+            await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancel_user_cancels_queued_and_running_jobs():
+    async def scenario():
+        queue = AIJobQueue(workers=1, max_depth=10, per_user_limit=10)
+        started, release = [], asyncio.Event()
+        cancelled = []
+
+        async def run():
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        await queue.submit(1, run)
+        await queue.submit(1, blocker(started, release))
+        await queue.submit(2, blocker(started, release))
+        await asyncio.sleep(0.01)
+
+        count = queue.cancel_user(1)
+        await asyncio.sleep(0.01)
+        # Only user 2's job is left and it now runs
+        state = (count, len(cancelled), len(started), queue.depth)
+        release.set()
+        await asyncio.wait_for(queue.join(), 1)
+        await queue.close()
+        return state
+
+    assert asyncio.run(scenario()) == (2, 1, 1, 0)
+
+
+def test_failing_job_does_not_stop_the_worker():
+    async def scenario():
+        queue = AIJobQueue(workers=1, max_depth=10, per_user_limit=10)
+        done = []
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def succeed():
+            done.append(1)
+
+        await queue.submit(1, fail)
+        await queue.submit(1, succeed)
+        await asyncio.wait_for(queue.join(), 1)
+        await queue.close()
+        return done
+
+    assert asyncio.run(scenario()) == [1]
+
+
+def test_close_cancels_running_jobs():
+    async def scenario():
+        queue = AIJobQueue(workers=1, max_depth=10, per_user_limit=10)
+        started, release = [], asyncio.Event()
+        await queue.submit(1, blocker(started, release))
+        await queue.submit(1, blocker(started, release))
+        await asyncio.sleep(0.01)
+        await queue.close()
+        await asyncio.wait_for(queue.join(), 1)
+        return len(started), queue.depth
+
+    assert asyncio.run(scenario()) == (1, 0)
@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import sqlite3
+
+import pytest
+
+from database import bulk
+from database.bulk import BulkImportError, export_recipes, import_recipes, read_records, validate_record
+from database.db import count_recipes_in_category, iter_recipes
+
+CATEGORIES = {"soups": 1, "супы": 1, "desserts": 3}
+
+RECIPES = [
+    {"category": "Soups", "title": "Borscht", "ingredients": "beets\ncabbage", "instructions": "Boil.", "video_link": "https://example.com/v"},
+    {"category": "Супы", "title": "Щи", "ingredients": "капуста", "instructions": "Варить, \"не спеша\".", "video_link": None},
+    {"category": "desserts", "title": "Apple pie", "ingredients": "apples, flour", "instructions": "Bake.", "video_link": None},
+]
+
+
+def jsonl(records):
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+def csv_text(records, fields=("category", "title", "ingredients", "instructions", "video_link")):
+    file = io.StringIO(newline="")
+    writer = csv.DictWriter(file, fields, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(records)
+    return file.getvalue()
+
+
+def test_validate_record_builds_a_recipe_row():
+    record = {"category": " Супы ", "title": " Щи ", "ingredients": "капуста", "instructions": "Варить.", "video_link": ""}
+    assert validate_record(record, CATEGORIES) == (1, "Щи", "капуста", "Варить.", None)
+
+
+@pytest.mark.parametrize("record, reason", [
+    ("invalid JSON: Expecting value", "invalid JSON"),
+    ([1, 2], "not an object"),
+    ({"title": "t", "ingredients": "i", "instructions": "s"}, "category is missing"),
+    ({"category": "Soups", "title": " ", "ingredients": "i", "instructions": "s"}, "title is missing"),
+    ({"category": "Soups", "title": 5, "ingredients": "i", "instructions": "s"}, "title is not a string"),
+    ({"category": "Grill", "title": "t", "ingredients": "i", "instructions": "s"}, "unknown category 'Grill'"),
+])
+def test_validate_record_rejects_invalid_records(record, reason):
+    with pytest.raises(ValueError, match=reason):
+        validate_record(record, CATEGORIES)
+
+
+def test_read_records_numbers_lines():
+    records = list(read_records(io.StringIO('{"a": 1}\n\nnot json\n'), "jsonl"))
+    assert records[0] == (1, {"a": 1})
+    assert records[1][0] == 3
+    assert records[1][1].startswith("invalid JSON")
+    rows = list(read_records(io.StringIO(csv_text(RECIPES[:1])), "csv"))
+    assert [(line, row["title"]) for line, row in rows] == [(3, "Borscht")]
+
+
+def test_csv_without_required_columns_is_rejected():
+    with pytest.raises(ValueError, match="Missing CSV columns: ingredients, instructions"):
+        list(read_records(io.StringIO("category,title\nSoups,Borscht\n"), "csv"))
+
+
+@pytest.mark.parametrize("format_name, write", [("jsonl", jsonl), ("csv", csv_text)])
+def test_round_trip(run_in_database, format_name, write):
+    async def scenario():
+        report = await import_recipes(io.StringIO(write(RECIPES), newline=""), format_name, batch_size=2)
+        exported = io.StringIO(newline="")
+        await export_recipes(exported, format_name)
+        return report, exported.getvalue()
+
+    report, exported = run_in_database(scenario)
+    assert (report.rows, report.skipped) == (3, 0)
+    if format_name == "csv":
+        records = [row for _, row in read_records(io.StringIO(exported, newline=""), "csv")]
+        # CSV has no null; an empty link is read back as None
+        records = [{**row, "video_link": row["video_link"] or None} for row in records]
+    else:
+        records = [record for _, record in read_records(io.StringIO(exported), "jsonl")]
+    assert [int(record["id"]) for record in records] == [1, 2, 3]
+    # Categories are exported by their name in LANGUAGE
+    assert [record["category"] for record in records] == ["Soups", "Soups", "Desserts"]
+    for record, original in zip(records, RECIPES):
+        for name in ("title", "ingredients", "instructions", "video_link"):
+            assert record[name] == original[name]
+
+
+def test_csv_with_byte_order_mark(run_in_database, tmp_path):
+    path = tmp_path / "recipes.csv"
+    path.write_text(csv_text(RECIPES), encoding="utf-8-sig")
+
+    async def scenario():
+        with open(path, encoding="utf-8-sig", newline="") as file:
+            return await import_recipes(file, "csv")
+
+    assert run_in_database(scenario).rows == 3
+
+
+def test_invalid_rows_are_skipped_and_reported(run_in_database):
+    lines = jsonl(RECIPES[:1]) + "not json\n" + jsonl([{**RECIPES[2], "category": "Grill"}, RECIPES[2]])
+
+    async def scenario():
+        report = await import_recipes(io.StringIO(lines), "jsonl")
+        return report, await count_recipes_in_category(1), await count_recipes_in_category(3)
+
+    report, soups, desserts = run_in_database(scenario)
+    assert (report.rows, report.skipped) == (2, 2)
+    assert report.errors[0].startswith("line 2: invalid JSON")
+    assert report.errors[1] == "line 3: unknown category 'Grill'"
+    assert "2 rows" in report.summary() and "2 skipped" in report.summary()
+    assert (soups, desserts) == (1, 1)
+
+
+def test_broken_file_keeps_the_batches_written_before(run_in_database):
+    # The sixth row is longer than the csv module accepts
+    records = [{**RECIPES[0], "title": f"Soup {number}"} for number in range(5)]
+    records.append({**RECIPES[0], "instructions": "x" * (csv.field_size_limit() + 1)})
+
+    async def scenario():
+        with pytest.raises(BulkImportError) as error:
+            await import_recipes(io.StringIO(csv_text(records), newline=""), "csv", batch_size=2)
+        return error.value, [recipe["title"] async for recipe in iter_recipes()]
+
+    error, titles = run_in_database(scenario)
+    assert isinstance(error.__cause__, csv.Error)
+    # Two full batches were written; the fifth row was still waiting for its batch
+    assert error.report.rows == 4
+    assert titles == ["Soup 0", "Soup 1", "Soup 2", "Soup 3"]
+
+
+def test_failed_batch_keeps_the_batches_written_before(run_in_database, monkeypatch):
+    add_recipes = bulk.add_recipes
+    calls = []
+
+    async def fail_second_batch(recipes):
+        calls.append(len(recipes))
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("database is locked")
+        return await add_recipes(recipes)
+
+    monkeypatch.setattr(bulk, "add_recipes", fail_second_batch)
+
+    async def scenario():
+        with pytest.raises(BulkImportError, match="database is locked") as error:
+            await import_recipes(io.StringIO(jsonl(RECIPES * 2)), "jsonl", batch_size=2)
+        return error.value.report, [recipe["title"] async for recipe in iter_recipes()]
+
+    report, titles = run_in_database(scenario)
+    assert report.rows == 2
+    assert titles == ["Borscht", "Щи"]
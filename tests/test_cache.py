@@ -0,0 +1,86 @@
+from database import cache
+from database.cache import MISSING, SharedGeneration, TTLCache
+
+
+def test_get_returns_stored_value():
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("a", 1, ttl_cache.version)
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("b") is MISSING
+    assert ttl_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    ttl_cache = TTLCache(maxsize=2, ttl=10)
+    ttl_cache.set("a", 1, ttl_cache.version)
+
+    now[0] = 110.0
+    assert ttl_cache.get("a") == 1
+    now[0] = 110.5
+    assert ttl_cache.get("a") is MISSING
+    assert len(ttl_cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set("a", 1, ttl_cache.version)
+    ttl_cache.set("b", 2, ttl_cache.version)
+    # Reading "a" makes "b" the least recently used
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3, ttl_cache.version)
+
+    assert ttl_cache.get("b") is MISSING
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+
+
+def test_zero_maxsize_disables_the_cache():
+    ttl_cache = TTLCache(maxsize=0, ttl=60)
+    ttl_cache.set("a", 1, ttl_cache.version)
+    assert ttl_cache.get("a") is MISSING
+
+
+def test_set_ignores_values_read_before_an_invalidation():
+    ttl_cache = TTLCache(maxsize=4, ttl=60)
+    version = ttl_cache.version
+    # A write invalidates the key while the reader is querying the database
+    ttl_cache.invalidate("a")
+    ttl_cache.set("a", "stale", version)
+    assert ttl_cache.get("a") is MISSING
+
+    ttl_cache.set("a", "fresh", ttl_cache.version)
+    assert ttl_cache.get("a") == "fresh"
+
+
+def test_invalidate_where_and_clear():
+    ttl_cache = TTLCache(maxsize=4, ttl=60)
+    for key in [(1, "x"), (1, "y"), (2, "x")]:
+        ttl_cache.set(key, key, ttl_cache.version)
+
+    ttl_cache.invalidate_where(lambda key: key[0] == 1)
+    assert len(ttl_cache) == 1
+    assert ttl_cache.get((2, "x")) == (2, "x")
+
+    version = ttl_cache.version
+    ttl_cache.clear()
+    assert len(ttl_cache) == 0
+    assert ttl_cache.version == version + 1
+
+
+def test_shared_generation_clears_caches_after_other_writes():
+    ttl_cache = TTLCache(maxsize=4, ttl=60)
+    generation = SharedGeneration(ttl_cache)
+    ttl_cache.set("a", 1, ttl_cache.version)
+
+    # A write made by this process keeps its caches
+    generation.bump()
+    generation.sync()
+    assert ttl_cache.get("a") == 1
+
+    # A write made by another process moves the shared value only
+    with generation._value.get_lock():
+        generation._value.value += 1
+    generation.sync()
+    assert ttl_cache.get("a") is MISSING
@@ -0,0 +1,75 @@
+import base64
+
+import pytest
+
+from keyboards.callbacks import (
+    ACTIONS,
+    CALLBACK_VERSION,
+    NEXT,
+    CallbackPayload,
+    _ACTION_ARITIES,
+    decode_callback,
+    encode_callback
+)
+
+
+def raw_callback(*data: int) -> str:
+    """Encode raw bytes the way encode_callback() does."""
+    return base64.urlsafe_b64encode(bytes(data)).rstrip(b"=").decode("ascii")
+
+
+@pytest.mark.parametrize("action, args", [
+    ("category", (0,)),
+    ("page", (3, NEXT, 1234567)),
+    ("recipe", (127,)),
+    ("recipe", (128,)),
+    ("recipe", (2 ** 63,)),
+    ("back_to_categories", ()),
+])
+def test_round_trip(action, args):
+    data = encode_callback(action, *args)
+    assert decode_callback(data) == CallbackPayload(action, args)
+    assert len(data.encode()) <= 64
+
+
+def test_every_action_round_trips():
+    for action, arity in _ACTION_ARITIES:
+        args = tuple(range(1, arity + 1))
+        assert decode_callback(encode_callback(action, *args)) == (action, args)
+
+
+def test_encoding_is_compact():
+    assert len(encode_callback("recipe", 1_000_000)) <= 8
+    assert len(encode_callback("page", 1000, NEXT, 1_000_000)) <= 12
+
+
+def test_encode_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        encode_callback("recipe")
+    with pytest.raises(ValueError):
+        encode_callback("recipe", 1, 2)
+    with pytest.raises(ValueError):
+        encode_callback("recipe", -1)
+    with pytest.raises(KeyError):
+        encode_callback("unknown", 1)
+
+
+@pytest.mark.parametrize("data", [
+    None,
+    "",
+    "recipe_5",
+    "!!!",
+    "рецепт",
+    "A",
+    # Other version
+    raw_callback(CALLBACK_VERSION + 1, 2, 5),
+    # Unknown action
+    raw_callback(CALLBACK_VERSION, len(ACTIONS), 5),
+    # Too few and too many arguments
+    raw_callback(CALLBACK_VERSION, 2),
+    raw_callback(CALLBACK_VERSION, 2, 5, 6),
+    # Truncated varint
+    raw_callback(CALLBACK_VERSION, 2, 0x80),
+])
+def test_malformed_data_is_rejected(data):
+    assert decode_callback(data) is None
@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import CommandObject
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from handlers.dispatch import HashDispatch
+from keyboards.callbacks import CallbackPayload, encode_callback
+from middlewares.callback_data import CallbackDataMiddleware
+from translations import TRANSLATIONS
+
+USER = User(id=5, is_bot=False, first_name="Test")
+CHAT = Chat(id=5, type="private")
+
+
+class States(StatesGroup):
+    typing = State()
+    choosing = State()
+
+
+def message_update(text=None, **fields):
+    return Update(update_id=1, message=Message(message_id=1, date=datetime.now(), chat=CHAT, from_user=USER, text=text, **fields))
+
+
+def callback_update(data):
+    message = Message(message_id=1, date=datetime.now(), chat=CHAT, from_user=USER, text="menu")
+    return Update(update_id=1, callback_query=CallbackQuery(id="1", from_user=USER, chat_instance="1", message=message, data=data))
+
+
+@pytest.fixture
+def routed():
+    """Build a dispatcher with HashDispatch routes and a fallthrough router; return it and the calls made."""
+    calls = []
+    router = Router()
+    routes = HashDispatch(router)
+
+    @routes.button("cancel_button")
+    async def cancel(message: Message):
+        calls.append(("button", message.text))
+
+    @routes.command("search")
+    async def search(message: Message, command: CommandObject):
+        calls.append(("command", command.command, command.args, command.mention))
+
+    @routes.message(States.typing)
+    async def typing(message: Message):
+        calls.append(("state", message.text))
+
+    @routes.callback("recipe")
+    async def recipe_anywhere(callback: CallbackQuery, payload: CallbackPayload):
+        calls.append(("callback any state", payload.args))
+
+    @routes.callback("recipe", States.choosing)
+    async def recipe_choosing(callback: CallbackQuery, payload: CallbackPayload):
+        calls.append(("callback choosing", payload.args))
+
+    @routes.callback("edit", States.choosing)
+    async def edit(callback: CallbackQuery, payload: CallbackPayload):
+        calls.append(("edit", payload.args))
+
+    fallthrough = Router()
+
+    @fallthrough.message()
+    async def other_message(message: Message):
+        calls.append(("fallthrough", message.text))
+
+    @fallthrough.callback_query()
+    async def other_callback(callback: CallbackQuery):
+        calls.append(("fallthrough", callback.data))
+
+    dispatcher = Dispatcher(storage=MemoryStorage())
+    dispatcher.callback_query.outer_middleware(CallbackDataMiddleware())
+    dispatcher.include_router(router)
+    dispatcher.include_router(fallthrough)
+    return dispatcher, calls
+
+
+def feed(dispatcher, update, state=None):
+    """Handle one update with the user in the given state."""
+    async def scenario():
+        bot = Bot(token="42:TEST")
+        key = StorageKey(bot_id=bot.id, chat_id=CHAT.id, user_id=USER.id)
+        await dispatcher.storage.set_state(key, state)
+        try:
+            await dispatcher.feed_update(bot, update)
+        finally:
+            await bot.session.close()
+    asyncio.run(scenario())
+
+
+def test_buttons_work_in_any_language_and_state(routed):
+    dispatcher, calls = routed
+    feed(dispatcher, message_update(TRANSLATIONS["cancel_button"]["ru"]))
+    feed(dispatcher, message_update(TRANSLATIONS["cancel_button"]["en"]), States.typing)
+    assert calls == [("button", TRANSLATIONS["cancel_button"]["ru"]), ("button", TRANSLATIONS["cancel_button"]["en"])]
+
+
+def test_commands_are_parsed_into_a_command_object(routed):
+    dispatcher, calls = routed
+    feed(dispatcher, message_update("/search chicken soup"))
+    feed(dispatcher, message_update("/SEARCH@cook_bot"), States.typing)
+    assert calls == [("command", "search", "chicken soup", None), ("command", "SEARCH", None, "cook_bot")]
+
+
+def test_state_handler_gets_other_messages_of_its_state(routed):
+    dispatcher, calls = routed
+    # Buttons and commands take precedence over the state, as their handlers work in any state
+    feed(dispatcher, message_update("Borscht"), States.typing)
+    feed(dispatcher, message_update("/unknown command"), States.typing)
+    assert calls == [("state", "Borscht"), ("state", "/unknown command")]
+
+
+def test_unrouted_messages_fall_through(routed):
+    dispatcher, calls = routed
+    feed(dispatcher, message_update("Borscht"))
+    feed(dispatcher, message_update("/unknown"), States.choosing)
+    feed(dispatcher, message_update(None, caption="photo"))
+    assert calls == [("fallthrough", "Borscht"), ("fallthrough", "/unknown"), ("fallthrough", None)]
+
+
+def test_non_text_message_goes_to_the_state_handler(routed):
+    dispatcher, calls = routed
+    feed(dispatcher, message_update(None, caption="photo"), States.typing)
+    assert calls == [("state", None)]
+
+
+def test_state_specific_callback_wins_over_any_state(routed):
+    dispatcher, calls = routed
+    feed(dispatcher, callback_update(encode_callback("recipe", 7)), States.choosing)
+    feed(dispatcher, callback_update(encode_callback("recipe", 8)), States.typing)
+    feed(dispatcher, callback_update(encode_callback("recipe", 9)))
+    assert calls == [("callback choosing", (7,)), ("callback any state", (8,)), ("callback any state", (9,))]
+
+
+def test_unrouted_callbacks_fall_through(routed):
+    dispatcher, calls = routed
+    # Right action in the wrong state, an action without handlers, and data of an older bot version
+    feed(dispatcher, callback_update(encode_callback("edit", 1)), States.typing)
+    feed(dispatcher, callback_update(encode_callback("delete", 1)), States.choosing)
+    feed(dispatcher, callback_update("recipe:1"), States.choosing)
+    assert calls == [("fallthrough", encode_callback("edit", 1)), ("fallthrough", encode_callback("delete", 1)), ("fallthrough", "recipe:1")]
+
+
+def test_registering_a_route_twice_fails():
+    routes = HashDispatch(Router())
+    routes.command("search")(lambda message: None)
+    with pytest.raises(ValueError):
+        routes.command("Search")(lambda message: None)
+    with pytest.raises(ValueError):
+        routes.callback("no_such_action")
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from database import fsm_storage
+from database.db import get_fsm_record
+from database.fsm_storage import SQLiteStorage
+
+
+def storage_key(user_id):
+    """Build the key of a private chat with a user."""
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Record the size of every batch the storage writes."""
+    sizes = []
+    save = fsm_storage.save_fsm_records
+
+    async def save_fsm_records(records):
+        sizes.append(len(records))
+        await save(records)
+
+    monkeypatch.setattr(fsm_storage, "save_fsm_records", save_fsm_records)
+    return sizes
+
+
+def test_reads_see_changes_before_they_are_written(run_in_database, batches):
+    async def scenario():
+        storage = SQLiteStorage(ttl=3600, flush_interval=60, flush_batch=100)
+        await storage.start()
+        await storage.set_state(storage_key(1), "RecipeStates:viewing_recipes")
+        await storage.update_data(storage_key(1), {"category": 2})
+        result = (
+            await storage.get_state(storage_key(1)),
+            await storage.get_data(storage_key(1)),
+            await get_fsm_record(SQLiteStorage._key(storage_key(1)), 3600)
+        )
+        await storage.close()
+        return result
+
+    assert run_in_database(scenario) == ("RecipeStates:viewing_recipes", {"category": 2}, None)
+    assert batches == [1]
+
+
+def test_changes_are_written_in_batches(run_in_database, batches):
+    async def scenario():
+        storage = SQLiteStorage(ttl=3600, flush_interval=60, flush_batch=3)
+        await storage.start()
+        for user_id in range(2):
+            await storage.set_state(storage_key(user_id), "state")
+            await storage.set_state(storage_key(user_id), "next")
+        await asyncio.sleep(0.05)
+        # Two conversations are pending, below the batch size
+        written_early = list(batches)
+
+        await storage.set_state(storage_key(2), "state")
+        await asyncio.sleep(0.05)
+        stored = await get_fsm_record(SQLiteStorage._key(storage_key(0)), 3600)
+        await storage.close()
+        return written_early, stored
+
+    assert run_in_database(scenario) == ([], ("next", None))
+    # Repeated changes of one conversation are written once
+    assert batches == [3]
+
+
+def test_changes_are_written_after_the_flush_interval(run_in_database, batches):
+    async def scenario():
+        storage = SQLiteStorage(ttl=3600, flush_interval=0.05, flush_batch=100)
+        await storage.start()
+        await storage.set_state(storage_key(1), "state")
+        await asyncio.sleep(0.2)
+        stored = await get_fsm_record(SQLiteStorage._key(storage_key(1)), 3600)
+        await storage.close()
+        return stored
+
+    assert run_in_database(scenario) == ("state", None)
+    assert batches == [1]
+
+
+def test_close_writes_pending_changes(run_in_database):
+    async def scenario():
+        storage = SQLiteStorage(ttl=3600, flush_interval=60, flush_batch=100)
+        await storage.start()
+        await storage.set_data(storage_key(1), {"title": "Борщ"})
+        await storage.set_state(storage_key(2), "state")
+        await storage.close()
+
+        # A new storage reads what the closed one wrote
+        reopened = SQLiteStorage(ttl=3600, flush_interval=60, flush_batch=100)
+        return await reopened.get_data(storage_key(1)), await reopened.get_state(storage_key(2))
+
+    assert run_in_database(scenario) == ({"title": "Борщ"}, "state")
+
+
+def test_cleared_conversations_are_deleted(run_in_database):
+    async def scenario():
+        storage = SQLiteStorage(ttl=3600, flush_interval=60, flush_batch=100)
+        await storage.set_state(storage_key(1), "state")
+        await storage.flush()
+        await storage.set_state(storage_key(1), None)
+        await storage.flush()
+        return await get_fsm_record(SQLiteStorage._key(storage_key(1)), 3600)
+
+    assert run_in_database(scenario) is None
+
+
+def test_failed_write_keeps_the_changes(run_in_database, monkeypatch):
+    async def scenario():
+        storage = SQLiteStorage(ttl=3600, flush_interval=60, flush_batch=100)
+        await storage.set_state(storage_key(1), "state")
+
+        async def fail(records):
+            raise OSError("disk full")
+
+        save = fsm_storage.save_fsm_records
+        monkeypatch.setattr(fsm_storage, "save_fsm_records", fail)
+        with pytest.raises(OSError):
+            await storage.flush()
+        state = await storage.get_state(storage_key(1))
+
+        monkeypatch.setattr(fsm_storage, "save_fsm_records", save)
+        await storage.flush()
+        return state, await get_fsm_record(SQLiteStorage._key(storage_key(1)), 3600)
+
+    assert run_in_database(scenario) == ("state", ("state", None))
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import sqlite3
+
+import aiosqlite
+import pytest
+
+from database import migrations
+from database.db import (
+    add_recipe,
+    delete_recipe,
+    find_recipes_by_ingredients,
+    get_category_counts,
+    get_recipe_by_id,
+    search_recipes,
+    update_recipe
+)
+from database.migrations import LEGACY_CATEGORY_ID, apply_migrations
+from translations import category_names
+
+# Recipes of the original schema: (category name, title, ingredients)
+RECIPES = [
+    ("Супы", "Борщ", "свекла, капуста"),
+    ("Супы", "Deleted soup", "water"),
+    ("Desserts", "Apple pie", "apples, flour"),
+    ("завтраки", "Porridge", "oats, milk"),
+    ("Grill", "Steak", "beef, salt"),
+    ("Smoothies", "Berry smoothie", "berries, yogurt"),
+    ("Grill", "Deleted kebab", "lamb"),
+]
+# Ids deleted before the migration; the last one is the highest id ever used
+DELETED_IDS = (2, 7)
+
+
+@pytest.fixture
+def legacy_database(database, monkeypatch):
+    """Fill the test database as the bot did at schema version 7, before categories had ids."""
+    with sqlite3.connect(database) as connection:
+        connection.execute("""
+        CREATE TABLE recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            title TEXT NOT NULL,
+            ingredients TEXT NOT NULL,
+            instructions TEXT NOT NULL,
+            video_link TEXT
+        )
+        """)
+        connection.executemany(
+            "INSERT INTO recipes (category, title, ingredients, instructions) VALUES (?, ?, ?, 'Cook it.')",
+            RECIPES
+        )
+        connection.executemany("DELETE FROM recipes WHERE id = ?", [(recipe_id,) for recipe_id in DELETED_IDS])
+        connection.execute("PRAGMA user_version = 1")
+
+    async def migrate_to_version_7():
+        async with aiosqlite.connect(database) as db:
+            await apply_migrations(db)
+            await db.commit()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:7])
+        asyncio.run(migrate_to_version_7())
+
+    with sqlite3.connect(database) as connection:
+        connection.executemany(
+            "INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, 0)",
+            [
+                ("1:1:1::::default", "RecipeStates:viewing_recipes", json.dumps({"category": "Супы", "page": 1})),
+                ("1:2:2::::default", "RecipeStates:viewing_recipes", json.dumps({"category": "Grill"})),
+                ("1:3:3::::default", "RecipeStates:asking_ai", json.dumps({"query": "soup"})),
+                ("1:4:4::::default", "RecipeStates:asking_ai", None),
+            ]
+        )
+    return database
+
+
+def read(database, query):
+    with sqlite3.connect(database) as connection:
+        return connection.execute(query).fetchall()
+
+
+def test_recipes_keep_their_ids_and_get_category_ids(legacy_database, run_in_database):
+    async def scenario():
+        return [await get_recipe_by_id(recipe_id) for recipe_id in range(1, len(RECIPES) + 1)]
+
+    recipes = run_in_database(scenario)
+    assert [recipe and (recipe["id"], recipe["category_id"], recipe["title"]) for recipe in recipes] == [
+        (1, 1, "Борщ"),
+        None,
+        (3, 3, "Apple pie"),
+        (4, 0, "Porridge"),
+        (5, LEGACY_CATEGORY_ID, "Steak"),
+        (6, LEGACY_CATEGORY_ID + 1, "Berry smoothie"),
+        None,
+    ]
+    assert "category" not in recipes[0]
+    assert read(legacy_database, "PRAGMA user_version") == [(len(migrations.MIGRATIONS),)]
+    assert read(legacy_database, "PRAGMA integrity_check") == [("ok",)]
+
+
+def test_unknown_categories_are_named_the_same_in_every_language(legacy_database, run_in_database):
+    run_in_database(asyncio.sleep, 0)
+    assert category_names[LEGACY_CATEGORY_ID] == {"en": "Grill", "ru": "Grill"}
+    assert category_names[LEGACY_CATEGORY_ID + 1] == {"en": "Smoothies", "ru": "Smoothies"}
+    assert category_names[1] == {"en": "Soups", "ru": "Супы"}
+
+
+def test_counts_match_the_recipes(legacy_database, run_in_database):
+    async def scenario():
+        before = dict(await get_category_counts())
+        await update_recipe(3, 1, "Apple pie", "apples, flour", "Cook it.")
+        await delete_recipe(5)
+        return before, await get_category_counts()
+
+    before, after = run_in_database(scenario)
+    assert before == {0: 1, 1: 1, 2: 0, 3: 1, 4: 0, 5: 0, LEGACY_CATEGORY_ID: 1, LEGACY_CATEGORY_ID + 1: 1}
+    # The triggers keep counting after the migration
+    assert after[1] == 2
+    assert after[3] == 0
+    assert after[LEGACY_CATEGORY_ID] == 0
+
+
+def test_deleted_ids_stay_retired(legacy_database, run_in_database):
+    async def scenario():
+        return await add_recipe(1, "Shchi", "cabbage", "Cook it.")
+
+    assert run_in_database(scenario) == DELETED_IDS[-1] + 1
+
+
+def test_search_indexes_still_match(legacy_database, run_in_database):
+    async def scenario():
+        found = (await search_recipes("борщ"), await find_recipes_by_ingredients("apples"))
+        # The recreated triggers index new and changed recipes
+        recipe_id = await add_recipe(1, "Mushroom soup", "mushrooms", "Cook it.")
+        await update_recipe(1, 1, "Red borscht", "свекла, капуста", "Cook it.")
+        return found, recipe_id, await search_recipes("mushroom"), await search_recipes("борщ"), await search_recipes("borscht")
+
+    (by_text, by_ingredients), recipe_id, added, old_title, new_title = run_in_database(scenario)
+    assert [recipe["id"] for recipe in by_text] == [1]
+    assert [recipe["id"] for recipe in by_ingredients] == [3]
+    assert [recipe["id"] for recipe in added] == [recipe_id]
+    assert old_title == []
+    assert [recipe["id"] for recipe in new_title] == [1]
+
+
+def test_conversation_states_get_category_ids(legacy_database, run_in_database):
+    run_in_database(asyncio.sleep, 0)
+    states = dict(read(legacy_database, "SELECT key, data FROM fsm_states"))
+    assert json.loads(states["1:1:1::::default"]) == {"category": 1, "page": 1}
+    assert json.loads(states["1:2:2::::default"]) == {"category": LEGACY_CATEGORY_ID}
+    assert json.loads(states["1:3:3::::default"]) == {"query": "soup"}
+    assert states["1:4:4::::default"] is None
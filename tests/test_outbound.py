@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage
+
+from services import outbound as outbound_module
+from services.outbound import OutboundQueue, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace time.monotonic of the outbound module with a settable clock."""
+    now = [1000.0]
+    monkeypatch.setattr(outbound_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+class FakeApi:
+    """Stands in for the Bot API behind the middleware and records the calls it gets."""
+
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def make_request(self, bot, method):
+        await self.release.wait()
+        self.calls.append(method)
+        failures = self.failures.get(id(method), 0)
+        if failures:
+            self.failures[id(method)] = failures - 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        return getattr(method, "text", None)
+
+
+def make_queue(max_retries=3):
+    """Create a queue without rate limits."""
+    return OutboundQueue(chat_rate=0, group_rate=0, burst=1, global_rate=0, max_retries=max_retries)
+
+
+def test_bucket_allows_a_burst_then_spaces_calls(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.reserve() for _ in range(5)] == [0, 0, 0, 0.5, 1.0]
+    # Waiting refills the bucket
+    clock[0] += 1.0
+    assert bucket.reserve() == 0.5
+    assert bucket.refill_time() == 2.0
+
+
+def test_bucket_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    clock[0] += 100
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 1.0]
+
+
+def test_bucket_without_rate_never_waits():
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert [bucket.reserve() for _ in range(10)] == [0.0] * 10
+    assert bucket.refill_time() == 0.0
+
+
+def test_calls_to_a_chat_are_sent_in_order():
+    async def scenario():
+        queue, api = make_queue(), FakeApi()
+        messages = [SendMessage(chat_id=1, text=str(number)) for number in range(5)]
+        results = await asyncio.gather(*(queue(api.make_request, None, message) for message in messages))
+        await queue.close()
+        return results, [call.text for call in api.calls]
+
+    assert asyncio.run(scenario()) == (["0", "1", "2", "3", "4"], ["0", "1", "2", "3", "4"])
+
+
+def test_calls_without_a_chat_are_sent_at_once():
+    async def scenario():
+        queue, api = make_queue(), FakeApi()
+        await queue(api.make_request, None, AnswerCallbackQuery(callback_query_id="1"))
+        return queue.depth, len(api.calls)
+
+    assert asyncio.run(scenario()) == (0, 1)
+
+
+def test_queued_edits_of_a_message_are_coalesced():
+    async def scenario():
+        queue, api = make_queue(), FakeApi()
+        api.release.clear()
+        # The first call holds the chat's queue while the edits arrive
+        first = asyncio.ensure_future(queue(api.make_request, None, SendMessage(chat_id=1, text="thinking")))
+        await asyncio.sleep(0)
+        edits = [
+            asyncio.ensure_future(queue(api.make_request, None, EditMessageText(chat_id=1, message_id=7, text=text)))
+            for text in ("a", "ab", "abc")
+        ]
+        other = asyncio.ensure_future(queue(api.make_request, None, EditMessageText(chat_id=1, message_id=8, text="x")))
+        await asyncio.sleep(0)
+        depth = queue.depth
+
+        api.release.set()
+        results = await asyncio.gather(first, *edits, other)
+        await queue.close()
+        return depth, results, [call.text for call in api.calls]
+
+    depth, results, sent = asyncio.run(scenario())
+    assert depth == 2
+    # Every caller gets the result of the latest edit, which is sent once
+    assert results == ["thinking", "abc", "abc", "abc", "x"]
+    assert sent == ["thinking", "abc", "x"]
+
+
+def test_call_rejected_with_429_is_retried():
+    async def scenario():
+        queue, api = make_queue(max_retries=3), FakeApi()
+        message = SendMessage(chat_id=1, text="hello")
+        api.failures[id(message)] = 2
+        result = await queue(api.make_request, None, message)
+        await queue.close()
+        return result, len(api.calls)
+
+    assert asyncio.run(scenario()) == ("hello", 3)
+
+
+def test_call_fails_after_max_retries():
+    async def scenario():
+        queue, api = make_queue(max_retries=1), FakeApi()
+        message = SendMessage(chat_id=1, text="hello")
+        api.failures[id(message)] = 5
+        try:
+            with pytest.raises(TelegramRetryAfter):
+                await queue(api.make_request, None, message)
+            # The chat's next call is still delivered
+            return await queue(api.make_request, None, SendMessage(chat_id=1, text="next")), len(api.calls)
+        finally:
+            await queue.close()
+
+    assert asyncio.run(scenario()) == ("next", 3)
+
+
+def test_retried_edit_is_superseded_by_a_newer_edit(monkeypatch):
+    waiting, retry = asyncio.Event(), asyncio.Event()
+
+    async def sleep(delay):
+        # Hold the rejected edit until the newer one is queued
+        waiting.set()
+        await retry.wait()
+
+    async def scenario():
+        queue, api = make_queue(), FakeApi()
+        old = EditMessageText(chat_id=1, message_id=7, text="old")
+        new = EditMessageText(chat_id=1, message_id=7, text="new")
+        api.failures[id(old)] = 1
+        old_result = asyncio.ensure_future(queue(api.make_request, None, old))
+        await waiting.wait()
+        new_result = queue._enqueue(1, new, lambda: api.make_request(None, new))
+        retry.set()
+        results = await asyncio.gather(old_result, new_result)
+        await queue.close()
+        return results, [call.text for call in api.calls]
+
+    monkeypatch.setattr(outbound_module.asyncio, "sleep", sleep)
+    assert asyncio.run(scenario()) == (["new", "new"], ["old", "new"])
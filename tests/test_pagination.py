@@ -0,0 +1,116 @@
+from database.db import (
+    add_recipe,
+    count_recipes_in_category,
+    delete_recipe,
+    get_category_counts,
+    get_recipes_page
+)
+
+# Titles of the recipes in the paged category; duplicate titles are ordered by id
+TITLES = [f"Recipe {number // 2:02d}" for number in range(25)]
+
+
+def seeded(scenario):
+    """Wrap a scenario to first add TITLES to category 0 and one recipe to category 1."""
+    async def main():
+        ids = [await add_recipe(0, title, "ingredients", "instructions") for title in TITLES]
+        await add_recipe(1, "Recipe 00", "ingredients", "instructions")
+        return await scenario(ids)
+    return main
+
+
+def ids_of(page):
+    return [recipe["id"] for recipe in page]
+
+
+def test_first_page(run_in_database):
+    async def scenario(ids):
+        return ids, await get_recipes_page(0, limit=10)
+
+    ids, page = run_in_database(seeded(scenario))
+    assert ids_of(page) == ids[:10]
+    assert [recipe["title"] for recipe in page] == TITLES[:10]
+
+
+def test_pages_after_a_cursor_cover_the_category_once(run_in_database):
+    async def scenario(ids):
+        pages = [await get_recipes_page(0, limit=10)]
+        while pages[-1]:
+            pages.append(await get_recipes_page(0, after_id=pages[-1][-1]["id"], limit=10))
+        return ids, pages
+
+    ids, pages = run_in_database(seeded(scenario))
+    assert [len(page) for page in pages] == [10, 10, 5, 0]
+    assert sum((ids_of(page) for page in pages), []) == ids
+
+
+def test_page_before_a_cursor(run_in_database):
+    async def scenario(ids):
+        return ids, [
+            await get_recipes_page(0, before_id=ids[20], limit=10),
+            # Fewer recipes than a page precede the cursor
+            await get_recipes_page(0, before_id=ids[3], limit=10),
+            await get_recipes_page(0, before_id=ids[0], limit=10)
+        ]
+
+    ids, (full, partial, empty) = run_in_database(seeded(scenario))
+    assert ids_of(full) == ids[10:20]
+    assert ids_of(partial) == ids[:3]
+    assert empty == []
+
+
+def test_page_starting_with_a_recipe(run_in_database):
+    async def scenario(ids):
+        return ids, await get_recipes_page(0, start_id=ids[10], limit=10), await get_recipes_page(0, start_id=ids[24], limit=10)
+
+    ids, page, last = run_in_database(seeded(scenario))
+    assert ids_of(page) == ids[10:20]
+    assert ids_of(last) == ids[24:]
+
+
+def test_page_boundary_between_equal_titles(run_in_database):
+    async def scenario(ids):
+        # ids[8] and ids[9] share a title; a page of 9 ends between them
+        first = await get_recipes_page(0, limit=9)
+        second = await get_recipes_page(0, after_id=first[-1]["id"], limit=9)
+        back = await get_recipes_page(0, before_id=second[0]["id"], limit=9)
+        return ids, first, second, back
+
+    ids, first, second, back = run_in_database(seeded(scenario))
+    assert ids_of(first) == ids[:9]
+    assert ids_of(second) == ids[9:18]
+    assert back == first
+
+
+def test_page_after_the_last_recipe_is_empty(run_in_database):
+    async def scenario(ids):
+        return await get_recipes_page(0, after_id=ids[-1], limit=5), await get_recipes_page(0, after_id=ids[19], limit=5)
+
+    empty, last = run_in_database(seeded(scenario))
+    assert empty == []
+    assert len(last) == 5
+
+
+def test_deleted_cursor_recipe_gives_an_empty_page(run_in_database):
+    async def scenario(ids):
+        await get_recipes_page(0, after_id=ids[9], limit=10)
+        await delete_recipe(ids[9])
+        return await get_recipes_page(0, after_id=ids[9], limit=10)
+
+    assert run_in_database(seeded(scenario)) == []
+
+
+def test_pages_and_counts_follow_writes(run_in_database):
+    async def scenario(ids):
+        before = (await get_recipes_page(0, limit=3), await count_recipes_in_category(0))
+        # Sorts first, so the cached first page changes
+        await add_recipe(0, "A recipe", "ingredients", "instructions")
+        after = (await get_recipes_page(0, limit=3), await count_recipes_in_category(0))
+        return before, after, await get_category_counts()
+
+    (before_page, before_count), (after_page, after_count), counts = run_in_database(seeded(scenario))
+    assert before_count == 25
+    assert after_count == 26
+    assert after_page[0]["title"] == "A recipe"
+    assert after_page[1:] == before_page[:2]
+    assert counts[1] == 1
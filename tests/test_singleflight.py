@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", call) for _ in range(5)))
+        return calls, results, flight.in_flight("key")
+
+    calls, results, in_flight = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == ["result"] * 5
+    assert not in_flight
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def call(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key
+
+        results = await asyncio.gather(flight.do("a", lambda: call("a")), flight.do("b", lambda: call("b")))
+        return sorted(calls), results
+
+    assert asyncio.run(scenario()) == (["a", "b"], ["a", "b"])
+
+
+def test_exception_is_shared_by_all_callers():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flight.do("key", call) for _ in range(3)), return_exceptions=True)
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert len(results) == 3
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_waiter_takes_over_when_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        leader = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    # The waiter ran the call again instead of failing with the leader
+    assert asyncio.run(scenario()) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_call():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.02)
+            return "result"
+
+        leader = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(scenario()) == "result"
@@ -0,0 +1,81 @@
+import pytest
+
+import translations
+from keyboards.keyboards import get_cancel_keyboard, get_main_menu_keyboard
+from translations import (
+    BUTTON_KEYS,
+    TRANSLATIONS,
+    CompiledText,
+    button_key,
+    current_language,
+    get_text,
+    resolve_language
+)
+
+
+@pytest.mark.parametrize("text, values, expected", [
+    ("plain", {}, "plain"),
+    ("Page {page} of {total}", {"page": 2, "total": 5}, "Page 2 of 5"),
+    ("{value:.1f}|{value:>6.2f}|{count:03d}", {"value": 2.345, "count": 7}, "2.3|  2.35|007"),
+    ("{name!r} {name!s} {name!a}", {"name": "ёж"}, "'ёж' ёж '\\u0451\\u0436'"),
+    ("{name!r:>6}", {"name": "ab"}, "  'ab'"),
+    ("{{literal}} {x}", {"x": 1}, "{literal} 1"),
+])
+def test_compiled_text_formats_like_str_format(text, values, expected):
+    assert CompiledText(text).format(values) == expected == text.format(**values)
+
+
+@pytest.mark.parametrize("text", ["{0}", "{}", "{a.b}", "{a[0]}", "{a:{width}}"])
+def test_compiled_text_rejects_unsupported_fields(text):
+    with pytest.raises(ValueError):
+        CompiledText(text)
+
+
+def test_compiled_text_raises_for_missing_values():
+    with pytest.raises(KeyError):
+        CompiledText("{a} {b}").format({"a": 1})
+
+
+def test_get_text_translates_and_formats():
+    assert get_text("recipes_in_category", "en", category="Soups") == "Recipes in 'Soups' category:"
+    assert get_text("recipes_in_category", "ru", category="Супы") == "Рецепты в категории 'Супы':"
+    assert get_text("no_such_key", "en") == "Missing translation: no_such_key"
+    assert get_text("recipes_in_category", "en").startswith("Recipes in '{category}'")
+    assert get_text("recipes_in_category", "en", other=1).startswith("Error formatting translation")
+
+
+def test_get_text_uses_the_current_language():
+    token = current_language.set("ru")
+    try:
+        assert get_text("cancel_button") == TRANSLATIONS["cancel_button"]["ru"]
+    finally:
+        current_language.reset(token)
+
+
+def test_language_argument_is_positional_only(monkeypatch):
+    monkeypatch.setitem(translations.CATALOG["ru"], "language_test", CompiledText("Язык: {language}"))
+    assert get_text("language_test", "ru", language="русский") == "Язык: русский"
+
+
+def test_unknown_languages_fall_back_to_english():
+    assert resolve_language("de") == "en"
+    assert resolve_language("ru") == "ru"
+    assert get_text("cancel_button", "de") == TRANSLATIONS["cancel_button"]["en"]
+    token = current_language.set("de")
+    try:
+        assert resolve_language() == "en"
+        assert get_main_menu_keyboard() is get_main_menu_keyboard("en")
+        assert get_cancel_keyboard() is get_cancel_keyboard("en")
+    finally:
+        current_language.reset(token)
+
+
+def test_button_texts_map_back_to_their_key_in_every_language():
+    for key, texts in TRANSLATIONS.items():
+        if key.endswith("_button"):
+            for text in texts.values():
+                assert button_key(text) == key
+    assert BUTTON_KEYS[TRANSLATIONS["ask_ai_button"]["ru"]] == "ask_ai_button"
+    assert button_key("How do I make soup?") is None
+    assert button_key(None) is None
+    assert button_key("") is None
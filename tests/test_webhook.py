@@ -0,0 +1,55 @@
+import asyncio
+
+from aiogram import Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from config import WEBHOOK_PATH
+from main import create_webhook_app
+
+SECRET = "test-secret"
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 5, "type": "private"},
+        "from": {"id": 5, "is_bot": False, "first_name": "Test"},
+        "text": "hello"
+    }
+}
+
+
+def post_updates(requests):
+    """Post (headers, update) pairs to a webhook app and return the statuses and the handled texts."""
+    dispatcher = Dispatcher()
+    handled = []
+
+    @dispatcher.message()
+    async def record(message: Message):
+        handled.append(message.text)
+
+    async def scenario():
+        async with TestClient(TestServer(create_webhook_app(SECRET, dispatcher))) as client:
+            statuses = []
+            for headers, update in requests:
+                response = await client.post(WEBHOOK_PATH, json=update, headers=headers)
+                statuses.append(response.status)
+            return statuses
+
+    return asyncio.run(scenario()), handled
+
+
+def test_update_with_the_secret_is_dispatched():
+    statuses, handled = post_updates([({"X-Telegram-Bot-Api-Secret-Token": SECRET}, UPDATE)])
+    assert statuses == [200]
+    assert handled == ["hello"]
+
+
+def test_update_without_the_secret_is_rejected():
+    statuses, handled = post_updates([
+        ({}, UPDATE),
+        ({"X-Telegram-Bot-Api-Secret-Token": "wrong"}, {**UPDATE, "update_id": 2}),
+    ])
+    assert statuses == [401, 401]
+    assert handled == []
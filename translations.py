@@ -1,6 +1,11 @@
-from typing import Dict, Any
+from contextvars import ContextVar
+from string import Formatter
+from typing import Dict, Any, List, Optional, Tuple
 from config import LANGUAGE
 
+# Languages every text is translated to
+LANGUAGES = ("en", "ru")
+
 # Define translations for all UI text
 TRANSLATIONS: Dict[str, Dict[str, str]] = {
     # Main menu buttons
@@ -94,6 +99,10 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "en": "Invalid category selection",
         "ru": "Неверный выбор категории"
     },
+    "no_recipes_yet": {
+        "en": "There are no recipes yet. Add the first one!",
+        "ru": "Рецептов пока нет. Добавьте первый!"
+    },
     "no_recipes_in_category": {
         "en": "There are no recipes in the '{category}' category yet.",
         "ru": "В категории '{category}' пока нет рецептов."
@@ -218,6 +227,18 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "en": "🤖 Thinking about the answer...",
         "ru": "🤖 Думаю над ответом..."
     },
+    "ai_queued": {
+        "en": "⏳ Your question is queued, position {position}. You can cancel at any time.",
+        "ru": "⏳ Ваш вопрос в очереди, позиция {position}. Вы можете отменить его в любой момент."
+    },
+    "ai_queue_full": {
+        "en": "The AI assistant is busy right now. Please try again in a minute.",
+        "ru": "ИИ-помощник сейчас перегружен. Попробуйте через минуту."
+    },
+    "ai_user_limit": {
+        "en": "Please wait for the answer to your previous question.",
+        "ru": "Пожалуйста, дождитесь ответа на предыдущий вопрос."
+    },
     "ai_error": {
         "en": "Sorry, there was an error when contacting the AI. Please try again later.",
         "ru": "Извините, произошла ошибка при обращении к ИИ. Попробуйте позже."
@@ -230,6 +251,32 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "en": "Sorry, there was an error processing your request. Please try again later.",
         "ru": "Извините, произошла ошибка при обработке запроса. Попробуйте позже."
     },
+    # Search
+    "search_prompt": {
+        "en": "Enter words to search for in recipe titles, ingredients and instructions:",
+        "ru": "Введите слова для поиска по названиям, ингредиентам и способам приготовления:"
+    },
+    "search_results": {
+        "en": "Search results for '{query}' ({total} found):",
+        "ru": "Результаты поиска по запросу '{query}' (найдено: {total}):"
+    },
+    "no_search_results": {
+        "en": "Nothing found for '{query}'. Try other words or press Cancel.",
+        "ru": "По запросу '{query}' ничего не найдено. Попробуйте другие слова или нажмите «Отмена»."
+    },
+    # Cooking from available ingredients
+    "ingredients_search_prompt": {
+        "en": "List the ingredients you have, separated by commas or new lines:",
+        "ru": "Перечислите ингредиенты, которые у вас есть, через запятую или с новой строки:"
+    },
+    "ingredients_search_results": {
+        "en": "Recipes with your ingredients ({total} found), best matches first:",
+        "ru": "Рецепты с вашими ингредиентами (найдено: {total}), лучшие совпадения сверху:"
+    },
+    "no_ingredients_search_results": {
+        "en": "No recipes use these ingredients. Try other ones or press Cancel.",
+        "ru": "Нет рецептов с этими ингредиентами. Попробуйте другие или нажмите «Отмена»."
+    },
     # Recipe details
     "ingredients_label": {
         "en": "🧂 Ingredients:",
@@ -255,22 +302,168 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
     "choose_menu_item": {
         "en": "Choose a menu item:",
         "ru": "Выбери пункт меню:"
+    },
+    "button_outdated": {
+        "en": "This button is no longer active. Please use the menu.",
+        "ru": "Эта кнопка больше не работает. Воспользуйтесь меню."
+    },
+    # Language selection
+    "language_name": {
+        "en": "🇬🇧 English",
+        "ru": "🇷🇺 Русский"
+    },
+    "language_prompt": {
+        "en": "Choose your language:",
+        "ru": "Выберите язык:"
+    },
+    "language_changed": {
+        "en": "Language set to English.",
+        "ru": "Выбран русский язык."
+    },
+    # Admin commands
+    "profile_usage": {
+        "en": "Usage: /profile [seconds] [{modes}]\nSessions last at most {max_seconds} seconds.",
+        "ru": "Использование: /profile [секунды] [{modes}]\nСеанс длится не больше {max_seconds} секунд."
+    },
+    "profile_started": {
+        "en": "Profiling for {seconds} s in {mode} mode...",
+        "ru": "Профилирование {seconds} с в режиме {mode}..."
+    },
+    "profile_busy": {
+        "en": "A profiling session is already running.",
+        "ru": "Профилирование уже идёт."
+    },
+    "profile_finished": {
+        "en": "Profile written to {path}",
+        "ru": "Профиль сохранён в {path}"
+    },
+    "import_usage": {
+        "en": "Send a .jsonl or .csv file with the caption /import. Each recipe needs category, title, ingredients and instructions; video_link is optional.",
+        "ru": "Отправьте файл .jsonl или .csv с подписью /import. У каждого рецепта должны быть category, title, ingredients и instructions; video_link необязателен."
+    },
+    "import_started": {
+        "en": "Importing recipes...",
+        "ru": "Импортирую рецепты..."
+    },
+    "import_finished": {
+        "en": "Imported {summary}",
+        "ru": "Импортировано: {summary}"
+    },
+    "import_failed_partially": {
+        "en": "Failed after importing {rows} recipes: {error}",
+        "ru": "Ошибка после импорта рецептов ({rows}): {error}"
+    },
+    "export_usage": {
+        "en": "Usage: /export [jsonl|csv]",
+        "ru": "Использование: /export [jsonl|csv]"
+    },
+    "export_finished": {
+        "en": "Exported {summary}",
+        "ru": "Экспортировано: {summary}"
+    },
+    "bulk_failed": {
+        "en": "Failed: {error}",
+        "ru": "Ошибка: {error}"
+    }
+}
+
+# Conversions of format fields, as in {value!r}
+_CONVERSIONS = {"s": str, "r": repr, "a": ascii}
+
+class CompiledText:
+    """A translation with its format fields parsed once at startup."""
+    
+    __slots__ = ("text", "parts")
+    
+    def __init__(self, text: str):
+        """Parse a text.
+        
+        Raises:
+            ValueError: If a field is not a plain name, e.g. {0}, {a.b} or {a[0]}, or has a nested spec
+        """
+        self.text = text
+        # (literal text, field name or None, format spec, conversion or None) in order
+        self.parts: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if field is not None and (not field.isidentifier() or "{" in spec):
+                raise ValueError(f"Unsupported format field {{{field}}} in {text!r}")
+            self.parts.append((literal, field, spec or "", conversion))
+    
+    def format(self, values: Dict[str, Any]) -> str:
+        """Substitute the fields as str.format() would; raises KeyError if a value is missing."""
+        pieces = []
+        for literal, field, spec, conversion in self.parts:
+            pieces.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion is not None:
+                value = _CONVERSIONS[conversion](value)
+            pieces.append(format(value, spec))
+        return "".join(pieces)
+
+def _compile_catalog() -> Dict[str, Dict[str, CompiledText]]:
+    """Resolve every text for every language, falling back to English."""
+    return {
+        language: {
+            key: CompiledText(texts.get(language, texts.get("en", f"Missing translation: {key}")))
+            for key, texts in TRANSLATIONS.items()
+        }
+        for language in LANGUAGES
     }
+
+# Compiled texts by language and key
+CATALOG = _compile_catalog()
+
+# Reply keyboard button text in any language -> translation key
+BUTTON_KEYS: Dict[str, str] = {
+    text: key
+    for key, texts in TRANSLATIONS.items() if key.endswith("_button")
+    for text in texts.values()
 }
 
+# Language of the user whose update is being handled; set by LanguageMiddleware
+current_language: ContextVar[str] = ContextVar("current_language", default=LANGUAGE)
+
+def resolve_language(language: Optional[str] = None) -> str:
+    """Return the given or current user's language if texts exist for it, and English otherwise."""
+    language = language or current_language.get()
+    return language if language in CATALOG else "en"
+
 # Helper function to get translation
-def get_text(key: str, **kwargs) -> str:
-    """Get translated text for the given key and format with kwargs if needed."""
-    if key not in TRANSLATIONS:
-        return f"Missing translation: {key}"
+def get_text(key: str, language: Optional[str] = None, /, **kwargs) -> str:
+    """Get translated text for the given key and format with kwargs if needed.
     
-    text = TRANSLATIONS[key].get(LANGUAGE, TRANSLATIONS[key].get("en", f"Missing translation: {key}"))
+    The text is translated to the given language, or to the current user's language by default.
+    The language is positional-only, so a text may have a {language} field.
+    """
+    catalog = CATALOG[resolve_language(language)]
+    text = catalog.get(key)
+    if text is None:
+        return f"Missing translation: {key}"
     
     # Format the text with kwargs if provided
     if kwargs:
         try:
-            return text.format(**kwargs)
-        except KeyError as e:
+            return text.format(kwargs)
+        except (KeyError, ValueError) as e:
             return f"Error formatting translation: {e}"
     
-    return text
\ No newline at end of file
+    return text.text
+
+def button_key(text: Optional[str]) -> Optional[str]:
+    """Return the translation key of a button text in any language, or None."""
+    return BUTTON_KEYS.get(text) if text else None
+
+# Category id -> {language: name}, in id order; registered by init_db() from the database
+category_names: Dict[int, Dict[str, str]] = {}
+
+def register_category_names(names: Dict[int, Dict[str, str]]) -> None:
+    """Replace the known category names with those stored in the database."""
+    category_names.clear()
+    category_names.update(names)
+
+def get_category_name(category_id: int, language: Optional[str] = None) -> str:
+    """Return the name of a category in the given or current user's language."""
+    names = category_names.get(category_id, {})
+    return names.get(resolve_language(language)) or names.get(LANGUAGE) or str(category_id)